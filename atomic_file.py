@@ -0,0 +1,14 @@
+import json
+import os
+import threading
+
+def write_json_atomic(path, data, indent=2):
+    """data をJSONで書き込む関数
+
+    書き込み途中で終了しても壊れたファイルが残らず、書き込み途中のファイルも読まれないよう、
+    一時ファイルに書き込んでから置き換える。
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp_path, path)
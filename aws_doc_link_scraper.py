@@ -1,90 +1,705 @@
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import requests
+import asyncio
 import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlsplit, urlunsplit
+import posixpath
+from step_profiler import StepProfiler
+from http_cache import HttpCache
+from link_manifest import write_manifest
+from shared_browser import connect_browser
+from rate_limiter import HostLimiter, LimitedSession, RateLimiter
 
-# コマンドライン引数の設定
-parser = argparse.ArgumentParser(description='AWSドキュメントページのリンクを抽出します')
-parser.add_argument('--url', type=str, required=True,
-                    help='抽出するAWSドキュメントページのURL (必須)')
-parser.add_argument('--output', type=str, default='aws_links.txt',
-                    help='結果を保存するファイル名（デフォルト: aws_links.txt）')
-args = parser.parse_args()
+# lxmlがインストールされていれば高速なパーサーとして使用する（任意）
+try:
+    import lxml  # noqa: F401
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
 
-# AWSドキュメントページのURL
-url = args.url
+# HTTP取得時のタイムアウト（秒）
+HTTP_TIMEOUT = 15
+
+# AWSドキュメントのTOCデータ（ガイドのディレクトリ直下に置かれているJSON）
+TOC_JSON_NAME = 'toc-contents.json'
+
+# ナビゲーションメニュー内のリンクのセレクタ
+TOC_LINK_SELECTOR = 'div[data-testid="doc-page-toc"] a[href]'
+
+# 展開モードでページ内の折りたたみを開く最大回数
+EXPAND_ROUNDS = 5
+
+# TOCのリンクが表示されるまで待つ最大時間（ミリ秒）
+TOC_WAIT_TIMEOUT = 30000
+
+# ナビゲーションメニューのdivだけを解析対象にするための条件
+TOC_STRAINER = SoupStrainer('div', attrs={'data-testid': 'doc-page-toc'})
+
+# TOCの取得に不要なため読み込みを中止するリソースの種類
+BLOCKED_RESOURCE_TYPES = {'image', 'media', 'font', 'stylesheet'}
+
+# 読み込みを中止する解析・トラッキング用ドメイン
+BLOCKED_DOMAINS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'omtrdc.net',
+    'demdex.net',
+    'adobedtm.com',
+    'shortbread.aws.dev',
+)
+
+# ページと異なるドメインでも読み込みを許可するドメイン（AWSの静的ファイル配信）
+ALLOWED_THIRD_PARTY_DOMAINS = ('awsstatic.com',)
+
+# 折りたたまれた子要素を持つ項目を開く（リンク自体はクリックしない）
+EXPAND_COLLAPSED_SCRIPT = """() => {
+    const toc = document.querySelector('div[data-testid="doc-page-toc"]');
+    if (!toc) return 0;
+    const toggles = toc.querySelectorAll('[aria-expanded="false"]:not(a)');
+    toggles.forEach(el => el.click());
+    return toggles.length;
+}"""
+
+# ナビゲーションメニューのリンクを、親リンクと折りたたみ状態付きで取得する
+TOC_TREE_SCRIPT = """() => {
+    const toc = document.querySelector('div[data-testid="doc-page-toc"]');
+    if (!toc) return [];
+    return Array.from(toc.querySelectorAll('a[href]')).map(a => {
+        const li = a.closest('li');
+        let parent = null;
+        let collapsed = false;
+        if (li && toc.contains(li)) {
+            const parentLi = li.parentElement ? li.parentElement.closest('li') : null;
+            if (parentLi && toc.contains(parentLi)) {
+                const parentLink = parentLi.querySelector('a[href]');
+                if (parentLink) parent = parentLink.href;
+            }
+            const toggle = li.querySelector(':scope > [aria-expanded], :scope > * > [aria-expanded]');
+            collapsed = !!toggle && toggle.getAttribute('aria-expanded') === 'false';
+        }
+        return {title: a.textContent.trim(), url: a.href, parent: parent, collapsed: collapsed};
+    });
+}"""
+
+def create_session(pool_size=10):
+    """接続をプールして使い回すHTTPセッションを作成する関数"""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=('HEAD', 'GET'))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = 'Mozilla/5.0 (compatible; aws-doc-link-scraper)'
+    return session
+
+def http_get(session, url, cache=None):
+    """URLを取得する関数（cache を指定した場合は保存済みの内容を条件付きリクエストで再検証する）"""
+    if cache:
+        return cache.get(session, url, timeout=HTTP_TIMEOUT)
+    return session.get(url, timeout=HTTP_TIMEOUT)
+
+def get_base_url(url):
+    """相対URLを絶対URLに変換するためのベースURLを取得する関数"""
+    return '/'.join(url.split('/')[:-1]) + '/'
+
+def to_absolute_url(href, base_url):
+    """相対URLを絶対URLに変換する関数"""
+    if not href.startswith('http'):
+        return base_url + href
+    return href
+
+def link_key(url):
+    """ガイド間の重複判定用に、フラグメントと ../ などを除いてURLを正規化する関数"""
+    parts = urlsplit(url)
+    path = posixpath.normpath(parts.path) if parts.path else '/'
+    if parts.path.endswith('/') and not path.endswith('/'):
+        path += '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ''))
+
+def _registered_domain(host):
+    """ホスト名から比較用のドメイン（末尾の2ラベル）を取得する関数"""
+    return '.'.join((host or '').split('.')[-2:])
+
+def should_block_request(resource_type, request_url, page_url):
+    """TOCの取得に不要なリクエストかどうかを判定する関数"""
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlparse(request_url).hostname or ''
+    if any(host == d or host.endswith('.' + d) for d in BLOCKED_DOMAINS):
+        return True
+    # ページ本体以外の第三者ドメインへのリクエストは中止する
+    if resource_type != 'document':
+        page_domain = _registered_domain(urlparse(page_url).hostname)
+        domain = _registered_domain(host)
+        if domain and domain != page_domain and domain not in ALLOWED_THIRD_PARTY_DOMAINS:
+            return True
+    return False
 
 # Playwrightを使用してページを取得
-def get_page_html(url):
+def get_page_html(url, block_resources=True, wait_for='toc', cdp_endpoint=None):
+    """ページのHTMLを取得する関数
+
+    block_resources: 画像・フォント・スタイルシートや解析スクリプトの読み込みを中止する
+    wait_for: 'toc' はTOCのリンクが表示された時点で、'networkidle' は通信が収まるまで待機する
+    cdp_endpoint: 指定すると起動済みの共有ブラウザに接続し、終了時も共有ブラウザは閉じない
+    """
     print(f"ページにアクセス中: {url}")
     with sync_playwright() as p:
-        # ヘッドレスモードでブラウザを起動
-        browser = p.chromium.launch(headless=True)
+        # ヘッドレスモードでブラウザを起動（共有ブラウザがあれば接続）
+        browser = connect_browser(p, cdp_endpoint)
         page = browser.new_page()
-        
+
         try:
-            # ページにアクセス
-            page.goto(url)
-            
-            # ページが完全にロードされるまで待機
-            page.wait_for_load_state('networkidle')
-            print("ページが完全にロードされました")
-            
+            if block_resources:
+                # 不要なリソースはリクエストの段階で中止する
+                def handle_route(route):
+                    if should_block_request(route.request.resource_type, route.request.url, url):
+                        route.abort()
+                    else:
+                        route.continue_()
+                page.route('**/*', handle_route)
+
+            if wait_for == 'toc':
+                # DOMの構築後、TOCのリンクが表示された時点で取得する
+                page.goto(url, wait_until='domcontentloaded')
+                try:
+                    page.wait_for_selector(TOC_LINK_SELECTOR, timeout=TOC_WAIT_TIMEOUT)
+                    print("ナビゲーションメニューが読み込まれました")
+                except Exception:
+                    print("ナビゲーションメニューが見つからないため、通信の完了を待機します")
+                    page.wait_for_load_state('networkidle')
+            else:
+                # ページにアクセス
+                page.goto(url)
+
+                # ページが完全にロードされるまで待機
+                page.wait_for_load_state('networkidle')
+                print("ページが完全にロードされました")
+
             # HTMLを取得
             html_content = page.content()
-            
+
             return html_content
         finally:
-            # ブラウザを閉じる
+            # ブラウザを閉じる（共有ブラウザの場合は、この実行で開いたページを閉じて切断する）
             browser.close()
 
-# ページのHTMLを取得
-print("Playwrightを使用してHTMLを取得しています...")
-html_content = get_page_html(url)
-print("HTMLの取得が完了しました")
-
-# BeautifulSoupでHTMLを解析
-print("BeautifulSoupでHTMLを解析しています...")
-soup = BeautifulSoup(html_content, 'html.parser')
-
-# 結果を保存するファイル名
-output_file = args.output
-
-# 左ペインのリンクを抽出
-print("ナビゲーションメニューからリンクを抽出しています...")
-# AWSドキュメントの左側のナビゲーションは通常 data-testid="doc-page-toc" の属性を持つdiv内にある
-nav_div = soup.find('div', {'data-testid': 'doc-page-toc'})
-
-# ファイルに書き込むための準備
-with open(output_file, "w", encoding="utf-8") as f:
-    if nav_div:
-        # すべてのリンクを抽出
-        links = nav_div.find_all('a', href=True)
-        
-        # ベースURLを取得（相対URLを絶対URLに変換するため）
-        base_url = '/'.join(url.split('/')[:-1]) + '/'
-        
-        print(f"\n合計 {len(links)} 個のリンクが見つかりました\n")
-        
-        # リンクとそのテキストを表示とファイルへの書き込み
+def resolve_parser(parser='auto'):
+    """使用するHTMLパーサー名を決定する関数（auto はlxmlがあればlxml、なければhtml.parser）"""
+    if parser == 'auto':
+        return 'lxml' if HAS_LXML else 'html.parser'
+    if parser == 'lxml' and not HAS_LXML:
+        print("lxmlがインストールされていないため、html.parserを使用します")
+        return 'html.parser'
+    return parser
+
+def iter_links_from_html(html_content, url, parser='auto'):
+    """HTMLのナビゲーションメニューからリンクを順に返すジェネレーター
+
+    ページ全体ではなくナビゲーションメニューのdivだけを木構造として構築する。
+    """
+    soup = BeautifulSoup(html_content, resolve_parser(parser), parse_only=TOC_STRAINER)
+    # AWSドキュメントの左側のナビゲーションは通常 data-testid="doc-page-toc" の属性を持つdiv内にある
+    nav_div = soup.find('div', {'data-testid': 'doc-page-toc'})
+    if not nav_div:
+        return
+
+    base_url = get_base_url(url)
+    for link in nav_div.find_all('a', href=True):
+        # 入れ子になったli要素から階層の深さと親セクションを求める
+        item = link.find_parent('li')
+        depth = 0
+        parent = ''
+        while item is not None and item is not nav_div and nav_div in item.parents:
+            depth += 1
+            parent_item = item.find_parent('li')
+            if depth == 1 and parent_item is not None and nav_div in parent_item.parents:
+                parent_link = parent_item.find('a', href=True)
+                if parent_link:
+                    parent = parent_link.get_text(strip=True)
+            item = parent_item
+        # リンクテキストを取得（spanタグ内にある場合が多い）
+        yield {
+            'title': link.get_text(strip=True),
+            'url': to_absolute_url(link['href'], base_url),
+            'depth': max(depth - 1, 0),
+            'parent': parent,
+        }
+
+def extract_links_from_html(html_content, url, parser='auto'):
+    """HTMLのナビゲーションメニューからリンクを抽出する関数"""
+    return list(iter_links_from_html(html_content, url, parser=parser))
+
+def extract_links_from_toc_json(toc_data, url):
+    """TOCデータ（toc-contents.json）からナビゲーションと同じ順序でリンクを抽出する関数"""
+    base_url = get_base_url(url)
+    links = []
+
+    # ナビゲーションメニューと同じく深さ優先で辿る（深さと親セクションも記録）
+    stack = [(node, 0, '') for node in reversed(toc_data.get('contents', []))]
+    while stack:
+        node, depth, parent = stack.pop()
+        title = (node.get('title') or '').strip()
+        href = node.get('href')
+        if href:
+            links.append({
+                'title': title,
+                'url': to_absolute_url(href, base_url),
+                'depth': depth,
+                'parent': parent,
+            })
+        stack.extend((child, depth + 1, title) for child in reversed(node.get('contents', [])))
+    return links
+
+def fetch_links_via_http(url, session, parser='auto', profiler=None, cache=None):
+    """ブラウザを使わずにHTTPでTOCを取得してリンクを抽出する関数"""
+    profiler = profiler or StepProfiler(enabled=False)
+    base_url = get_base_url(url)
+
+    # まずTOCデータを直接取得する
+    try:
+        span = profiler.start("page_load", source="toc_json")
+        response = http_get(session, base_url + TOC_JSON_NAME, cache)
+        profiler.finish(span, http_status=response.status_code, from_cache=getattr(response, 'from_cache', False))
+        if response.ok:
+            span = profiler.start("toc_parse", source="toc_json")
+            links = extract_links_from_toc_json(response.json(), url)
+            profiler.finish(span, links=len(links))
+            if links:
+                print(f"TOCデータからリンクを取得しました: {base_url + TOC_JSON_NAME}")
+                return links
+    except (requests.RequestException, ValueError) as e:
+        profiler.abort_open(str(e))
+        print(f"TOCデータの取得に失敗しました: {e}")
+
+    # TOCデータが無い場合は静的HTMLのナビゲーションを解析する
+    try:
+        span = profiler.start("page_load", source="http")
+        response = http_get(session, url, cache)
+        profiler.finish(span, http_status=response.status_code, from_cache=getattr(response, 'from_cache', False))
+        if response.ok:
+            span = profiler.start("toc_parse", source="http")
+            links = extract_links_from_html(response.text, url, parser=parser)
+            profiler.finish(span, links=len(links))
+            return links
+    except requests.RequestException as e:
+        profiler.abort_open(str(e))
+        print(f"ページの取得に失敗しました: {e}")
+    return []
+
+def fetch_links_via_browser(url, block_resources=True, wait_for='toc', parser='auto', profiler=None,
+                            cdp_endpoint=None):
+    """Playwrightでページを描画してリンクを抽出する関数"""
+    profiler = profiler or StepProfiler(enabled=False)
+    print("Playwrightを使用してHTMLを取得しています...")
+    span = profiler.start("page_load", source="browser", wait_for=wait_for)
+    html_content = get_page_html(url, block_resources=block_resources, wait_for=wait_for, cdp_endpoint=cdp_endpoint)
+    profiler.finish(span)
+    print("HTMLの取得が完了しました")
+
+    # BeautifulSoupでHTMLを解析
+    print("BeautifulSoupでHTMLを解析しています...")
+    span = profiler.start("toc_parse", source="browser")
+    links = extract_links_from_html(html_content, url, parser=parser)
+    profiler.finish(span, links=len(links))
+    return links
+
+async def _load_toc_entries(browser, semaphore, page_url, block_resources=True, profiler=None):
+    """1ページを開き、折りたたみを展開してTOCの項目を取得する関数"""
+    profiler = profiler or StepProfiler(enabled=False)
+    async with semaphore:
+        page = await browser.new_page()
+        span = profiler.start("page_load", source="expand", url=page_url)
+        try:
+            if block_resources:
+                async def handle_route(route):
+                    if should_block_request(route.request.resource_type, route.request.url, page_url):
+                        await route.abort()
+                    else:
+                        await route.continue_()
+                await page.route('**/*', handle_route)
+
+            await page.goto(page_url, wait_until='domcontentloaded')
+            try:
+                await page.wait_for_selector(TOC_LINK_SELECTOR, timeout=TOC_WAIT_TIMEOUT)
+            except PlaywrightTimeoutError:
+                profiler.finish(span, status="error", error="toc not found")
+                print(f"ナビゲーションメニューが見つかりませんでした: {page_url}")
+                return []
+
+            # ページ内で開ける折りたたみはクリックで展開する
+            for _ in range(EXPAND_ROUNDS):
+                if not await page.evaluate(EXPAND_COLLAPSED_SCRIPT):
+                    break
+                await page.wait_for_timeout(200)
+            profiler.finish(span)
+
+            span = profiler.start("toc_parse", source="expand", url=page_url)
+            entries = await page.evaluate(TOC_TREE_SCRIPT)
+            profiler.finish(span, links=len(entries))
+            return entries
+        except Exception as e:
+            if "status" not in span:
+                profiler.finish(span, status="error", error=str(e))
+            raise
+        finally:
+            await page.close()
+
+async def expand_toc_links(url, concurrency=4, block_resources=True, profiler=None, cdp_endpoint=None):
+    """折りたたまれた子セクションも含めてTOC全体を再帰的に展開する関数
+
+    ページ内で展開できなかった項目はその項目自身のページを開いて子要素を取得する。
+    同じ階層の項目は最大 concurrency ページで並行して読み込むため、
+    所要時間は項目数ではなくツリーの深さに応じて増える。
+    """
+    nodes = {}                 # URL -> 項目
+    children = {None: []}      # 親URL -> 子URLのリスト（TOCの順序）
+    visited_pages = set()
+
+    async with async_playwright() as p:
+        if cdp_endpoint:
+            # 共有ブラウザに接続した場合、browser.close() はこの実行で開いたページを閉じて切断するだけ
+            print(f"共有ブラウザ ({cdp_endpoint}) に接続しています...")
+            browser = await p.chromium.connect_over_cdp(cdp_endpoint)
+        else:
+            browser = await p.chromium.launch(headless=True)
+        semaphore = asyncio.Semaphore(concurrency)
+        try:
+            frontier = [url]
+            level = 0
+            while frontier:
+                print(f"階層 {level}: {len(frontier)} ページを展開しています...")
+                visited_pages.update(frontier)
+                results = await asyncio.gather(
+                    *(_load_toc_entries(browser, semaphore, page_url, block_resources, profiler)
+                      for page_url in frontier),
+                    return_exceptions=True)
+
+                next_frontier = []
+                for page_url, entries in zip(frontier, results):
+                    if isinstance(entries, Exception):
+                        print(f"ページの展開に失敗しました: {page_url} ({entries})")
+                        continue
+                    for entry in entries:
+                        # 重複を除きながら親ごとの子リストに追加
+                        if entry['url'] not in nodes:
+                            nodes[entry['url']] = entry
+                            children.setdefault(entry['parent'], []).append(entry['url'])
+                        # まだ折りたたまれている項目は次の階層で個別に開く
+                        if (entry['collapsed'] and entry['url'] not in visited_pages
+                                and entry['url'] not in next_frontier):
+                            next_frontier.append(entry['url'])
+                frontier = next_frontier
+                level += 1
+        finally:
+            await browser.close()
+
+    # 親が見つからない項目はトップレベルとして扱う
+    for parent_url in list(children):
+        if parent_url is not None and parent_url not in nodes:
+            children[None].extend(children.pop(parent_url))
+
+    # TOCの順序どおりに深さ優先で並べ、深さと親セクションを付与する
+    links = []
+    emitted = set()
+    stack = [(child, 0, '') for child in reversed(children[None])]
+    while stack:
+        node_url, depth, parent = stack.pop()
+        if node_url in emitted:
+            continue
+        emitted.add(node_url)
+        title = nodes[node_url]['title']
+        links.append({'title': title, 'url': node_url, 'depth': depth, 'parent': parent})
+        stack.extend((child, depth + 1, title) for child in reversed(children.get(node_url, [])))
+    return links
+
+def scrape_links(url, mode='auto', session=None, concurrency=4, block_resources=True, wait_for='toc',
+                 parser='auto', profiler=None, cache=None, cdp_endpoint=None):
+    """指定したモードでナビゲーションメニューのリンクを取得する関数
+
+    mode:
+        auto    - HTTPで取得し、リンクが得られない場合のみブラウザを使用
+        http    - HTTPのみで取得
+        browser - 従来どおりブラウザで取得
+        expand  - ブラウザで折りたたまれた子セクションも再帰的に展開して取得
+
+    cache（HttpCache）を指定すると、HTTPでの取得に条件付きリクエストを使う。
+    cdp_endpoint を指定すると、ブラウザを起動せずに起動済みの共有ブラウザに接続する。
+    """
+    if mode == 'expand':
+        return asyncio.run(expand_toc_links(url, concurrency=concurrency,
+                                            block_resources=block_resources, profiler=profiler,
+                                            cdp_endpoint=cdp_endpoint))
+
+    if mode in ('auto', 'http'):
+        print("HTTPでTOCを取得しています...")
+        own_session = session is None
+        session = session or create_session()
+        try:
+            links = fetch_links_via_http(url, session, parser=parser, profiler=profiler, cache=cache)
+        finally:
+            if own_session:
+                session.close()
+        if links or mode == 'http':
+            return links
+        print("HTTPではリンクが見つかりませんでした。ブラウザで再取得します...")
+
+    return fetch_links_via_browser(url, block_resources=block_resources, wait_for=wait_for, parser=parser,
+                                   profiler=profiler, cdp_endpoint=cdp_endpoint)
+
+def discover_guides(guide_urls, concurrency=8, rate=5.0, per_host=2, mode='auto', parser='auto',
+                    profiler=None, cache=None, cdp_endpoint=None, expand_concurrency=4, block_resources=True,
+                    wait_for='toc'):
+    """複数のガイドのリンクを並行して取得し、重複を除いて1つのリストにまとめる関数
+
+    HTTPのリクエストは、すべてのガイドを合わせて1秒あたり rate 件まで、同じホストへは
+    同時に per_host 件までに制限する（ブラウザでの取得には適用しない）。
+    リンクはガイドの指定順・TOCの順に並べ、複数のガイドに含まれるURL（link_key() が同じもの）は
+    最初のガイドのものだけを残す。各リンクの guide には取得元のガイドのURLを記録する。
+    expand_concurrency（scrape_links() の concurrency）・block_resources・wait_for は
+    各ガイドの scrape_links() にそのまま渡す。
+    """
+    guide_urls = list(dict.fromkeys(guide_urls))
+    session = LimitedSession(create_session(pool_size=concurrency), RateLimiter(rate), HostLimiter(per_host))
+
+    def scrape_guide(guide_url):
+        try:
+            return scrape_links(guide_url, mode=mode, session=session, concurrency=expand_concurrency,
+                                block_resources=block_resources, wait_for=wait_for, parser=parser,
+                                profiler=profiler, cache=cache, cdp_endpoint=cdp_endpoint)
+        except Exception as e:
+            print(f"ガイドのリンクを取得できませんでした: {guide_url} ({e})")
+            return []
+
+    print(f"{len(guide_urls)}個のガイドを取得しています（同時に {concurrency} ガイド、"
+          f"毎秒 {rate} リクエスト、ホストごとに {per_host} 接続まで）...")
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            results = list(executor.map(scrape_guide, guide_urls))
+    finally:
+        session.close()
+
+    links = []
+    seen = set()
+    duplicates = 0
+    for guide_url, guide_links in zip(guide_urls, results):
+        print(f"  {guide_url}: {len(guide_links)}個")
+        for link in guide_links:
+            key = link_key(link['url'])
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            links.append(dict(link, guide=guide_url))
+    if duplicates:
+        print(f"複数のガイドに含まれる {duplicates} 個のリンクを除外しました")
+    print(f"HTTPリクエスト: {session.requests}件")
+    return links
+
+def read_guide_list(list_file):
+    """ガイドのURLの一覧（1行に1つ。空行と # で始まる行は無視）を読み込む関数
+
+    「ec2 https://docs.aws.amazon.com/...」のようにサービス名などを前に書いた行は、URLの部分だけを使う。
+    """
+    guide_urls = []
+    with open(list_file, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            urls = [token for token in line.split() if token.startswith('http')]
+            if urls:
+                guide_urls.append(urls[0])
+    return guide_urls
+
+def iter_scraped_links(guide_urls, mode='auto', **options):
+    """複数のガイドのリンクを順に取得し、ガイドごとに取得できしだい1件ずつ返すジェネレーター
+
+    受け取る側（アップロードなど）は、すべてのガイドの取得が終わるのを待たずに処理を始められる。
+    ガイド間で重複するURL（link_key() が同じもの）は最初の1件だけを返す。options は scrape_links() と同じ。
+    """
+    seen = set()
+    for guide_url in guide_urls:
+        for link in scrape_links(guide_url, mode=mode, **options):
+            key = link_key(link['url'])
+            if key in seen:
+                continue
+            seen.add(key)
+            yield link
+
+def write_links(links, output_file):
+    """抽出したリンクをファイルに書き込む関数"""
+    with open(output_file, "w", encoding="utf-8") as f:
+        if links:
+            print(f"\n合計 {len(links)} 個のリンクが見つかりました\n")
+
+            # リンクとそのテキストを表示とファイルへの書き込み
+            for i, link in enumerate(links, 1):
+                # コンソールには詳細情報を表示
+                link_info = f"{i}. {link['title']}: {link['url']}"
+                print(link_info)
+                # ファイルには項番とURLのみ記録
+                f.write(f"{i}. {link['url']}\n")
+        else:
+            error_msg = "ナビゲーションメニューが見つかりませんでした。セレクタを確認してください。"
+            print(error_msg)
+            f.write(error_msg + "\n")
+
+def read_link_snapshot(output_file):
+    """前回書き込んだリンクのファイル（項番. URL の形式）からURLを読み込む関数"""
+    urls = []
+    if not os.path.exists(output_file):
+        return None
+    with open(output_file, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.strip().split('. ', 1)
+            if len(parts) == 2 and parts[0].isdigit() and parts[1].startswith('http'):
+                urls.append(parts[1])
+    return urls
+
+def diff_links(previous_urls, links):
+    """前回のURLと今回のリンクを比較し、(追加されたリンク, 削除されたURL) を返す関数"""
+    previous = set(previous_urls)
+    current = {link['url'] for link in links}
+    added = [link for link in links if link['url'] not in previous]
+    removed = [url for url in previous_urls if url not in current]
+    return added, removed
+
+def write_link_diff(added, removed, diff_file):
+    """追加（+）・削除（-）されたリンクの一覧を書き込む関数"""
+    with open(diff_file, "w", encoding="utf-8") as f:
+        for link in added:
+            f.write(f"+ {link['url']}\t{link['title']}\n")
+        for url in removed:
+            f.write(f"- {url}\n")
+
+def write_tree(links, tree_file):
+    """リンクの階層情報（項番・深さ・親セクション・タイトル・URL）をTSVで書き込む関数"""
+    with open(tree_file, "w", encoding="utf-8") as f:
+        f.write("index\tdepth\tparent\ttitle\turl\n")
         for i, link in enumerate(links, 1):
-            href = link['href']
-            # 相対URLを絶対URLに変換
-            if not href.startswith('http'):
-                full_url = base_url + href
-            else:
-                full_url = href
-                
-            # リンクテキストを取得（spanタグ内にある場合が多い）
-            link_text = link.get_text(strip=True)
-            # コンソールには詳細情報を表示
-            link_info = f"{i}. {link_text}: {full_url}"
-            print(link_info)
-            # ファイルには項番とURLのみ記録
-            f.write(f"{i}. {full_url}\n")
+            f.write(f"{i}\t{link.get('depth', 0)}\t{link.get('parent', '')}\t{link['title']}\t{link['url']}\n")
+
+def main():
+    # コマンドライン引数の設定
+    parser = argparse.ArgumentParser(description='AWSドキュメントページのリンクを抽出します')
+    parser.add_argument('--url', type=str, nargs='+', default=None,
+                        help='抽出するAWSドキュメントページのURL（--guides を指定しない場合は必須。'
+                             '複数指定すると並行して取得し、1つのリストにまとめる）')
+    parser.add_argument('--guides', type=str, default=None,
+                        help='取得するガイドのURLの一覧ファイル（1行に1つ。サービス名などを前に書いてもよい）')
+    parser.add_argument('--guide-concurrency', type=int, default=8,
+                        help='複数のガイドを取得する場合に同時に取得するガイド数（デフォルト: 8）')
+    parser.add_argument('--rps', type=float, default=5.0,
+                        help='複数のガイドを取得する場合の、全体での1秒あたりのHTTPリクエスト数の上限（デフォルト: 5）')
+    parser.add_argument('--per-host', type=int, default=2,
+                        help='複数のガイドを取得する場合の、ホストごとの同時接続数の上限（デフォルト: 2）')
+    parser.add_argument('--output', type=str, default='aws_links.txt',
+                        help='結果を保存するファイル名（デフォルト: aws_links.txt）')
+    parser.add_argument('--mode', choices=['auto', 'http', 'browser', 'expand'], default='auto',
+                        help='取得方法（auto: HTTPで取得し失敗時のみブラウザ、http: HTTPのみ、browser: ブラウザのみ、'
+                             'expand: 折りたたまれたセクションも再帰的に展開。デフォルト: auto）')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='expandモードで同時に開くページ数（デフォルト: 4）')
+    parser.add_argument('--tree-output', type=str, default=None,
+                        help='階層の深さと親セクションを記録するTSVファイル名（省略時は出力しない）')
+    parser.add_argument('--wait', choices=['toc', 'networkidle'], default='toc',
+                        help='ブラウザ取得時の待機条件（toc: TOCのリンク表示まで、networkidle: 通信の完了まで。デフォルト: toc）')
+    parser.add_argument('--no-block', action='store_true',
+                        help='画像・フォント・スタイルシートや解析スクリプトの読み込みを中止しない')
+    parser.add_argument('--parser', choices=['auto', 'lxml', 'html.parser'], default='auto',
+                        help='HTMLパーサー（auto: lxmlがあればlxml、なければhtml.parser。デフォルト: auto）')
+    parser.add_argument('--cdp-endpoint', type=str, default=None,
+                        help='ブラウザを起動せずに接続する共有ブラウザのエンドポイント（例: http://127.0.0.1:9222）。'
+                             '終了時も共有ブラウザは閉じない')
+    parser.add_argument('--profile', type=str, nargs='?', const='scraper_profile.jsonl', default=None,
+                        help='手順ごとの所要時間をJSON Lines形式で記録し、終了時に集計を表示する'
+                             '（ファイル名省略時: scraper_profile.jsonl）')
+    parser.add_argument('--cache-dir', type=str, default='.scraper_cache',
+                        help='取得したTOCを保存し、次回はETag/Last-Modifiedで再検証するディレクトリ'
+                             '（デフォルト: .scraper_cache）')
+    parser.add_argument('--cache-max-mb', type=float, default=50,
+                        help='HTTPキャッシュの上限（MB）。超えた場合は古いものから削除する（デフォルト: 50）')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='HTTPキャッシュを使用しない')
+    parser.add_argument('--diff-output', type=str, default=None,
+                        help='前回の --output との差分（+ 追加 / - 削除）を書き込むファイル'
+                             '（デフォルト: <output>_diff.txt）')
+    parser.add_argument('--new-output', type=str, default=None,
+                        help='前回から追加されたリンクだけをアップローダーで読み込める形式で書き込むファイル'
+                             '（デフォルト: <output>_new.txt）')
+    parser.add_argument('--link-manifest', type=str, default=None,
+                        help='項番・タイトル・URL・セクションのパス・深さを記録するマニフェスト。'
+                             '拡張子が .db / .sqlite の場合はSQLite、それ以外はJSON Lines（デフォルト: <output>.jsonl）')
+    parser.add_argument('--no-link-manifest', action='store_true',
+                        help='リンクのマニフェストを書き込まない')
+    args = parser.parse_args()
+    guide_urls = (args.url or []) + (read_guide_list(args.guides) if args.guides else [])
+    if not guide_urls:
+        parser.error("--url または --guides を指定してください")
+
+    profiler = StepProfiler(args.profile, enabled=args.profile is not None)
+    cache = None if args.no_cache else HttpCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024 * 1024))
+    output_stem = os.path.splitext(args.output)[0]
+    diff_output = args.diff_output or f"{output_stem}_diff.txt"
+    new_output = args.new_output or f"{output_stem}_new.txt"
+    link_manifest = None if args.no_link_manifest else (args.link_manifest or f"{output_stem}.jsonl")
+
+    # 上書きする前に、前回のリンクの一覧を読み込んでおく
+    previous_urls = read_link_snapshot(args.output)
+
+    # 左ペインのリンクを抽出
+    print("ナビゲーションメニューからリンクを抽出しています...")
+    if len(guide_urls) > 1:
+        links = discover_guides(guide_urls, concurrency=args.guide_concurrency, rate=args.rps,
+                                per_host=args.per_host, mode=args.mode, parser=args.parser,
+                                profiler=profiler, cache=cache, cdp_endpoint=args.cdp_endpoint,
+                                expand_concurrency=args.concurrency, block_resources=not args.no_block,
+                                wait_for=args.wait)
     else:
-        error_msg = "ナビゲーションメニューが見つかりませんでした。セレクタを確認してください。"
-        print(error_msg)
-        f.write(error_msg + "\n")
-    
-print(f"\n処理が完了しました。結果は {os.path.abspath(output_file)} に保存されました。")
\ No newline at end of file
+        links = scrape_links(guide_urls[0], mode=args.mode, concurrency=args.concurrency,
+                             block_resources=not args.no_block, wait_for=args.wait, parser=args.parser,
+                             profiler=profiler, cache=cache, cdp_endpoint=args.cdp_endpoint)
+    if cache:
+        cache.save()
+        print(f"HTTPキャッシュ: 変更なし {cache.stats['revalidated']}件、取得 {cache.stats['fetched']}件")
+
+    span = profiler.start("link_write", links=len(links))
+    write_links(links, args.output)
+    if args.tree_output:
+        write_tree(links, args.tree_output)
+        print(f"階層情報を {os.path.abspath(args.tree_output)} に保存しました。")
+    if link_manifest and links:
+        write_manifest(links, link_manifest)
+        print(f"リンクのマニフェストを {os.path.abspath(link_manifest)} に保存しました。")
+
+    # 前回との差分と、追加されたリンクだけの一覧（アップローダーの --file に指定できる）
+    if links:
+        added, removed = diff_links(previous_urls or [], links)
+        if previous_urls is None:
+            print("前回の結果がないため、すべてのリンクを追加分として扱います")
+        else:
+            write_link_diff(added, removed, diff_output)
+            print(f"前回との差分: 追加 {len(added)}個、削除 {len(removed)}個（{os.path.abspath(diff_output)}）")
+        with open(new_output, "w", encoding="utf-8") as f:
+            for i, link in enumerate(added, 1):
+                f.write(f"{i}. {link['url']}\n")
+        print(f"追加されたリンクを {os.path.abspath(new_output)} に保存しました。")
+    profiler.finish(span)
+
+    profiler.summary()
+    profiler.close()
+
+    print(f"\n処理が完了しました。結果は {os.path.abspath(args.output)} に保存されました。")
+
+if __name__ == "__main__":
+    main()
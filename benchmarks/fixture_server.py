@@ -0,0 +1,84 @@
+"""ベンチマーク用のローカルHTTPサーバー
+
+本物の docs.aws.amazon.com や notebooklm.google.com にアクセスせずに
+計測できるよう、パスごとに応答と遅延を指定できる簡易サーバーを提供する。
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+
+class FixtureServer:
+    """パスごとの (本文, Content-Type, 遅延秒) を返すローカルサーバー
+
+    routes: {パス: (body, content_type, delay)} の辞書。GET と POST のどちらにも同じ応答を返し、
+    HEAD には本文を除いた同じ応答を返す。パスが '/' で終わる場合は前方一致で扱う。
+    (body, content_type, delay, status, headers) のようにステータスと追加のヘッダーも指定できる
+    （例: リダイレクトは (b'', 'text/plain', 0, 301, {'Location': '/new'})）。
+    """
+
+    def __init__(self, routes, host='127.0.0.1', port=0):
+        self.routes = routes
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.respond()
+
+            def do_HEAD(self):
+                self.respond(include_body=False)
+
+            def do_POST(self):
+                # 本文は使わないが、接続を再利用できるよう読み捨てる
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                self.respond()
+
+            def respond(self, include_body=True):
+                route = server.find_route(self.path.split('?', 1)[0])
+                if route is None:
+                    self.send_error(404)
+                    return
+                body, content_type, delay = route[:3]
+                status = route[3] if len(route) > 3 else 200
+                headers = route[4] if len(route) > 4 else {}
+                if callable(body):
+                    body = body(self.path)
+                if delay:
+                    time.sleep(delay)
+                data = body.encode('utf-8') if isinstance(body, str) else body
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if include_body:
+                    self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def find_route(self, path):
+        if path in self.routes:
+            return self.routes[path]
+        for prefix, route in self.routes.items():
+            if prefix.endswith('/') and path.startswith(prefix):
+                return route
+        return None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
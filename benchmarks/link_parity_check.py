@@ -0,0 +1,99 @@
+"""ローカルのテスト用ガイドで、取得方法ごとのリンクの一覧が一致するかを確認するスクリプト
+
+生成した AWS ガイド風ページ（doc-page-toc と toc-contents.json）をローカルで配信し、
+次の3つの結果を比較する。どれかが異なる場合は最初の相違点を表示して終了コード 1 で終了する。
+
+    toc_json: toc-contents.json を HTTP で取得して extract_links_from_toc_json() で抽出
+    html:     ガイドページを HTTP で取得して extract_links_from_html() で抽出
+    browser:  fetch_links_via_browser() で描画したページから抽出（Playwright が使えない場合は省略）
+
+タイトルと URL の並びに加えて、深さと親セクションも比較する。
+
+使用例:
+    python benchmarks/link_parity_check.py
+    python benchmarks/link_parity_check.py --links 649 --depth 4 --fanout 6 --parser html.parser
+    python benchmarks/link_parity_check.py --skip-browser
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_doc_link_scraper import (TOC_JSON_NAME, create_session, extract_links_from_html,  # noqa: E402
+                                  extract_links_from_toc_json, fetch_links_via_browser)
+from fixture_server import FixtureServer  # noqa: E402
+from mock_pages import build_guide_page, build_toc_tree, toc_json  # noqa: E402
+
+GUIDE_PATH = '/guide/'
+COMPARED_FIELDS = ('title', 'url', 'depth', 'parent')
+
+
+def normalize(links):
+    return [tuple(link.get(field) for field in COMPARED_FIELDS) for link in links]
+
+
+def first_difference(expected, actual):
+    """2つのリンクの一覧の最初の相違点を説明する文字列を返す（一致する場合は None）"""
+    for i, (a, b) in enumerate(zip(expected, actual)):
+        if a != b:
+            return f"{i + 1}番目が異なります: {dict(zip(COMPARED_FIELDS, a))} != {dict(zip(COMPARED_FIELDS, b))}"
+    if len(expected) != len(actual):
+        return f"件数が異なります: {len(expected)}件 != {len(actual)}件"
+    return None
+
+
+def collect_links(url, parser, skip_browser):
+    """取得方法ごとのリンクの一覧を返す（取得できなかった方法は含めない）"""
+    session = create_session()
+    try:
+        response = session.get(url.rsplit('/', 1)[0] + '/' + TOC_JSON_NAME)
+        response.raise_for_status()
+        results = {'toc_json': extract_links_from_toc_json(response.json(), url)}
+        response = session.get(url)
+        response.raise_for_status()
+        results['html'] = extract_links_from_html(response.text, url, parser=parser)
+    finally:
+        session.close()
+
+    if not skip_browser:
+        try:
+            results['browser'] = fetch_links_via_browser(url, parser=parser)
+        except Exception as e:
+            print(f"ブラウザでの取得を省略します（Playwrightを使用できません）: {e}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ローカルのテスト用ガイドで、取得方法ごとのリンクの一覧が一致するかを確認します')
+    parser.add_argument('--links', type=int, default=500, help='ガイドのTOCのリンク数（デフォルト: 500）')
+    parser.add_argument('--depth', type=int, default=3, help='TOCの階層の深さ（デフォルト: 3）')
+    parser.add_argument('--fanout', type=int, default=8, help='各階層の項目数（デフォルト: 8）')
+    parser.add_argument('--parser', choices=['auto', 'lxml', 'html.parser'], default='auto',
+                        help='HTMLパーサー（デフォルト: auto）')
+    parser.add_argument('--skip-browser', action='store_true', help='ブラウザでの取得を比較しない')
+    args = parser.parse_args()
+
+    toc = build_toc_tree(args.links, depth=args.depth, fanout=args.fanout)
+    routes = {
+        GUIDE_PATH + TOC_JSON_NAME: (toc_json(toc), 'application/json', 0),
+        GUIDE_PATH: (build_guide_page(toc), 'text/html; charset=utf-8', 0),
+    }
+    with FixtureServer(routes) as server:
+        results = collect_links(server.base_url + GUIDE_PATH + 'index.html', args.parser, args.skip_browser)
+
+    expected = normalize(results.pop('toc_json'))
+    print(f"toc_json: {len(expected)}件")
+    mismatched = False
+    for name, links in results.items():
+        difference = first_difference(expected, normalize(links))
+        if difference:
+            mismatched = True
+            print(f"{name}: {len(links)}件 - toc_json と一致しません。{difference}")
+        else:
+            print(f"{name}: {len(links)}件 - toc_json と一致しました")
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""ベンチマーク用の AWS ドキュメント風ページを生成するモジュール"""
+import json
+
+
+def build_toc_tree(links, depth=3, fanout=8):
+    """指定したリンク数・深さの TOC ツリー（toc-contents.json と同じ形式）を生成する"""
+    counter = iter(range(1, links + 1))
+
+    def build(level):
+        nodes = []
+        for _ in range(fanout):
+            try:
+                i = next(counter)
+            except StopIteration:
+                break
+            node = {'title': f'Page {i}', 'href': f'page{i}.html'}
+            if level + 1 < depth:
+                children = build(level + 1)
+                if children:
+                    node['contents'] = children
+            nodes.append(node)
+        return nodes
+
+    contents = []
+    while True:
+        chunk = build(0)
+        if not chunk:
+            break
+        contents.extend(chunk)
+    return {'title': 'Mock Guide', 'contents': contents}
+
+
+def render_toc_items(nodes):
+    """TOC ツリーを入れ子の ul/li の HTML に変換する"""
+    parts = []
+    for node in nodes:
+        parts.append(f'<li><a href="{node["href"]}"><span>{node["title"]}</span></a>')
+        if node.get('contents'):
+            parts.append('<ul>' + render_toc_items(node['contents']) + '</ul>')
+        parts.append('</li>')
+    return ''.join(parts)
+
+
+def build_guide_page(toc, body_paragraphs=0, head_html='', tail_html=''):
+    """doc-page-toc のナビゲーションを含むガイドページの HTML を生成する
+
+    body_paragraphs で本文の量を増やし、実際の大きなガイドページの解析コストを模す。
+    """
+    paragraph = ('<p>Amazon EC2 provides scalable computing capacity in the AWS Cloud. '
+                 '<code>aws ec2 describe-instances</code> <a href="#x">link</a></p>')
+    body = '<div id="main-content"><h1>Mock Guide</h1>' + paragraph * body_paragraphs + '</div>'
+    return ('<!DOCTYPE html><html><head><title>Mock Guide</title>' + head_html + '</head><body>'
+            '<div data-testid="doc-page-toc"><ul>' + render_toc_items(toc['contents']) + '</ul></div>'
+            + body + tail_html + '</body></html>')
+
+
+def toc_json(toc):
+    return json.dumps(toc)
+
+
+NOTEBOOK_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en"><head><title>Mock NotebookLM</title>
+<style>
+  .hidden { display: none; }
+  mat-dialog-container { display: block; border: 1px solid #888; padding: 8px; }
+</style>
+</head><body>
+<editable-project-title>Mock Notebook</editable-project-title>
+<section class="source-panel">
+  <button id="add-source">Add</button>
+  <div class="source-list"></div>
+</section>
+<mat-dialog-container class="mat-mdc-dialog-container hidden">
+  <mat-chip-set class="chips">
+    <mat-chip-option class="mat-mdc-chip">
+      <span class="mat-mdc-chip-action"><mat-icon>web</mat-icon>Website</span>
+    </mat-chip-option>
+    <mat-chip-option class="mat-mdc-chip">
+      <span class="mat-mdc-chip-action"><mat-icon>drive</mat-icon>Drive</span>
+    </mat-chip-option>
+  </mat-chip-set>
+  <div class="url-form hidden">
+    <div class="mat-mdc-form-field-flex">
+      <input formcontrolname="newUrl" class="mat-mdc-input-element" type="text">
+    </div>
+    <button id="insert" disabled>Insert</button>
+  </div>
+</mat-dialog-container>
+<script>
+  // UIの反応の遅さ（ミリ秒）
+  const UI_DELAY = %(ui_delay)d;
+  const dialog = document.querySelector('mat-dialog-container');
+  const chips = dialog.querySelector('.chips');
+  const form = dialog.querySelector('.url-form');
+  const input = dialog.querySelector('input');
+  const insert = document.getElementById('insert');
+  const list = document.querySelector('.source-list');
+  const later = (fn) => setTimeout(fn, UI_DELAY);
+
+  document.getElementById('add-source').addEventListener('click', () => later(() => {
+    input.value = '';
+    insert.disabled = true;
+    form.classList.add('hidden');
+    chips.classList.remove('hidden');
+    dialog.classList.remove('hidden');
+  }));
+  dialog.querySelector('.mat-mdc-chip-action').addEventListener('click', () => later(() => {
+    chips.classList.add('hidden');
+    form.classList.remove('hidden');
+  }));
+  document.addEventListener('keydown', (e) => {
+    if (e.key === 'Escape') dialog.classList.add('hidden');
+  });
+  input.addEventListener('input', () => { insert.disabled = !input.value.trim(); });
+  insert.addEventListener('click', () => {
+    const urls = input.value.split(/\\s+/).filter(Boolean);
+    // 本物と同じく、ダイアログはすぐに閉じて読み込み中の行を追加し、RPCの応答で完了にする
+    dialog.classList.add('hidden');
+    const rows = urls.map(url => {
+      const row = document.createElement('div');
+      row.className = 'source-item loading';
+      row.innerHTML = '<a></a>';
+      row.querySelector('a').href = url;
+      row.querySelector('a').textContent = url;
+      list.appendChild(row);
+      return row;
+    });
+    fetch('/_/batchexecute', {method: 'POST', body: JSON.stringify(urls)})
+      .then(() => rows.forEach(row => row.classList.remove('loading')));
+  });
+</script>
+</body></html>"""
+
+
+def build_notebook_page(ui_delay_ms=100):
+    """NotebookLM のソース追加の画面を模したページの HTML を生成する
+
+    「Add」ボタン、Website のチップ、input[formcontrolname='newUrl']、「Insert」ボタンを持ち、
+    各操作への反応は ui_delay_ms だけ遅れる。挿入時は /_/batchexecute に POST する
+    （応答の遅延はサーバー側のルートで指定する）。
+    """
+    return NOTEBOOK_PAGE_TEMPLATE % {'ui_delay': ui_delay_ms}
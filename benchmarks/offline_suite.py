@@ -0,0 +1,202 @@
+"""ローカルのテスト用ページだけで両ツールのスループットを計測するスクリプト
+
+本物の docs.aws.amazon.com や notebooklm.google.com にはアクセスせず、次を計測する。
+
+    スクレイパー: 生成した AWS ガイド風ページ（doc-page-toc と toc-contents.json）から
+                  scrape_links() でリンクを抽出し、リンク/秒を算出
+    アップローダー: NotebookLM を模したページに add_urls_to_notebooklm() で URL を追加し、
+                  URL/分を算出
+    URLの検証: 取得可能・リダイレクト・404 の URL を validate_urls() で確認し、URL/秒を算出
+                  （リダイレクト先への置き換えと 404 の除外が期待どおりかも確認する）
+
+--results を指定すると、結果をコミットのハッシュとともに JSON Lines で追記するため、
+コミット間で性能を比較できる。
+
+使用例:
+    python benchmarks/offline_suite.py --links 500 --depth 3 --fanout 8
+    python benchmarks/offline_suite.py --urls 20 --ui-delay 150 --rpc-delay 1.0 --tabs 2
+    python benchmarks/offline_suite.py --skip-uploader --results benchmark_results.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_doc_link_scraper import TOC_JSON_NAME, scrape_links, write_links  # noqa: E402
+from notebook_lm_uploader import add_urls_to_notebooklm  # noqa: E402
+from selector_cache import SelectorCache  # noqa: E402
+from url_validator import STATUS_DEAD, select_usable, validate_urls  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+from mock_pages import build_guide_page, build_notebook_page, build_toc_tree, toc_json  # noqa: E402
+
+GUIDE_PATH = '/guide/'
+NOTEBOOK_PATH = '/notebook/mock'
+VALIDATE_PATH = '/validate/'
+CANONICAL_PATH = '/validate/canonical/'
+
+# check_auth_state() を通過させてヘッドレスで実行するためのダミーのログイン状態
+MOCK_AUTH_STATE = {
+    "cookies": [{"name": "SID", "value": "mock", "domain": ".google.com", "path": "/",
+                 "expires": -1, "httpOnly": True, "secure": True, "sameSite": "Lax"}],
+    "origins": []
+}
+
+
+def build_routes(args):
+    toc = build_toc_tree(args.links, depth=args.depth, fanout=args.fanout)
+    page = build_guide_page(toc, body_paragraphs=args.body_paragraphs)
+    return {
+        GUIDE_PATH + TOC_JSON_NAME: (toc_json(toc), 'application/json', args.page_delay),
+        GUIDE_PATH: (page, 'text/html; charset=utf-8', args.page_delay),
+        NOTEBOOK_PATH: (build_notebook_page(args.ui_delay), 'text/html; charset=utf-8', 0),
+        '/_/batchexecute': ('[]', 'application/json', args.rpc_delay),
+        CANONICAL_PATH: ('<html></html>', 'text/html; charset=utf-8', args.page_delay),
+        **validation_routes(args.validate_urls, args.page_delay),
+    }
+
+
+def validation_routes(count, delay):
+    """URLの検証用のルート（3件ごとに 取得可能 / リダイレクト / 404（ルートなし））"""
+    routes = {}
+    for i in range(count):
+        path = f'{VALIDATE_PATH}page{i}.html'
+        if i % 3 == 0:
+            routes[path] = ('<html></html>', 'text/html; charset=utf-8', delay)
+        elif i % 3 == 1:
+            routes[path] = (b'', 'text/plain', delay, 301, {'Location': f'{CANONICAL_PATH}page{i}.html'})
+    return routes
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_scraper(base_url, mode, runs, output_file):
+    """scrape_links() とリンクの書き込みの所要時間を計測し、リンク/秒を返す"""
+    url = base_url + GUIDE_PATH + 'index.html'
+    timings = []
+    link_count = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        links = scrape_links(url, mode=mode)
+        write_links(links, output_file)
+        timings.append(time.perf_counter() - start)
+        link_count = len(links)
+    median = statistics.median(timings)
+    return {'tool': 'scraper', 'mode': mode, 'links': link_count, 'seconds': round(median, 3),
+            'links_per_sec': round(link_count / median, 1) if median else None}
+
+
+def bench_uploader(base_url, urls, auth_state, args):
+    """モックのノートブックに URL を追加する所要時間を計測し、URL/分を返す"""
+    start = time.perf_counter()
+    result = add_urls_to_notebooklm(base_url + NOTEBOOK_PATH, urls, max_urls=len(urls),
+                                    batch_size=args.batch_size, auth_state=auth_state, headless=True,
+                                    selector_cache=SelectorCache(), skip_existing=False,
+                                    prepare_next=not args.no_prepare_next, tabs=args.tabs, keep_open=False)
+    elapsed = time.perf_counter() - start
+    return {'tool': 'uploader', 'batch_size': args.batch_size, 'tabs': args.tabs,
+            'prepare_next': not args.no_prepare_next, 'urls': len(urls), 'added': result['added'],
+            'seconds': round(elapsed, 3),
+            'urls_per_min': round(result['added'] / elapsed * 60, 1) if elapsed else None}
+
+
+def bench_validator(base_url, count, concurrency):
+    """validate_urls() の所要時間を計測し、URL/秒を返す（結果が期待どおりでない場合は表示する）"""
+    urls = [f'{base_url}{VALIDATE_PATH}page{i}.html' for i in range(count)]
+    start = time.perf_counter()
+    results = validate_urls(urls, concurrency=concurrency)
+    elapsed = time.perf_counter() - start
+
+    usable = select_usable(results)
+    dead = sum(1 for result in results if result['status'] == STATUS_DEAD)
+    redirected = sum(1 for i in usable if results[i]['final_url'].startswith(base_url + CANONICAL_PATH))
+    expected_dead = count // 3
+    if dead != expected_dead or len(usable) != count - expected_dead or redirected != (count + 1) // 3:
+        print(f"URLの検証結果が期待と異なります: 取得可能 {len(usable)}件、取得不可 {dead}件、リダイレクト {redirected}件")
+    return {'tool': 'validator', 'concurrency': concurrency, 'urls': count, 'usable': len(usable), 'dead': dead,
+            'redirected': redirected, 'seconds': round(elapsed, 3),
+            'urls_per_sec': round(count / elapsed, 1) if elapsed else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ローカルのテスト用ページで両ツールのスループットを計測します')
+    parser.add_argument('--links', type=int, default=500, help='ガイドのTOCのリンク数（デフォルト: 500）')
+    parser.add_argument('--depth', type=int, default=3, help='TOCの階層の深さ（デフォルト: 3）')
+    parser.add_argument('--fanout', type=int, default=8, help='各階層の項目数（デフォルト: 8）')
+    parser.add_argument('--body-paragraphs', type=int, default=0, help='ガイドページの本文の段落数（デフォルト: 0）')
+    parser.add_argument('--page-delay', type=float, default=0.0, help='ガイドページの応答遅延（秒、デフォルト: 0）')
+    parser.add_argument('--scraper-modes', type=str, nargs='+', default=['http', 'browser'],
+                        choices=['http', 'browser', 'expand'], help='計測するスクレイパーの取得方法')
+    parser.add_argument('--runs', type=int, default=3, help='スクレイパーの計測回数（デフォルト: 3）')
+    parser.add_argument('--urls', type=int, default=10, help='ノートブックに追加するURLの数（デフォルト: 10）')
+    parser.add_argument('--ui-delay', type=int, default=100, help='モックのUIの反応の遅延（ミリ秒、デフォルト: 100）')
+    parser.add_argument('--rpc-delay', type=float, default=0.5, help='挿入のRPCの応答遅延（秒、デフォルト: 0.5）')
+    parser.add_argument('--batch-size', type=int, default=1, help='アップローダーの --batch-size（デフォルト: 1）')
+    parser.add_argument('--tabs', type=int, default=1, help='アップローダーの --tabs（デフォルト: 1）')
+    parser.add_argument('--no-prepare-next', action='store_true', help='アップローダーの --no-prepare-next')
+    parser.add_argument('--validate-urls', type=int, default=300, help='検証するURLの数（デフォルト: 300）')
+    parser.add_argument('--validate-concurrency', type=int, default=16,
+                        help='URLの検証の同時実行数（デフォルト: 16）')
+    parser.add_argument('--skip-scraper', action='store_true', help='スクレイパーを計測しない')
+    parser.add_argument('--skip-uploader', action='store_true', help='アップローダーを計測しない')
+    parser.add_argument('--skip-validator', action='store_true', help='URLの検証を計測しない')
+    parser.add_argument('--results', type=str, default=None, help='結果を追記する JSON Lines ファイル')
+    args = parser.parse_args()
+
+    results = []
+    with FixtureServer(build_routes(args)) as server, tempfile.TemporaryDirectory() as tmp_dir:
+        if not args.skip_scraper:
+            for mode in args.scraper_modes:
+                try:
+                    results.append(bench_scraper(server.base_url, mode, args.runs,
+                                                 os.path.join(tmp_dir, 'links.txt')))
+                except Exception as e:
+                    print(f"スクレイパー（{mode}）を計測できませんでした: {e}")
+
+        if not args.skip_uploader:
+            auth_state = os.path.join(tmp_dir, 'auth_state.json')
+            with open(auth_state, 'w', encoding='utf-8') as f:
+                json.dump(MOCK_AUTH_STATE, f)
+            urls = [f'https://docs.aws.amazon.com/mock/latest/guide/page{i}.html' for i in range(1, args.urls + 1)]
+            try:
+                results.append(bench_uploader(server.base_url, urls, auth_state, args))
+            except Exception as e:
+                print(f"アップローダーを計測できませんでした: {e}")
+
+        if not args.skip_validator:
+            results.append(bench_validator(server.base_url, args.validate_urls, args.validate_concurrency))
+
+    print(f"\n{'対象':<28}{'件数':>8}{'所要時間(秒)':>14}{'スループット':>16}")
+    for result in results:
+        if result['tool'] == 'scraper':
+            print(f"{'scraper (' + result['mode'] + ')':<28}{result['links']:>8}{result['seconds']:>14.2f}"
+                  f"{result['links_per_sec']:>12} リンク/秒")
+        elif result['tool'] == 'validator':
+            print(f"{'validator (concurrency=' + str(result['concurrency']) + ')':<28}{result['urls']:>8}"
+                  f"{result['seconds']:>14.2f}{result['urls_per_sec']:>12} URL/秒")
+        else:
+            label = f"uploader (batch={result['batch_size']}, tabs={result['tabs']})"
+            print(f"{label:<28}{result['added']:>8}{result['seconds']:>14.2f}"
+                  f"{result['urls_per_min']:>13} URL/分")
+
+    if args.results:
+        revision = git_revision()
+        with open(args.results, 'a', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps({'ts': time.time(), 'revision': revision, **result}, ensure_ascii=False) + '\n')
+        print(f"結果を {os.path.abspath(args.results)} に追記しました")
+
+
+if __name__ == '__main__':
+    main()
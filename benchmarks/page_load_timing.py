@@ -0,0 +1,86 @@
+"""get_page_html() の待機方式ごとの所要時間を比較するスクリプト
+
+遅いダミーの画像・スタイルシート・解析スクリプトと、通信を発生させ続ける
+ビーコンを含むローカルのガイドページに対して、次の2つを計測する。
+
+    従来: すべてのリソースを読み込み networkidle まで待機
+    新方式: 不要なリソースを中止し、TOCのリンク表示で完了
+
+使用例:
+    python benchmarks/page_load_timing.py --links 300 --delay 1.5 --runs 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_doc_link_scraper import get_page_html, extract_links_from_html  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+from mock_pages import build_guide_page, build_toc_tree  # noqa: E402
+
+SLOW_HEAD = """<link rel="stylesheet" href="/slow/style.css">
+<script async src="/slow/tracker.js"></script>"""
+
+SLOW_TAIL = """<img src="/slow/hero.png">
+<script>
+  // 解析用ビーコンを模して、しばらく通信を発生させ続ける
+  let count = 0;
+  const timer = setInterval(() => {
+    fetch('/slow/beacon?' + count);
+    if (++count >= %d) clearInterval(timer);
+  }, 300);
+</script>"""
+
+
+def build_routes(links, delay, beacons):
+    page = build_guide_page(build_toc_tree(links, depth=1, fanout=links),
+                            head_html=SLOW_HEAD, tail_html=SLOW_TAIL % beacons)
+    return {
+        '/guide/index.html': (page, 'text/html; charset=utf-8', 0),
+        '/slow/': ('', 'application/octet-stream', delay),
+    }
+
+
+def measure(url, runs, **kwargs):
+    timings = []
+    link_count = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        html = get_page_html(url, **kwargs)
+        timings.append(time.perf_counter() - start)
+        link_count = len(extract_links_from_html(html, url))
+    return timings, link_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='get_page_html() の待機方式ごとの所要時間を比較します')
+    parser.add_argument('--links', type=int, default=300, help='TOCのリンク数（デフォルト: 300）')
+    parser.add_argument('--delay', type=float, default=1.5, help='ダミーリソースの応答遅延（秒、デフォルト: 1.5）')
+    parser.add_argument('--beacons', type=int, default=10, help='ビーコンの送信回数（デフォルト: 10）')
+    parser.add_argument('--runs', type=int, default=3, help='各方式の計測回数（デフォルト: 3）')
+    args = parser.parse_args()
+
+    modes = [
+        ('従来 (networkidle, ブロックなし)', {'block_resources': False, 'wait_for': 'networkidle'}),
+        ('新方式 (TOC待機, ブロックあり)', {'block_resources': True, 'wait_for': 'toc'}),
+    ]
+
+    with FixtureServer(build_routes(args.links, args.delay, args.beacons)) as server:
+        url = server.base_url + '/guide/index.html'
+        results = [(label, *measure(url, args.runs, **kwargs)) for label, kwargs in modes]
+
+    print(f"\n{'方式':<36}{'リンク数':>8}{'中央値(秒)':>12}{'最小(秒)':>10}{'最大(秒)':>10}")
+    for label, timings, link_count in results:
+        print(f"{label:<36}{link_count:>8}{statistics.median(timings):>12.2f}"
+              f"{min(timings):>10.2f}{max(timings):>10.2f}")
+    baseline = statistics.median(results[0][1])
+    improved = statistics.median(results[1][1])
+    if improved > 0:
+        print(f"\n高速化: {baseline / improved:.1f} 倍")
+
+
+if __name__ == '__main__':
+    main()
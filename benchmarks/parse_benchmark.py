@@ -0,0 +1,89 @@
+"""ナビゲーションメニューの解析方式ごとの処理時間とピークメモリを比較するスクリプト
+
+保存済みのガイドページ（--html）または生成した大きなページに対して、次を計測する。
+
+    従来: ページ全体を html.parser で解析して soup.find で TOC を探す
+    新方式: SoupStrainer で TOC の div だけを解析（html.parser / lxml）
+
+使用例:
+    python benchmarks/parse_benchmark.py --html saved_userguide.html --runs 5
+    python benchmarks/parse_benchmark.py --links 649 --body-paragraphs 20000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_doc_link_scraper import HAS_LXML, get_base_url, to_absolute_url, iter_links_from_html  # noqa: E402
+from mock_pages import build_guide_page, build_toc_tree  # noqa: E402
+
+PAGE_URL = 'https://docs.aws.amazon.com/AWSEC2/latest/UserGuide/concepts.html'
+
+
+def legacy_parse(html, url):
+    """変更前の実装と同じく、ページ全体の木構造を構築してからリンクを抽出する"""
+    soup = BeautifulSoup(html, 'html.parser')
+    nav_div = soup.find('div', {'data-testid': 'doc-page-toc'})
+    base_url = get_base_url(url)
+    return [to_absolute_url(link['href'], base_url) for link in nav_div.find_all('a', href=True)]
+
+
+def strainer_parse(parser):
+    def parse(html, url):
+        return [link['url'] for link in iter_links_from_html(html, url, parser=parser)]
+    return parse
+
+
+def measure(func, html, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func(html, PAGE_URL)
+        timings.append(time.perf_counter() - start)
+
+    # ピークメモリは計測のオーバーヘッドを避けるため別に1回だけ測る
+    tracemalloc.start()
+    func(html, PAGE_URL)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, statistics.median(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TOCの解析方式ごとの処理時間とピークメモリを比較します')
+    parser.add_argument('--html', type=str, default=None, help='保存済みのガイドページのHTMLファイル')
+    parser.add_argument('--links', type=int, default=649, help='生成ページのリンク数（デフォルト: 649）')
+    parser.add_argument('--body-paragraphs', type=int, default=5000, help='生成ページの本文の段落数（デフォルト: 5000）')
+    parser.add_argument('--runs', type=int, default=5, help='各方式の計測回数（デフォルト: 5）')
+    args = parser.parse_args()
+
+    if args.html:
+        with open(args.html, 'r', encoding='utf-8') as f:
+            html = f.read()
+    else:
+        html = build_guide_page(build_toc_tree(args.links), body_paragraphs=args.body_paragraphs)
+    print(f"HTMLサイズ: {len(html) / 1024:.0f} KB")
+
+    methods = [('従来 (全体を html.parser)', legacy_parse),
+               ('SoupStrainer + html.parser', strainer_parse('html.parser'))]
+    if HAS_LXML:
+        methods.append(('SoupStrainer + lxml', strainer_parse('lxml')))
+    else:
+        print("lxmlがインストールされていないため、lxmlでの計測は省略します")
+
+    results = [(label, *measure(func, html, args.runs)) for label, func in methods]
+    expected = results[0][1]
+
+    print(f"\n{'方式':<30}{'リンク数':>8}{'中央値(ms)':>12}{'ピーク(MB)':>12}  結果一致")
+    for label, links, median, peak in results:
+        print(f"{label:<30}{len(links):>8}{median * 1000:>12.1f}{peak / 1024 / 1024:>12.1f}  {links == expected}")
+
+
+if __name__ == '__main__':
+    main()
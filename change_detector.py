@@ -0,0 +1,164 @@
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import requests
+from atomic_file import write_json_atomic
+from aws_doc_link_scraper import create_session, http_get, read_link_snapshot, resolve_parser
+from http_cache import HttpCache
+
+# 本文として扱う要素だけを解析対象にするための条件（先に見つかったものを使う）。
+# ナビゲーションやフッターの変更は無視する
+MAIN_CONTENT_STRAINERS = (
+    SoupStrainer(id=['main-col-body', 'main-content']),
+    SoupStrainer('main'),
+)
+
+# 本文から除外する要素（ページごとに変わる埋め込みやスクリプト）
+IGNORED_TAGS = ('script', 'style', 'noscript', 'awsdocs-page-header', 'awsdocs-copyright')
+
+def extract_main_element(html, parser='auto'):
+    """ページの本文の要素（スクリプトなどを除いたもの）を返す関数"""
+    for strainer in MAIN_CONTENT_STRAINERS:
+        element = BeautifulSoup(html, resolve_parser(parser), parse_only=strainer)
+        if element.contents:
+            break
+    else:
+        # 本文の要素が見つからないページはページ全体を使う
+        soup = BeautifulSoup(html, resolve_parser(parser))
+        element = soup.body or soup
+    for tag in element.find_all(IGNORED_TAGS):
+        tag.decompose()
+    return element
+
+def extract_main_text(html, parser='auto'):
+    """ページの本文のテキストを空白を正規化して返す関数"""
+    return re.sub(r'\s+', ' ', extract_main_element(html, parser).get_text(' ')).strip()
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class HashIndex:
+    """URLごとの本文のハッシュを保存する索引（JSONファイル）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"ハッシュの索引を読み込めませんでした（新しく作成します）: {e}")
+                self.entries = {}
+
+    def get(self, url):
+        entry = self.entries.get(url)
+        return entry["hash"] if entry else None
+
+    def update(self, url, digest):
+        """ハッシュを記録し、前回から変わった場合は True を返す"""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(url)
+            changed = entry is not None and entry["hash"] != digest
+            if entry is None or changed:
+                self.entries[url] = {"hash": digest, "checked_at": now, "changed_at": now}
+            else:
+                entry["checked_at"] = now
+            return changed
+
+    def save(self):
+        with self.lock:
+            write_json_atomic(self.path, self.entries)
+
+def check_page(url, session, index, cache=None, parser='auto'):
+    """1ページを取得して本文のハッシュを比較し、(URL, 状態, エラー) を返す関数
+
+    状態は changed（本文が変わった）/ unchanged / new（初めて確認した）/ error のいずれか。
+    """
+    try:
+        response = http_get(session, url, cache)
+        if not response.ok:
+            return url, "error", f"HTTP {response.status_code}"
+        if getattr(response, 'from_cache', False) and index.get(url):
+            # 304 Not Modified の場合は本文も変わっていない
+            index.update(url, index.get(url))
+            return url, "unchanged", None
+        is_new = index.get(url) is None
+        changed = index.update(url, content_hash(extract_main_text(response.text, parser)))
+        return url, "new" if is_new else ("changed" if changed else "unchanged"), None
+    except requests.RequestException as e:
+        return url, "error", str(e)
+
+def detect_changes(urls, index, concurrency=8, cache=None, parser='auto'):
+    """URLのリストを並行して確認し、URLごとの (URL, 状態, エラー) のリストを入力の順に返す関数"""
+    session = create_session(pool_size=concurrency)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(lambda url: check_page(url, session, index, cache, parser), urls))
+    finally:
+        session.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='AWSドキュメントの各ページの本文の変更を検出します')
+    parser.add_argument('--file', type=str, default='aws_links.txt',
+                        help='確認するURLリスト（スクレイパーの出力形式、デフォルト: aws_links.txt）')
+    parser.add_argument('--output', type=str, default='changed_links.txt',
+                        help='本文が変わったURLを書き込むファイル（デフォルト: changed_links.txt）')
+    parser.add_argument('--index', type=str, default='content_hashes.json',
+                        help='URLごとの本文のハッシュを保存するファイル（デフォルト: content_hashes.json）')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='同時に取得するページ数（デフォルト: 8）')
+    parser.add_argument('--include-new', action='store_true',
+                        help='初めて確認したURLも出力に含める')
+    parser.add_argument('--cache-dir', type=str, default='.page_cache',
+                        help='取得したページを保存し、次回はETag/Last-Modifiedで再検証するディレクトリ'
+                             '（デフォルト: .page_cache）')
+    parser.add_argument('--cache-max-mb', type=float, default=200,
+                        help='HTTPキャッシュの上限（MB、デフォルト: 200）')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='HTTPキャッシュを使用しない')
+    parser.add_argument('--parser', choices=['auto', 'lxml', 'html.parser'], default='auto',
+                        help='HTMLパーサー（auto: lxmlがあればlxml、なければhtml.parser。デフォルト: auto）')
+    args = parser.parse_args()
+
+    urls = read_link_snapshot(args.file)
+    if not urls:
+        print(f"{args.file} にURLが見つかりませんでした。")
+        return
+
+    index = HashIndex(args.index)
+    cache = None if args.no_cache else HttpCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024 * 1024))
+    print(f"{len(urls)}個のページを確認しています（同時に {args.concurrency} ページ）...")
+    start = time.time()
+    try:
+        results = detect_changes(urls, index, concurrency=args.concurrency, cache=cache, parser=args.parser)
+    finally:
+        if cache:
+            cache.save()
+    index.save()
+
+    counts = {}
+    for url, status, error in results:
+        counts[status] = counts.get(status, 0) + 1
+        if status == "error":
+            print(f"  取得できませんでした: {url}（{error}）")
+    print(f"確認が完了しました（{time.time() - start:.1f}秒）: 変更 {counts.get('changed', 0)}件、"
+          f"変更なし {counts.get('unchanged', 0)}件、初回 {counts.get('new', 0)}件、エラー {counts.get('error', 0)}件")
+
+    output_statuses = ("changed", "new") if args.include_new else ("changed",)
+    changed_urls = [url for url, status, _ in results if status in output_statuses]
+    with open(args.output, "w", encoding="utf-8") as f:
+        for i, url in enumerate(changed_urls, 1):
+            f.write(f"{i}. {url}\n")
+    print(f"本文が変わった {len(changed_urls)} 個のURLを {os.path.abspath(args.output)} に保存しました。")
+
+if __name__ == "__main__":
+    main()
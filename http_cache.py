@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from atomic_file import write_json_atomic
+
+class CachedResponse:
+    """HttpCache.get() の応答（requests.Response と同じ使い方ができる最小限のもの）"""
+
+    def __init__(self, status_code, content, encoding=None, from_cache=False):
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+        self.from_cache = from_cache
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+class HttpCache:
+    """取得したページをディスクに保存し、次回は ETag / Last-Modified で再検証するHTTPキャッシュ
+
+    サーバーが 304 Not Modified を返した場合は保存済みの本文を使うため、
+    変更がなければ本文を転送せずに済む。保存する本文の合計が max_bytes を
+    超えた場合は、最後に使われたのが古いものから削除する。
+
+    索引（index.json）は取得のたびには書き込まないため、取得が終わったら save() を呼ぶ。
+    """
+
+    INDEX_NAME = 'index.json'
+
+    def __init__(self, cache_dir, max_bytes=50 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.entries = {}
+        self.stats = {"revalidated": 0, "fetched": 0}
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        index_path = os.path.join(cache_dir, self.INDEX_NAME)
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"HTTPキャッシュの索引を読み込めませんでした（新しく作成します）: {e}")
+                self.entries = {}
+
+    def _body_path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def _read_body(self, url):
+        try:
+            with open(self._body_path(url), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get(self, session, url, timeout=None):
+        """url を取得する（保存済みの場合は条件付きリクエストで再検証する）"""
+        with self.lock:
+            entry = self.entries.get(url)
+        headers = {}
+        cached_body = self._read_body(url) if entry else None
+        if cached_body is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = session.get(url, timeout=timeout, headers=headers)
+        if response.status_code == 304 and cached_body is not None:
+            with self.lock:
+                entry['last_used'] = time.time()
+                self.stats["revalidated"] += 1
+            return CachedResponse(200, cached_body, entry.get('encoding'), from_cache=True)
+
+        with self.lock:
+            self.stats["fetched"] += 1
+        if response.ok and (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+            self._store(url, response)
+        return CachedResponse(response.status_code, response.content, response.encoding)
+
+    def _store(self, url, response):
+        content = response.content
+        if len(content) > self.max_bytes:
+            return
+        tmp_path = f"{self._body_path(url)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, self._body_path(url))
+        with self.lock:
+            self.entries[url] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'encoding': response.encoding,
+                'size': len(content),
+                'last_used': time.time()
+            }
+            self._evict()
+
+    def _evict(self):
+        """本文の合計が上限を超えている間、最後に使われたのが古いものから削除する"""
+        total = sum(entry['size'] for entry in self.entries.values())
+        for url, entry in sorted(self.entries.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._body_path(url))
+            except OSError:
+                pass
+            del self.entries[url]
+            total -= entry['size']
+
+    def save(self):
+        with self.lock:
+            write_json_atomic(os.path.join(self.cache_dir, self.INDEX_NAME), self.entries, indent=None)
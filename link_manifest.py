@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+
+# SQLiteで書き込むマニフェストの拡張子（それ以外はJSON Lines）
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+# セクションのパスを1つの文字列で表す場合の区切り
+SECTION_SEPARATOR = ' > '
+
+def is_sqlite_manifest(path):
+    return os.path.splitext(path)[1].lower() in SQLITE_EXTENSIONS
+
+def index_path_for(path):
+    """JSON Linesのマニフェストに対応するセクションの索引のパス"""
+    return path + '.idx.json'
+
+def section_paths(links):
+    """各リンクの上位セクションのタイトルのリスト（セクションのパス）を求める関数
+
+    リンクは TOC の順（深さ優先）に並んでいる前提で、深さから祖先をたどる。
+    リンクを持たない見出しだけのセクションは、親セクション（parent）の名前で補う。
+    """
+    stack = []
+    paths = []
+    for link in links:
+        depth = link.get('depth', 0)
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        path = [title for _, title in stack]
+        parent = link.get('parent')
+        if parent and (not path or path[-1] != parent):
+            path.append(parent)
+        paths.append(path)
+        stack.append((depth, link['title']))
+    return paths
+
+def section_names(section, title):
+    """リンクが属するセクションの名前（各階層のタイトルと、先頭からのパス）を返す関数"""
+    full_path = section + [title]
+    names = set(full_path)
+    names.update(SECTION_SEPARATOR.join(full_path[:i]) for i in range(2, len(full_path) + 1))
+    return names
+
+def build_section_ranges(records):
+    """セクションの名前ごとに、属するリンクの連続した範囲 [開始の項番, 終了の項番, 開始位置] を求める関数
+
+    records は (項番, セクションの名前の集合, 開始位置) を TOC の順に返すもの。
+    """
+    ranges = {}
+    for index, names, offset in records:
+        for name in names:
+            spans = ranges.setdefault(name, [])
+            if spans and spans[-1][1] == index - 1:
+                spans[-1][1] = index
+            else:
+                spans.append([index, index, offset])
+    return ranges
+
+def write_manifest(links, path):
+    """リンクを項番・タイトル・URL・セクションのパス・深さ付きのマニフェストに書き込む関数
+
+    複数のガイドから取得したリンク（guide を持つもの）は、取得元のガイドのURLも記録する。
+    拡張子が .db / .sqlite の場合はSQLite、それ以外はJSON Linesで書き込む。
+    JSON Linesの場合は、セクションごとの範囲とファイル内の位置を <path>.idx.json に書き込み、
+    --section の指定時にファイル全体を読まずに該当する行だけを読めるようにする。
+    """
+    records = [{'index': i, 'title': link['title'], 'url': link['url'], 'depth': link.get('depth', 0),
+                'section': section, 'guide': link.get('guide')}
+               for i, (link, section) in enumerate(zip(links, section_paths(links)), 1)]
+    if is_sqlite_manifest(path):
+        _write_sqlite(records, path)
+        return
+
+    offsets = []
+    with open(path, 'wb') as f:
+        for record in records:
+            offsets.append(f.tell())
+            f.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+    ranges = build_section_ranges((record['index'], section_names(record['section'], record['title']), offset)
+                                  for record, offset in zip(records, offsets))
+    with open(index_path_for(path), 'w', encoding='utf-8') as f:
+        json.dump({'count': len(records), 'sections': ranges}, f, ensure_ascii=False)
+
+def _write_sqlite(records, path):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('CREATE TABLE links (idx INTEGER PRIMARY KEY, title TEXT, url TEXT, depth INTEGER, section TEXT, '
+                     'guide TEXT)')
+        conn.execute('CREATE TABLE sections (name TEXT, start_idx INTEGER, end_idx INTEGER)')
+        conn.executemany('INSERT INTO links VALUES (?, ?, ?, ?, ?, ?)',
+                         [(r['index'], r['title'], r['url'], r['depth'], json.dumps(r['section'], ensure_ascii=False),
+                           r['guide'])
+                          for r in records])
+        ranges = build_section_ranges((r['index'], section_names(r['section'], r['title']), None) for r in records)
+        conn.executemany('INSERT INTO sections VALUES (?, ?, ?)',
+                         [(name, start, end) for name, spans in ranges.items() for start, end, _ in spans])
+        conn.execute('CREATE INDEX sections_name ON sections (name COLLATE NOCASE)')
+        conn.commit()
+    finally:
+        conn.close()
+
+def iter_manifest(path, section=None, start=None, end=None):
+    """マニフェストのリンクを TOC の順に1件ずつ返すジェネレーター
+
+    section を指定すると、その名前（タイトル、または "親 > 子" のパス。大文字小文字は区別しない）の
+    セクション以下のリンクだけを返す。start / end は項番（1から始まる）の範囲。
+    """
+    if is_sqlite_manifest(path):
+        yield from _iter_sqlite(path, section, start, end)
+        return
+
+    if section is None:
+        spans = [[start or 1, end or float('inf'), None]]
+    else:
+        with open(index_path_for(path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        spans = sorted(span for name, name_spans in index['sections'].items()
+                       if name.lower() == section.lower() for span in name_spans)
+
+    with open(path, 'rb') as f:
+        last = 0
+        for span_start, span_end, offset in spans:
+            span_start = max(span_start, start or 1, last + 1)
+            span_end = min(span_end, end or float('inf'))
+            if span_start > span_end:
+                continue
+            if offset is not None:
+                f.seek(offset)
+            for line in f:
+                record = json.loads(line)
+                if record['index'] < span_start:
+                    continue
+                if record['index'] > span_end:
+                    break
+                last = record['index']
+                yield record
+
+def _iter_sqlite(path, section, start, end):
+    conn = sqlite3.connect(path)
+    try:
+        query = 'SELECT DISTINCT l.idx, l.title, l.url, l.depth, l.section, l.guide FROM links l'
+        conditions = []
+        params = []
+        if section is not None:
+            query += ' JOIN sections s ON l.idx BETWEEN s.start_idx AND s.end_idx'
+            conditions.append('s.name = ? COLLATE NOCASE')
+            params.append(section)
+        if start is not None:
+            conditions.append('l.idx >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('l.idx <= ?')
+            params.append(end)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        for idx, title, url, depth, section_json, guide in conn.execute(query + ' ORDER BY l.idx', params):
+            yield {'index': idx, 'title': title, 'url': url, 'depth': depth, 'section': json.loads(section_json),
+                   'guide': guide}
+    finally:
+        conn.close()
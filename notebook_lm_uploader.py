@@ -1,7 +1,46 @@
 from playwright.sync_api import sync_playwright
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 import time
 import re
+import os
+import json
 import argparse
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+from upload_journal import UploadJournal, STATUS_DONE, STATUS_FAILED
+from selector_cache import SelectorCache
+from step_profiler import StepProfiler
+from link_manifest import iter_manifest
+from shared_browser import connect_browser
+from url_validator import ValidationCache, print_validation_summary, select_usable, validate_urls
+
+# Googleのログイン状態を保持するクッキー（有効期限の確認に使用）
+AUTH_COOKIE_NAMES = ("SID", "__Secure-1PSID", "__Secure-3PSID", "SAPISID")
+
+# Googleのログイン画面のURL
+LOGIN_URL_PREFIX = "https://accounts.google.com"
+
+# ノートブックのソース一覧から既存のURLを読み取るスクリプト
+# （ソース一覧の要素のリンク・属性・テキストに含まれるURLをまとめて取得する）
+EXISTING_SOURCE_URLS_SCRIPT = """() => {
+    const pattern = /https?:\\/\\/[^\\s"'<>]+/g;
+    const containers = document.querySelectorAll(
+        "div.source-list, .source-item, .source-panel, source-picker, [class*='source']");
+    const urls = new Set();
+    containers.forEach(container => {
+        container.querySelectorAll('*').forEach(el => {
+            if (el.href) urls.add(el.href);
+            for (const attr of el.attributes) {
+                (attr.value.match(pattern) || []).forEach(u => urls.add(u));
+            }
+        });
+        (container.textContent.match(pattern) || []).forEach(u => urls.add(u));
+    });
+    return Array.from(urls);
+}"""
 
 def extract_urls_from_file(file_path):
     """ファイルからURLを抽出する関数"""
@@ -20,77 +59,491 @@ def extract_urls_from_file(file_path):
     
     return urls
 
-def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
-    """Playwrightを使用してNotebookLMにURLを追加する関数"""
-    print("Playwrightを起動しています...")
+# 1つのノートブックに追加できるソース数の上限（既定値）
+NOTEBOOK_SOURCE_LIMIT = 50
+
+# ソース追加ダイアログ
+DIALOG_SELECTOR = "mat-dialog-container, .mat-dialog-container, .mat-mdc-dialog-container"
+
+# ソース一覧の行
+SOURCE_ROW_SELECTOR = ".source-item, .url-item, .mat-list-item, .mat-mdc-list-item"
+
+# 挿入後、ダイアログが閉じたかソース一覧に行が増えたことを確認するスクリプト
+INSERT_CONFIRMED_SCRIPT = """({dialog, rows, baseline}) => {
+    const dialogOpen = Array.from(document.querySelectorAll(dialog))
+        .some(el => el.getClientRects().length > 0);
+    return !dialogOpen || document.querySelectorAll(rows).length > baseline;
+}"""
+
+# ソース一覧の各行のURLと状態（ok: 追加済み / processing: 処理中 / failed: 失敗）をまとめて読み取るスクリプト
+SOURCE_STATUS_SCRIPT = """(rows) => {
+    const pattern = /https?:\\/\\/[^\\s"'<>]+/g;
+    const failedIcon = /^(error|error_outline|warning|report)$/;
+    const failedMark = /\\b(error|failed)\\b|エラー|失敗/i;
+    const processingMark = /\\b(loading|processing|pending)\\b/i;
+    return Array.from(document.querySelectorAll(rows)).map(row => {
+        const urls = new Set();
+        const marks = [];
+        [row, ...row.querySelectorAll('*')].forEach(el => {
+            if (el.href) urls.add(el.href);
+            for (const attr of el.attributes) {
+                (attr.value.match(pattern) || []).forEach(u => urls.add(u));
+                if (attr.name === 'class' || attr.name === 'aria-label' || attr.name === 'mattooltip') {
+                    marks.push(attr.value);
+                }
+            }
+        });
+        (row.textContent.match(pattern) || []).forEach(u => urls.add(u));
+        const icons = Array.from(row.querySelectorAll('mat-icon')).map(icon => icon.textContent.trim());
+        let status = 'ok';
+        if (icons.some(icon => failedIcon.test(icon)) || failedMark.test(marks.join(' '))) {
+            status = 'failed';
+        } else if (processingMark.test(marks.join(' ')) ||
+                   row.querySelector("mat-spinner, mat-progress-spinner, mat-progress-bar, [role='progressbar']")) {
+            status = 'processing';
+        }
+        return {title: row.textContent.trim().slice(0, 200), urls: Array.from(urls), status};
+    });
+}"""
+
+# 照合で処理中のソースが残っている場合に、ソース一覧を読み取り直す間隔（秒）
+RECONCILE_POLL_INTERVAL = 2.0
+
+# 手順ごとの待機の上限（ミリ秒）。実測値が集まるとこれより短い値に調整される
+DEFAULT_STEP_TIMEOUTS = {
+    "ready": 3000,            # 次のURLの追加を開始できる状態になるまで
+    "option_menu": 5000,      # 「ソースを追加」後に選択肢が表示されるまで
+    "website_option": 3000,   # ウェブサイトの選択肢が表示されるまで
+    "url_input": 8000,        # URL入力フィールドが表示されるまで
+    "insert_button": 3000,    # 挿入ボタンが押せる状態になるまで
+    "insert_response": 10000, # 挿入のリクエストに応答が返るまで
+    "confirm": 10000          # ダイアログが閉じるかソース一覧に行が増えるまで
+}
+
+# 実測値から決める待機の下限（ミリ秒）。挿入の確認は遅れることがあり、短すぎると追加済みのURLを失敗とみなす
+MIN_STEP_TIMEOUTS = {
+    "insert_response": 3000,
+    "confirm": 5000
+}
+
+# 「ソースを追加」ボタンのセレクタ（言語に依存しないセレクタを優先）
+ADD_SOURCE_BUTTON_SELECTORS = [
+    "button:has-text('Add')",                        # 英語「Add」テキスト
+    "button:has-text('追加')"                         # 日本語「追加」テキスト（フォールバック）
+]
+
+# 挿入ボタンのセレクタ
+INSERT_BUTTON_SELECTORS = [
+    "button:has-text('Insert')",                       # 英語テキスト
+    "button:has-text('挿入')"                           # 日本語テキスト
+]
+
+# ファイルのアップロードの選択肢（ソースの種類のチップ）
+UPLOAD_OPTION_SELECTORS = [
+    "span.mat-mdc-chip-action:has(mat-icon:has-text('upload'))",
+    "span:has-text('Upload')",
+    "span:has-text('アップロード')"
+]
+
+# コピーしたテキストの選択肢
+PASTE_TEXT_OPTION_SELECTORS = [
+    "span.mat-mdc-chip-action:has(mat-icon:has-text('content_paste'))",
+    "span:has-text('Copied text')",
+    "span:has-text('コピーしたテキスト')"
+]
+
+# コピーしたテキストの入力欄
+PASTE_TEXT_INPUT_SELECTORS = [
+    ".mat-mdc-dialog-container textarea",
+    "mat-dialog-container textarea"
+]
+
+# ファイルやテキストのソースが追加されるまで待つ最大時間（ミリ秒）。大きなファイルは処理に時間がかかる
+FILE_SOURCE_TIMEOUT = 120000
+
+# UIの言語とバージョン（ビルドラベル）を取得するスクリプト
+UI_PROFILE_SCRIPT = """() => ({
+    locale: document.documentElement.lang || navigator.language || 'unknown',
+    version: (window.WIZ_global_data && window.WIZ_global_data.cfb2h) || 'unknown'
+})"""
+
+def race_selectors(page, selectors, timeout, state="visible"):
+    """候補のセレクタを1つのロケーターにまとめて1回だけ待機する関数
+
+    いずれかの候補が state になった時点で、一致している候補のうちリストで
+    最も優先度の高いセレクタを返す。候補ごとに順番にタイムアウトを待つことはない。
+    """
+    combined = page.locator(selectors[0])
+    for selector in selectors[1:]:
+        combined = combined.or_(page.locator(selector))
+    combined.first.wait_for(state=state, timeout=timeout)
+    for selector in selectors:
+        try:
+            if page.locator(selector).first.is_visible():
+                return selector
+        except Exception:
+            continue
+    return None
+
+def rpc_request_body(response):
+    """NotebookLMのRPC（batchexecute へのPOST）の応答であれば、デコードしたリクエストの本文を返す関数"""
+    request = response.request
+    if request.method != "POST" or "batchexecute" not in response.url:
+        return None
+    try:
+        return unquote_plus(request.post_data or "")
+    except Exception:
+        return None
+
+def is_insert_response(response, urls):
+    """urls を挿入したときにNotebookLMが送信するソース追加のRPCの応答かどうかを判定する関数
+
+    NotebookLMはすべてのRPCを batchexecute に送るため、リクエストの本文に urls のいずれかを含むものに限る。
+    """
+    body = rpc_request_body(response)
+    return body is not None and any(url in body for url in urls)
+
+class LatencyTracker:
+    """手順ごとの所要時間を記録し、実測値から待機のタイムアウトを決めるクラス
+
+    直近の実測値の95パーセンタイルに factor を掛けた値をタイムアウトとし、
+    下限（floors に指定がない手順は min_ms）と既定の上限の間に収める。実測値が少ないうちは既定の上限を使う。
+    """
+
+    def __init__(self, defaults, factor=3.0, min_ms=500, window=50, min_samples=3, floors=None):
+        self.defaults = defaults
+        self.factor = factor
+        self.min_ms = min_ms
+        self.floors = floors or {}
+        self.min_samples = min_samples
+        self.samples = {step: deque(maxlen=window) for step in defaults}
+
+    def observe(self, step, seconds):
+        self.samples[step].append(seconds)
+
+    def timeout_ms(self, step):
+        samples = sorted(self.samples[step])
+        if len(samples) < self.min_samples:
+            return self.defaults[step]
+        p95 = samples[int(0.95 * (len(samples) - 1))]
+        return int(min(self.defaults[step], max(self.floors.get(step, self.min_ms), p95 * 1000 * self.factor)))
+
+def normalize_url(url):
+    """重複判定用にURLを正規化する関数（クエリ・フラグメント・末尾の index.html を除去）"""
+    parts = urlsplit(url.strip())
+    path = parts.path
+    if path.endswith('/index.html'):
+        path = path[:-len('index.html')]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, '', ''))
+
+def dedupe_urls(urls):
+    """正規化したURLが重複するものを除き、最初に現れたものだけを残す関数"""
+    seen = set()
+    unique_urls = []
+    for url in urls:
+        key = normalize_url(url)
+        if key not in seen:
+            seen.add(key)
+            unique_urls.append(url)
+    return unique_urls
+
+def read_existing_source_urls(page):
+    """ノートブックのソース一覧を1回だけ読み取り、正規化したURLの集合を返す関数"""
+    try:
+        urls = page.evaluate(EXISTING_SOURCE_URLS_SCRIPT)
+    except Exception as e:
+        print(f"ソース一覧を読み取れませんでした: {e}")
+        return set()
+    return {normalize_url(url) for url in urls}
+
+def check_auth_state(auth_state_path):
+    """保存済みのログイン状態が使用できるか確認する関数
+
+    戻り値: (使用可能かどうか, 理由)
+    """
+    if not auth_state_path or not os.path.exists(auth_state_path):
+        return False, "ログイン状態が保存されていません"
+    try:
+        with open(auth_state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        return False, f"ログイン状態を読み込めませんでした: {e}"
+
+    auth_cookies = [c for c in state.get("cookies", [])
+                    if c.get("name") in AUTH_COOKIE_NAMES and "google.com" in c.get("domain", "")]
+    if not auth_cookies:
+        return False, "ログイン用のクッキーが保存されていません"
+
+    # 有効期限（-1はセッションクッキー）が過ぎているクッキーがあれば期限切れとみなす
+    now = time.time()
+    expired = [c["name"] for c in auth_cookies if 0 < c.get("expires", -1) < now]
+    if expired:
+        return False, f"ログイン状態の有効期限が切れています（{', '.join(expired)}）"
+    return True, "保存済みのログイン状態を使用します"
+
+def chunk_urls(urls, batch_size):
+    """URLのリストを batch_size 個ずつのまとまりに分割する関数"""
+    batch_size = max(1, batch_size)
+    return [urls[i:i + batch_size] for i in range(0, len(urls), batch_size)]
+
+class NotebookSession:
+    """NotebookLMのノートブックを開いたブラウザ
+
+    open() でブラウザを起動してノートブックを開き、ログインとインターフェースの
+    読み込みを確認する。add_urls_to_notebooklm() に session として渡すと、
+    ブラウザの起動やログインの確認を省略して開いたままのタブを使い回す（デーモンモード用）。
+    Playwrightの同期APIを使うため、open() から close() までは同じスレッドで操作すること。
+    with ブロックを抜けるとブラウザを閉じる。cdp_endpoint を指定した場合は起動済みの
+    共有ブラウザに接続し、閉じるときはこのセッションのコンテキストだけを閉じる。
+    save_auth_state を False にすると、auth_state のログイン状態を読み込むだけで書き込まない
+    （複数のセッションで同じファイルを使う場合）。
+    """
+
+    def __init__(self, notebook_url, auth_state=None, headless=False, relogin=False, cdp_endpoint=None,
+                 save_auth_state=True):
+        self.notebook_url = notebook_url
+        self.auth_state = auth_state
+        self.save_auth_state = save_auth_state
+        self.headless = headless
+        self.relogin = relogin
+        self.cdp_endpoint = cdp_endpoint
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.tabs = []
+        self.profile = None
+        self.opened_at = None
+
+    @property
+    def page(self):
+        return self.tabs[0]["page"]
+
+    def is_open(self):
+        return self.browser is not None and self.browser.is_connected() and not self.page.is_closed()
+
+    def open(self):
+        """ブラウザを起動してノートブックを開き、操作できる状態になるまで待つ"""
+        # 保存済みのログイン状態を確認
+        use_auth_state = False
+        if self.auth_state and not self.relogin:
+            use_auth_state, reason = check_auth_state(self.auth_state)
+            print(reason)
+        elif self.auth_state:
+            print("保存済みのログイン状態を使わずにログインし直します")
+            # ログインし直すのは最初に開くときだけ
+            self.relogin = False
+        
+        if self.headless and not use_auth_state:
+            # 手動ログインにはブラウザ画面が必要
+            print("有効なログイン状態がないため、ブラウザを表示して実行します")
+            self.headless = False
+        
+        print("Playwrightを起動しています...")
+        self.playwright = sync_playwright().start()
+        # ブラウザ起動（ログイン状態が有効な場合のみヘッドレスモードを使用可能。共有ブラウザがあれば接続）
+        self.browser = connect_browser(self.playwright, self.cdp_endpoint, headless=self.headless)
+        self.context = self.browser.new_context(storage_state=self.auth_state if use_auth_state else None)
+        page = self.context.new_page()
+        self.tabs = [self._watch(page)]
+        
+        # NotebookLMにアクセス
+        print(f"NotebookLM ({self.notebook_url}) にアクセスしています...")
+        page.goto(self.notebook_url)
+        print("アクセス完了")
+        
+        if self.headless and page.url.startswith(LOGIN_URL_PREFIX):
+            raise Exception("保存済みのログイン状態が無効です。--relogin を付けて再実行し、ログインし直してください")
+        
+        if not use_auth_state:
+            # ログイン画面が表示される場合はログインを待つ
+            print("Googleアカウントでのログインが必要な場合は、手動でログインしてください...")
+            print("ログイン後に処理を続行します（最大120秒待機）")
+        
+        # NotebookLMのインターフェース検出 - プロジェクトタイトル要素で検出
+        print("NotebookLMのインターフェースを待機しています...")
+        try:
+            # プロジェクトタイトル要素を待機 - NotebookLMの特徴的な要素
+            page.wait_for_selector('editable-project-title', timeout=30000 if self.headless else 120000)
+            print("NotebookLMのインターフェースが読み込まれました")
+        except Exception as e:
+            print("プロジェクトタイトルが見つかりませんでした。代替の要素を検索します...")
+            try:
+                # ソースタブをフォールバックとして検索
+                source_tab_selector = "div:has-text('ソース'), div:has-text('Source')"
+                page.wait_for_selector(source_tab_selector, timeout=30000)
+                print("NotebookLMのインターフェースが読み込まれました")
+            except Exception as e2:
+                raise Exception("NotebookLMインターフェースの読み込みを検出できませんでした")
+        
+        if self.auth_state and self.save_auth_state:
+            # 次回以降ログインを省略できるようにログイン状態を保存
+            self.context.storage_state(path=self.auth_state)
+            print(f"ログイン状態を {self.auth_state} に保存しました")
+        
+        # UIの言語とバージョン（セレクタキャッシュの切り替えに使用）
+        try:
+            profile = page.evaluate(UI_PROFILE_SCRIPT)
+            self.profile = (profile["locale"], profile["version"])
+            print(f"UIの言語: {profile['locale']}, バージョン: {profile['version']}")
+        except Exception:
+            pass
+        self.opened_at = time.time()
+
+    def _watch(self, tab_page):
+        """タブでRPCへの応答を受信した時刻とリクエストの本文を記録するようにする"""
+        tab = {"page": tab_page, "responses": [], "in_flight": None, "used": False}
+        def on_response(response):
+            body = rpc_request_body(response)
+            if body is not None:
+                tab["responses"].append((time.time(), body))
+        tab_page.on("response", on_response)
+        return tab
+
+    def tabs_for(self, count):
+        """操作に使うタブを count 個返す（足りない分は同じノートブックを新しいタブで開く）"""
+        while len(self.tabs) < count:
+            print(f"タブ {len(self.tabs) + 1} でノートブックを開いています...")
+            tab = self._watch(self.context.new_page())
+            tab["page"].goto(self.notebook_url)
+            tab["page"].wait_for_selector('editable-project-title', timeout=30000)
+            self.tabs.append(tab)
+        for tab in self.tabs:
+            # 前回の処理の記録を持ち越さない
+            tab["responses"].clear()
+            tab["in_flight"] = None
+        return self.tabs[:count]
+
+    def reload(self):
+        """エラーの後などに、開いているタブをすべて読み込み直す"""
+        for tab in self.tabs:
+            tab["page"].goto(self.notebook_url)
+            tab["page"].wait_for_selector('editable-project-title', timeout=30000)
+            tab["used"] = False
+
+    def close(self):
+        try:
+            if self.context and self.cdp_endpoint:
+                # 共有ブラウザは閉じず、このセッションで作ったコンテキストだけを閉じる
+                self.context.close()
+            if self.browser:
+                self.browser.close()
+        finally:
+            if self.playwright:
+                self.playwright.stop()
+            self.playwright = None
+            self.browser = None
+            self.context = None
+            self.tabs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5, batch_size=1,
+                           auth_state=None, headless=False, relogin=False,
+                           journal=None, max_retries=2, retry_backoff=2.0,
+                           skip_existing=True, selector_cache=None, prepare_next=True, tabs=1,
+                           keep_open=True, profiler=None, session=None, cdp_endpoint=None):
+    """Playwrightを使用してNotebookLMにURLを追加する関数
+
+    batch_size が2以上の場合は、1回のダイアログで複数のURLをまとめて挿入する。
+    まとめての挿入が受け付けられなかった場合は、そのまとまりだけ1件ずつ追加し直す。
+
+    auth_state を指定すると、ログイン後の状態をそのファイルに保存し、次回以降は
+    手動ログインを省略する。保存済みの状態が有効な場合に限り headless で実行できる。
+    relogin を指定すると保存済みの状態を使わずにログインし直す。
+
+    journal（UploadJournal）を指定すると、URLごとの結果を記録し、追加済みのURLは
+    スキップする。失敗したURLは max_retries 回まで retry_backoff 秒から倍々に
+    待機して再試行し、それでも失敗した場合は記録して次のURLに進む。
+
+    skip_existing を指定すると、追加前にノートブックのソース一覧を読み取り、
+    既に含まれているURLを除外する。入力リスト内の重複は常に除外する。
+
+    selector_cache（SelectorCache）を指定すると、成功したセレクタを次回以降の
+    実行でも再利用する。省略時はこの実行の間だけ記憶する。
+
+    prepare_next を指定すると、挿入したURLの応答を待つ間に次のURLのダイアログを
+    開いて入力しておく。tabs が2以上の場合は同じノートブックを複数のタブで開き、
+    URLのまとまりを順番に各タブへ割り当てる。挿入する順序と結果の記録は
+    元のリストの順序のまま保たれる。
+
+    keep_open を False にすると、終了時にEnterキーの入力を待たずにブラウザを閉じる。
+    session（open() 済みの NotebookSession）を渡すと、そのブラウザを使い回し、終了後も閉じない。
+    cdp_endpoint を指定すると、ブラウザを起動せずに起動済みの共有ブラウザに接続する。
+    戻り値: {"added": 追加したURLの数, "failed": 追加できなかったURLのリスト,
+             "submitted": ジャーナルと既存のソースによる除外と max_urls の適用後に、追加を試みたURLのリスト}
+    （エラーで中断した場合は "error" にその内容が入る）
+    """
+    result = {"added": 0, "failed": [], "submitted": []}
     
-    # 学習結果を格納する辞書（セッション内でのみ有効）
-    learned_selectors = {
-        "add_source_btn": None,
-        "website_option": None,
-        "url_input": None,
-        "insert_btn": None
-    }
+    # 入力リスト内の重複を除外
+    unique_urls = dedupe_urls(urls_to_add)
+    if len(unique_urls) < len(urls_to_add):
+        print(f"{len(urls_to_add) - len(unique_urls)}個の重複したURLを除外しました")
+    urls_to_add = unique_urls
     
-    # 待機時間の設定 - 実行環境に応じて調整可能
-    wait_times = {
-        "click_before": 0.2,     # クリック前の待機（秒）
-        "click_after": 0.3,      # クリック後の短い待機（秒）
-        "insert_after": 0.3,     # 挿入後の待機（秒）- さらに短縮
-        "next_url": 0.5          # 次のURL追加前の待機（秒）- さらに短縮
-    }
+    # ジャーナルに追加済みと記録されているURLは除外
+    if journal:
+        pending_urls = [url for url in urls_to_add if not journal.is_done(notebook_url, url)]
+        if len(pending_urls) < len(urls_to_add):
+            print(f"{len(urls_to_add) - len(pending_urls)}個のURLは追加済みのためスキップします")
+        urls_to_add = pending_urls
+        if not urls_to_add:
+            print("追加するURLはありません（すべて追加済みです）")
+            return result
+    
+    # ブラウザ（session を渡された場合はそれを使い回す）
+    own_session = session is None
+    if own_session:
+        session = NotebookSession(notebook_url, auth_state=auth_state, headless=headless, relogin=relogin,
+                                  cdp_endpoint=cdp_endpoint)
+    
+    # 成功したセレクタの記録（ファイルを指定しない場合はこの実行の間のみ有効）
+    if selector_cache is None:
+        selector_cache = SelectorCache()
+    
+    # 手順ごとの所要時間の記録（指定しない場合は記録しない）
+    if profiler is None:
+        profiler = StepProfiler(enabled=False)
     
-    # 並行処理モードを有効にする設定
+    # 固定の待機時間の代わりに、手順ごとの実測値から待機のタイムアウトを決める
+    latency = LatencyTracker(DEFAULT_STEP_TIMEOUTS, floors=MIN_STEP_TIMEOUTS)
+    
+    # 並行処理モードの設定
     parallel_mode = {
-        "enabled": True,          # 並行処理を有効にする
-        "prepare_next": True,     # 処理完了を待たずに次のURLの準備を開始
-        "max_check_time": 0.8     # URL追加確認の最大時間（秒）
+        "prepare_next": prepare_next,  # 処理完了を待たずに次のURLの準備を開始
+        "tabs": max(1, tabs)           # 同じノートブックを開くタブの数（同時に処理するまとまりの上限）
     }
     
-    with sync_playwright() as p:
-        # ブラウザ起動（ヘッドレスモードをオフに）
-        browser = p.chromium.launch(headless=False)
-        context = browser.new_context()
-        page = context.new_page()
-        
+    with (session if own_session else nullcontext(session)):
         try:
-            # NotebookLMにアクセス
-            print(f"NotebookLM ({notebook_url}) にアクセスしています...")
-            page.goto(notebook_url)
-            print("アクセス完了")
+            if not session.is_open():
+                session.open()
+            page = session.page
+            # RPCへの応答を受信した時刻とリクエストの本文（操作中のタブのもの）
+            insert_responses = session.tabs[0]["responses"]
             
-            # ログイン画面が表示される場合はログインを待つ
-            print("Googleアカウントでのログインが必要な場合は、手動でログインしてください...")
-            print("ログイン後に処理を続行します（最大120秒待機）")
+            # UIの言語とバージョンに応じたセレクタキャッシュを使用する
+            if session.profile:
+                selector_cache.set_profile(*session.profile)
             
-            # NotebookLMのインターフェース検出 - プロジェクトタイトル要素で検出
-            print("NotebookLMのインターフェースを待機しています...")
-            try:
-                # プロジェクトタイトル要素を待機 - NotebookLMの特徴的な要素
-                page.wait_for_selector('editable-project-title', timeout=120000)
-                print("NotebookLMのインターフェースが読み込まれました")
-            except Exception as e:
-                print("プロジェクトタイトルが見つかりませんでした。代替の要素を検索します...")
-                try:
-                    # ソースタブをフォールバックとして検索
-                    source_tab_selector = "div:has-text('ソース'), div:has-text('Source')"
-                    page.wait_for_selector(source_tab_selector, timeout=30000)
-                    print("NotebookLMのインターフェースが読み込まれました")
-                except Exception as e2:
-                    raise Exception("NotebookLMインターフェースの読み込みを検出できませんでした")
-            
-            # UIの完全な読み込みを待機（少し短く）
-            time.sleep(0.5)
+            # ノートブックに既に含まれているURLを除外
+            if skip_existing:
+                existing_urls = read_existing_source_urls(page)
+                new_urls = [url for url in urls_to_add if normalize_url(url) not in existing_urls]
+                print(f"ソース一覧から {len(existing_urls)} 個のURLを読み取りました"
+                      f"（{len(urls_to_add) - len(new_urls)}個は追加済みのため除外）")
+                urls_to_add = new_urls
             
             # 追加するURLの数を制限
             urls_to_add = urls_to_add[:max_urls]
+            result["submitted"] = list(urls_to_add)
             
             # 「ソースを追加」ボタンのセレクタ定義
-            # 言語に依存しないセレクタを優先
-            add_source_btn_selectors = [
-                "button:has-text('Add')",                        # 英語「Add」テキスト
-                "button:has-text('追加')"                         # 日本語「追加」テキスト（フォールバック）
-            ]
+            add_source_btn_selectors = ADD_SOURCE_BUTTON_SELECTORS
             
             # ウェブサイトオプションのセレクタ（言語依存しないセレクタを優先）
             website_option_selectors = [
@@ -101,6 +554,9 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                 "div:has-text('ウェブサイト')"                              # 日本語テキスト
             ]
             
+            # マテリアルデザインのチップ要素（ソースの種類の選択肢）
+            chip_selector = "mat-chip-option, mat-chip, .mdc-evolution-chip, .mat-mdc-chip"
+            
             # 汎用的なウェブサイトセレクタ (選択オプションの確認用)
             general_website_selector = "span:has-text('ウェブサイト'), span:has-text('Website')"
             
@@ -111,29 +567,16 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                 "input.mat-mdc-input-element",                   # Material Design入力要素
                 "div:has(mat-icon:has-text('web')) input",       # webアイコンを持つ親要素内の入力フィールド
                 "div.mat-mdc-form-field-flex input",             # MDCフォームフィールド内の入力
+                ".mat-mdc-dialog-container textarea",            # 複数URLを受け付けるダイアログ内のテキストエリア
+                "mat-dialog-container textarea",
                 # 言語依存するセレクタはフォールバックとして最後に配置
                 "div:has-text('URL') input",                     # URL文字列を含む親要素内の入力
                 "div:has-text('Paste URL') input",               # 英語テキスト
                 "div:has-text('URL を貼り付け') input"              # 日本語テキスト
             ]
             
-            # 挿入ボタンのセレクタ（言語に依存しないセレクタを優先）
-            insert_btn_selectors = [
-                "button:has-text('Insert')",                       # 英語テキスト
-                "button:has-text('挿入')"                           # 日本語テキスト
-            ]
-            
-            # URL追加完了の検出用セレクタ
-            url_added_selectors = [
-                # ダイアログが閉じたことを検出
-                ".mat-dialog-container:not([style*='visibility: visible'])",
-                # リスト要素の変化を検出
-                "div.source-list", 
-                ".source-item", 
-                ".mat-list-item", 
-                ".url-item", 
-                "ul li"
-            ]
+            # 挿入ボタンのセレクタ
+            insert_btn_selectors = INSERT_BUTTON_SELECTORS
             
             # 次のURL追加処理の準備ができているか確認するセレクタ
             next_url_ready_selectors = [
@@ -142,6 +585,12 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                 "div.source-list"
             ]
             
+            # まとめて挿入した際に拒否されたことを示すセレクタ
+            batch_rejected_selectors = [
+                "mat-error",
+                ".mat-mdc-form-field-error"
+            ]
+            
             # 非同期チェックのための関数
             def is_element_present(selector, timeout=100):
                 try:
@@ -150,17 +599,78 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                 except:
                     return False
             
-            for i, url in enumerate(urls_to_add):
-                print(f"URL {i+1}/{len(urls_to_add)} を追加中: {url}")
+            def fill_urls(selector, urls):
+                """入力フィールドにURLを入力（テキストエリアなら改行、inputなら空白で区切る）"""
+                is_textarea = page.eval_on_selector(selector, "el => el.tagName === 'TEXTAREA'")
+                page.fill(selector, ("\n" if is_textarea else " ").join(urls))
+            
+            def has_batch_error():
+                """ダイアログに入力のエラーが表示されているか"""
+                return any(is_element_present(selector, timeout=300) for selector in batch_rejected_selectors)
+            
+            def is_batch_rejected(timeout=3000):
+                """挿入後もダイアログが閉じない、またはエラーが表示された場合に拒否とみなす"""
+                if has_batch_error():
+                    return True
+                if not selector_cache.get("url_input"):
+                    return False
+                try:
+                    page.wait_for_selector(selector_cache.get("url_input"), timeout=timeout, state="hidden")
+                    return False
+                except Exception:
+                    return True
+            
+            def close_dialog():
+                """開いたままのダイアログを閉じる"""
+                try:
+                    page.keyboard.press("Escape")
+                    page.wait_for_selector(DIALOG_SELECTOR, state="hidden", timeout=latency.timeout_ms("confirm"))
+                except Exception:
+                    pass
+            
+            def wait_for_insert_response(since, urls):
+                """urls を挿入したリクエストへの応答を待つ（既に受信済みならすぐに戻る）
+
+                次のダイアログを開くときなど、同じ時間帯に送られる他のRPCの応答は数えない。
+                """
+                if any(t >= since and any(url in body for url in urls) for t, body in insert_responses):
+                    return True
+                try:
+                    page.wait_for_event("response", predicate=lambda response: is_insert_response(response, urls),
+                                        timeout=latency.timeout_ms("insert_response"))
+                    return True
+                except PlaywrightTimeoutError:
+                    return False
+            
+            def wait_for_insert_confirmed(baseline_rows):
+                """ダイアログが閉じるか、ソース一覧に行が増えるまで待つ"""
+                try:
+                    page.wait_for_function(INSERT_CONFIRMED_SCRIPT,
+                                           arg={"dialog": DIALOG_SELECTOR, "rows": SOURCE_ROW_SELECTOR,
+                                                "baseline": baseline_rows},
+                                           timeout=latency.timeout_ms("confirm"))
+                    return True
+                except PlaywrightTimeoutError:
+                    return False
+            
+            def timed(step, func):
+                """func を実行し、成功した場合の所要時間を手順ごとに記録する"""
+                start = time.time()
+                result = func()
+                if result:
+                    latency.observe(step, time.time() - start)
+                return result
+            
+            def prepare_urls(urls, first):
+                """ダイアログを開いてウェブサイトを選び、urls を入力する（挿入はしない）"""
+                url = " ".join(urls)
                 
                 # 最初のURLの場合のみウェブサイトオプションの表示を確認
-                if i == 0:
+                if first:
                     # 1. まず最初にウェブサイトオプションが既に表示されているか確認
                     print("まずウェブサイトオプションが表示されているか確認します...")
                     website_option_visible = False
-                    
-                    # マテリアルデザインのチップ要素を探す
-                    chip_selector = "mat-chip-option, mat-chip, .mdc-evolution-chip, .mat-mdc-chip"
+
                     try:
                         # 短いタイムアウトで待機（既に表示されている場合のみ検出）
                         if page.wait_for_selector(chip_selector, timeout=2000):
@@ -181,12 +691,13 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                     # 2週目以降は常に「ソースを追加」から始める
                     website_option_visible = False
                     
-                    # 次のURL追加の準備ができているか確認
+                    # 次のURL追加の準備ができているか確認（いずれかの要素が表示されるまで待機）
                     ready_for_next = False
-                    for selector in next_url_ready_selectors:
-                        if is_element_present(selector):
-                            ready_for_next = True
-                            break
+                    try:
+                        ready_for_next = timed("ready", lambda: page.wait_for_selector(
+                            ", ".join(next_url_ready_selectors), timeout=latency.timeout_ms("ready")))
+                    except Exception:
+                        pass
                     
                     if ready_for_next:
                         print("次のURL追加の準備ができています。処理を開始します")
@@ -197,6 +708,7 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                 if not website_option_visible:
                     # 「ソースを追加」ボタンをクリック
                     print("「ソースを追加」ボタンをクリックします...")
+                    span = profiler.start("add_button")
                     
                     # セクションやパネル、カード要素などを探す
                     source_section = page.query_selector("section, .mat-expansion-panel, mat-card, .section-container")
@@ -204,22 +716,20 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                         print("汎用的なセクションが見つかりませんでした。ページ全体から検索します。")
                     
                     # 前回成功したセレクタがあれば最初に試す
-                    if learned_selectors["add_source_btn"]:
+                    goto_website_option = False
+                    if selector_cache.get("add_source_btn"):
                         try:
-                            selector = learned_selectors["add_source_btn"]
-                            btn = page.query_selector(selector)
+                            btn = page.query_selector(selector_cache.get("add_source_btn"))
                             if btn:
                                 btn.scroll_into_view_if_needed()
-                                time.sleep(wait_times["click_before"])
                                 btn.click()
-                                time.sleep(wait_times["click_after"])
                                 goto_website_option = True
-                            else:
-                                goto_website_option = False
                         except Exception:
-                            goto_website_option = False
+                            pass
+                    if goto_website_option:
+                        selector_cache.hit("add_source_btn")
                     else:
-                        goto_website_option = False
+                        selector_cache.miss("add_source_btn")
                     
                     # 前回のセレクタが失敗した場合は通常の検索
                     if not goto_website_option:
@@ -233,11 +743,9 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                                     add_btn = source_section.query_selector(selector)
                                     if add_btn:
                                         add_btn.scroll_into_view_if_needed()
-                                        time.sleep(wait_times["click_before"])
                                         add_btn.click()
-                                        learned_selectors["add_source_btn"] = selector  # 成功したセレクタを記憶
+                                        selector_cache.store("add_source_btn", selector)  # 成功したセレクタを記憶
                                         add_btn_found = True
-                                        time.sleep(wait_times["click_after"])
                                         break
                                 except Exception:
                                     continue
@@ -250,11 +758,9 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                                     button = page.query_selector(selector)
                                     if button:
                                         button.scroll_into_view_if_needed()
-                                        time.sleep(wait_times["click_before"])
                                         button.click()
-                                        learned_selectors["add_source_btn"] = selector  # 成功したセレクタを記憶
+                                        selector_cache.store("add_source_btn", selector)  # 成功したセレクタを記憶
                                         add_btn_found = True
-                                        time.sleep(wait_times["click_after"])
                                         break
                                 except Exception:
                                     continue
@@ -264,52 +770,57 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                             raise Exception("「ソースを追加」ボタンが見つかりませんでした")
                     
                     print("「ソースを追加」ボタンがクリックされました")
+                    profiler.finish(span, selector_hit=goto_website_option)
                     
                     # オプションメニューが表示されるまで待機
                     print("オプションメニューの表示を待機しています...")
                     try:
-                        page.wait_for_selector(chip_selector, timeout=5000)
+                        timed("option_menu", lambda: page.wait_for_selector(
+                            chip_selector, timeout=latency.timeout_ms("option_menu")))
                         print("オプションメニューが表示されました")
                     except Exception:
                         print("標準的なチップメニューが見つかりませんでした、個別のオプションを探します")
                 
                 # ウェブサイトオプションをクリック
                 print("ウェブサイトオプションを選択します...")
+                span = profiler.start("option_select")
                 
                 # 前回成功したセレクタがあれば最初に試す
                 website_option_found = False
-                if learned_selectors["website_option"]:
+                selector = selector_cache.get("website_option")
+                if selector:
                     try:
-                        selector = learned_selectors["website_option"]
-                        # 短いタイムアウトで待機
-                        if page.wait_for_selector(selector, timeout=3000):
+                        # 実測値に基づくタイムアウトで待機
+                        if timed("website_option", lambda: page.wait_for_selector(
+                                selector, timeout=latency.timeout_ms("website_option"))):
                             page.click(selector)
                             website_option_found = True
-                            time.sleep(wait_times["click_after"])
                     except Exception:
                         pass
+                cache_hit = website_option_found
+                if website_option_found:
+                    selector_cache.hit("website_option")
+                else:
+                    selector_cache.miss("website_option")
                 
-                # 前回のセレクタが失敗した場合は通常の検索
+                # 前回のセレクタが失敗した場合は、候補をまとめて1回だけ待機
                 if not website_option_found:
-                    for selector in website_option_selectors:
-                        try:
-                            # やや短めのタイムアウトで待機
-                            if page.wait_for_selector(selector, timeout=3000):
-                                print(f"ウェブサイトオプションが見つかりました: {selector}")
-                                page.click(selector)
-                                learned_selectors["website_option"] = selector  # 成功したセレクタを記憶
-                                website_option_found = True
-                                time.sleep(wait_times["click_after"])
-                                break
-                        except Exception:
-                            continue
+                    try:
+                        selector = race_selectors(page, website_option_selectors,
+                                                  DEFAULT_STEP_TIMEOUTS["website_option"])
+                        if selector:
+                            print(f"ウェブサイトオプションが見つかりました: {selector}")
+                            page.click(selector)
+                            selector_cache.store("website_option", selector)  # 成功したセレクタを記憶
+                            website_option_found = True
+                    except Exception:
+                        pass
                 
                 if not website_option_found:
                     print("より一般的なセレクタで再試行します")
                     try:
                         page.wait_for_selector(general_website_selector, timeout=10000)
                         page.click(general_website_selector)
-                        time.sleep(wait_times["click_after"])
                         website_option_found = True
                     except Exception:
                         pass
@@ -318,48 +829,52 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                     raise Exception("ウェブサイトオプションが見つかりませんでした")
                 
                 print("ウェブサイトオプションを選択しました")
+                profiler.finish(span, selector_hit=cache_hit)
                 
                 # URLフィールドに入力
                 print("URL入力フィールドを探しています...")
+                span = profiler.start("fill", urls=len(urls))
                 
                 # 前回成功したセレクタがあれば最初に試す
                 url_input_found = False
-                if learned_selectors["url_input"]:
+                selector = selector_cache.get("url_input")
+                if selector:
                     try:
-                        selector = learned_selectors["url_input"]
-                        # より長めのタイムアウトで待機（ダイアログの表示に時間がかかる場合がある）
-                        if page.wait_for_selector(selector, timeout=8000):
+                        # 実測値に基づくタイムアウトで待機（ダイアログの表示に時間がかかる場合がある）
+                        if timed("url_input", lambda: page.wait_for_selector(
+                                selector, timeout=latency.timeout_ms("url_input"))):
                             # フォーカスと入力
                             page.click(selector)
                             # 既存の内容をクリア
                             page.fill(selector, "")
                             # 新しいURLを入力
-                            page.fill(selector, url)
+                            fill_urls(selector, urls)
                             url_input_found = True
                     except Exception:
                         pass
+                cache_hit = url_input_found
+                if url_input_found:
+                    selector_cache.hit("url_input")
+                else:
+                    selector_cache.miss("url_input")
                 
-                # 前回のセレクタが失敗した場合は通常の検索
+                # 前回のセレクタが失敗した場合は、候補をまとめて1回だけ待機
                 if not url_input_found:
-                    # まず、入力フィールドが表示されるまで少し待機（少し短く）
-                    time.sleep(0.5)
-                    
-                    for selector in url_input_selectors:
-                        try:
-                            # より長めのタイムアウトで待機（ダイアログの表示に時間がかかる場合がある）
-                            if page.wait_for_selector(selector, timeout=8000):
-                                print(f"URL入力フィールドが見つかりました: {selector}")
-                                # フォーカスと入力
-                                page.click(selector)
-                                # 既存の内容をクリア
-                                page.fill(selector, "")
-                                # 新しいURLを入力
-                                page.fill(selector, url)
-                                learned_selectors["url_input"] = selector  # 成功したセレクタを記憶
-                                url_input_found = True
-                                break
-                        except Exception:
-                            continue
+                    try:
+                        # ダイアログの表示に時間がかかる場合があるため長めのタイムアウトで待機
+                        selector = race_selectors(page, url_input_selectors, DEFAULT_STEP_TIMEOUTS["url_input"])
+                        if selector:
+                            print(f"URL入力フィールドが見つかりました: {selector}")
+                            # フォーカスと入力
+                            page.click(selector)
+                            # 既存の内容をクリア
+                            page.fill(selector, "")
+                            # 新しいURLを入力
+                            fill_urls(selector, urls)
+                            selector_cache.store("url_input", selector)  # 成功したセレクタを記憶
+                            url_input_found = True
+                    except Exception:
+                        pass
                 
                 # もしそれでも失敗したら、キーボードショートカットを試す
                 if not url_input_found:
@@ -375,45 +890,51 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                     raise Exception("URL入力フィールドが見つかりませんでした")
                 
                 print(f"URL「{url}」を入力しました")
-                
+                profiler.finish(span, selector_hit=cache_hit)
+            
+            def insert_prepared():
+                """入力済みのダイアログで挿入ボタンをクリックし、(挿入時刻, 挿入前の行数) を返す"""
                 # 挿入ボタンをクリック
                 print("挿入ボタンを探しています...")
+                span = profiler.start("insert")
+                
+                # 挿入前のソース一覧の行数（追加の確認に使用）
+                baseline_rows = page.eval_on_selector_all(SOURCE_ROW_SELECTOR, "els => els.length")
+                insert_started = time.time()
                 
                 # 前回成功したセレクタがあれば最初に試す
                 insert_btn_found = False
-                if learned_selectors["insert_btn"]:
+                selector = selector_cache.get("insert_btn")
+                if selector:
                     try:
-                        selector = learned_selectors["insert_btn"]
-                        button = page.query_selector(selector)
+                        # 入力の検証が終わりボタンが押せる状態になるまで待機
+                        button = timed("insert_button", lambda: page.wait_for_selector(
+                            f"{selector}:not([disabled])", timeout=latency.timeout_ms("insert_button")))
                         if button:
                             # オーバーレイの問題を回避するためJavaScriptでクリック
                             page.evaluate("""(btn) => { btn.click(); }""", button)
                             insert_btn_found = True
-                            # 最小限の待機（非常に短く）
-                            time.sleep(wait_times["insert_after"])
                     except Exception:
                         pass
+                cache_hit = insert_btn_found
+                if insert_btn_found:
+                    selector_cache.hit("insert_btn")
+                else:
+                    selector_cache.miss("insert_btn")
                 
-                # 前回のセレクタが失敗した場合は通常の検索
+                # 前回のセレクタが失敗した場合は、候補をまとめて1回だけ待機
                 if not insert_btn_found:
-                    # 挿入ボタンが表示されるまで少し待機（短縮）
-                    time.sleep(0.3)
-                    
-                    # まずJavaScriptを使用して直接クリックを試みる（オーバーレイ問題回避）
-                    for selector in insert_btn_selectors:
-                        try:
-                            button = page.query_selector(selector)
-                            if button:
-                                print(f"挿入ボタンが見つかりました: {selector}")
-                                # JavaScriptを使用してクリック（CDKオーバーレイの問題を回避）
-                                page.evaluate("""(btn) => { btn.click(); }""", button)
-                                learned_selectors["insert_btn"] = selector  # 成功したセレクタを記憶
-                                insert_btn_found = True
-                                # 最小限の待機（非常に短く）
-                                time.sleep(wait_times["insert_after"])
-                                break
-                        except Exception:
-                            continue
+                    try:
+                        selector = race_selectors(page, insert_btn_selectors, DEFAULT_STEP_TIMEOUTS["insert_button"])
+                        button = page.query_selector(selector) if selector else None
+                        if button:
+                            print(f"挿入ボタンが見つかりました: {selector}")
+                            # JavaScriptを使用してクリック（CDKオーバーレイの問題を回避）
+                            page.evaluate("""(btn) => { btn.click(); }""", button)
+                            selector_cache.store("insert_btn", selector)  # 成功したセレクタを記憶
+                            insert_btn_found = True
+                    except Exception:
+                        pass
                 
                 # それでも失敗した場合、Enter キーを押して送信
                 if not insert_btn_found:
@@ -421,8 +942,6 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                     try:
                         page.keyboard.press("Enter")
                         insert_btn_found = True
-                        # 最小限の待機（非常に短く）
-                        time.sleep(wait_times["insert_after"])
                     except Exception:
                         pass
                 
@@ -430,54 +949,530 @@ def add_urls_to_notebooklm(notebook_url, urls_to_add, max_urls=5):
                     raise Exception("挿入ボタンが見つからないかクリックできませんでした")
                 
                 print("挿入ボタンをクリックしました")
+                profiler.finish(span, selector_hit=cache_hit)
+                return insert_started, baseline_rows
+            
+            def submit_urls(urls, first):
+                """1回のダイアログで urls をウェブサイトのソースとして挿入し、完了を確認する
+
+                戻り値: 挿入の応答、またはダイアログが閉じたこと・ソース一覧への追加を確認できたか
+                """
+                prepare_urls(urls, first)
+                insert_started, baseline_rows = insert_prepared()
                 
-                # 追加完了の確認 - 非同期・効率的なアプローチ
-                start_time = time.time()
-                added_detected = False
-                
-                # URLが追加されたことを示す指標を監視
-                while (time.time() - start_time) < parallel_mode["max_check_time"]:
-                    # 短い間隔で各セレクタを迅速にチェック
-                    for selector in url_added_selectors:
-                        if is_element_present(selector):
-                            added_detected = True
-                            break
-                    
-                    if added_detected:
-                        # 成功の兆候が見つかれば待機を中断
-                        break
-                    
-                    # 短い間隔で再チェック
-                    time.sleep(0.1)
-                
-                # 最低限の待機時間を確保
-                remaining_time = wait_times["next_url"] - (time.time() - start_time)
-                if remaining_time > 0:
-                    time.sleep(remaining_time)
-                
-                print(f"URL {url} を追加しました")
+                # 追加完了の確認 - 固定の待機ではなく、挿入の応答とダイアログ・ソース一覧の変化を待つ
+                responded = wait_for_insert_response(insert_started, urls)
+                if responded:
+                    latency.observe("insert_response", time.time() - insert_started)
+                else:
+                    print("挿入の応答を確認できませんでした")
+                span = profiler.start("confirm")
+                if wait_for_insert_confirmed(baseline_rows):
+                    latency.observe("confirm", time.time() - insert_started)
+                    profiler.finish(span)
+                    return True
+                print("ダイアログが閉じたこと、またはソース一覧への追加を確認できませんでした")
+                profiler.finish(span, status="timeout")
+                return responded
+            
+            def record(url, status, attempt=None, error=None):
+                if journal:
+                    journal.record(notebook_url, url, status, attempt=attempt, error=error)
+            
+            def submit_with_retry(url, first, failed_attempts=0):
+                """1件のURLを追加し、失敗した場合は待機時間を倍々にして再試行する"""
+                started = time.time()
+                for attempt in range(failed_attempts + 1, max_retries + 2):
+                    if attempt > 1:
+                        time.sleep(retry_backoff * 2 ** (attempt - 2))
+                    try:
+                        if not submit_urls([url], first and attempt == 1):
+                            # 遅れて追加される可能性があるため、追加済みとは記録せず、この実行では再試行しない
+                            record(url, STATUS_FAILED, attempt=attempt, error="追加を確認できませんでした")
+                            print(f"URL {url} の追加を確認できませんでした")
+                            close_dialog()
+                            profiler.record("upload_url", time.time() - started, status="unconfirmed",
+                                            retries=attempt - 1, url=url)
+                            return False
+                        record(url, STATUS_DONE, attempt=attempt)
+                        profiler.record("upload_url", time.time() - started, retries=attempt - 1, url=url)
+                        print(f"URL {url} を追加しました")
+                        return True
+                    except Exception as e:
+                        profiler.abort_open(str(e))
+                        record(url, STATUS_FAILED, attempt=attempt, error=str(e))
+                        print(f"URL {url} の追加に失敗しました（{attempt}回目）: {e}")
+                        close_dialog()
+                profiler.record("upload_url", time.time() - started, status="failed",
+                                retries=max_retries, url=url)
+                return False
+            
+            def switch_tab(tab):
+                """以降の操作の対象を tab に切り替える"""
+                nonlocal page, insert_responses
+                page = tab["page"]
+                insert_responses = tab["responses"]
+            
+            added_count = 0
+            failed_urls = []
             
-            print(f"合計 {len(urls_to_add)} 個のURLが追加されました")
+            def record_unconfirmed(batch, error):
+                """挿入したが追加を確認できなかったまとまりを記録する
+
+                遅れて追加される可能性があるため、追加済みとは記録せず、この実行では追加し直さない
+                （次回の実行で再試行し、追加されていた場合はソース一覧の確認でスキップされる）。
+                """
+                for url in batch:
+                    record(url, STATUS_FAILED, attempt=1, error=error)
+                    print(f"URL {url} の追加を確認できませんでした")
+                failed_urls.extend(batch)
+            
+            def finish_in_flight(tab):
+                """タブで挿入済みのまとまりについて挿入の応答を確認し、結果を記録する"""
+                nonlocal added_count
+                if not tab["in_flight"]:
+                    return
+                batch, insert_started = tab["in_flight"]
+                tab["in_flight"] = None
+                current = {"page": page, "responses": insert_responses}
+                switch_tab(tab)
+                if wait_for_insert_response(insert_started, batch):
+                    latency.observe("insert_response", time.time() - insert_started)
+                    profiler.record("insert_response", time.time() - insert_started, urls=len(batch))
+                else:
+                    print("挿入の応答を確認できませんでした")
+                    profiler.record("insert_response", time.time() - insert_started, status="timeout",
+                                    urls=len(batch))
+                    switch_tab(current)
+                    record_unconfirmed(batch, "挿入の応答を確認できませんでした")
+                    return
+                switch_tab(current)
+                for url in batch:
+                    record(url, STATUS_DONE, attempt=1)
+                    print(f"URL {url} を追加しました")
+                added_count += len(batch)
             
-            print("処理が完了しました。ブラウザは自動的に閉じられません。")
-            print("確認後、手動でブラウザを閉じてください。")
+            def finish_all():
+                # 割り当てた順（＝挿入した順）に確認する
+                for tab in sorted(tab_states, key=lambda t: t["in_flight"][1] if t["in_flight"] else 0):
+                    finish_in_flight(tab)
             
-            # 自動で閉じない
-            input("終了するには Enter キーを押してください...")
+            batches = chunk_urls(urls_to_add, batch_size)
+            tab_states = session.tabs_for(max(1, min(parallel_mode["tabs"], len(batches))))
+            
+            processed_count = 0
+            for batch_index, batch in enumerate(batches):
+                # まとまりを順番に各タブへ割り当てる
+                tab = tab_states[batch_index % len(tab_states)]
+                switch_tab(tab)
+                first = not tab["used"]
+                tab["used"] = True
+                if len(batch) > 1:
+                    print(f"まとめて追加中 ({batch_index + 1}/{len(batches)}): "
+                          f"URL {processed_count + 1}～{processed_count + len(batch)}/{len(urls_to_add)}")
+                else:
+                    print(f"URL {processed_count + 1}/{len(urls_to_add)} を追加中: {batch[0]}")
+                processed_count += len(batch)
+                inserted = False
+                
+                try:
+                    if not parallel_mode["prepare_next"]:
+                        finish_in_flight(tab)
+                    # 前のまとまりの挿入の処理中に、次のまとまりのダイアログを開いて入力しておく
+                    prepare_urls(batch, first)
+                    finish_in_flight(tab)
+                    insert_started, baseline_rows = insert_prepared()
+                    inserted = True
+                    # 次の準備を始める前に、ダイアログが閉じたことだけを確認する
+                    span = profiler.start("confirm", urls=len(batch))
+                    if not wait_for_insert_confirmed(baseline_rows):
+                        profiler.finish(span, status="timeout")
+                        if len(batch) > 1 and has_batch_error():
+                            raise Exception("まとめての挿入が受け付けられませんでした")
+                        # 挿入が遅れているだけの可能性があるため、1件ずつ追加し直すことはしない
+                        close_dialog()
+                        finish_all()
+                        switch_tab(tab)
+                        record_unconfirmed(batch, "挿入後にダイアログが閉じたことを確認できませんでした")
+                        continue
+                    latency.observe("confirm", time.time() - insert_started)
+                    profiler.finish(span)
+                    if len(batch) > 1 and is_batch_rejected():
+                        raise Exception("まとめての挿入が受け付けられませんでした")
+                    tab["in_flight"] = (batch, insert_started)
+                except Exception as e:
+                    profiler.abort_open(str(e))
+                    close_dialog()
+                    # 結果の記録が前後しないよう、先に挿入したまとまりを確認してから追加し直す
+                    finish_all()
+                    switch_tab(tab)
+                    present = set()
+                    if inserted:
+                        # 挿入が遅れて反映された場合に二重に追加しないよう、ソース一覧に既にあるURLは追加し直さない
+                        present = {key for source in read_source_statuses(page) if source["status"] != "failed"
+                                   for key in source["urls"]}
+                    if len(batch) > 1:
+                        print(f"{e}。このまとまりを1件ずつ追加します")
+                        retry_from = 0
+                    else:
+                        retry_from = 1
+                        if normalize_url(batch[0]) not in present:
+                            record(batch[0], STATUS_FAILED, attempt=1, error=str(e))
+                            print(f"URL {batch[0]} の追加に失敗しました（1回目）: {e}")
+                    for url in batch:
+                        if normalize_url(url) in present:
+                            record(url, STATUS_DONE, attempt=1)
+                            print(f"URL {url} はソース一覧に追加されていました")
+                            added_count += 1
+                        elif submit_with_retry(url, False, failed_attempts=retry_from):
+                            added_count += 1
+                        else:
+                            failed_urls.append(url)
+            finish_all()
+            
+            print(f"合計 {added_count} 個のURLが追加されました")
+            result["added"] = added_count
+            result["failed"] = failed_urls
+            if failed_urls:
+                print(f"{len(failed_urls)}個のURLは追加できませんでした（再実行すると再試行します）:")
+                for url in failed_urls:
+                    print(f"  {url}")
+            
+            if session.headless or not keep_open:
+                print("処理が完了しました。")
+            else:
+                print("処理が完了しました。ブラウザは自動的に閉じられません。")
+                print("確認後、手動でブラウザを閉じてください。")
+                
+                # 自動で閉じない
+                input("終了するには Enter キーを押してください...")
             
         except Exception as e:
+            profiler.abort_open(str(e))
+            result["error"] = str(e)
             print(f"エラーが発生しました: {str(e)}")
             # エラーが発生しても、ユーザーがブラウザを確認できるように待機
-            input("エラーが発生しました。ブラウザを確認し、終了するには Enter キーを押してください...")
+            if not session.headless and keep_open:
+                input("エラーが発生しました。ブラウザを確認し、終了するには Enter キーを押してください...")
         finally:
-            # ブラウザを閉じる
-            browser.close()
+            # 成功したセレクタを保存
+            try:
+                selector_cache.save()
+            except OSError as e:
+                print(f"セレクタキャッシュを保存できませんでした: {e}")
+            stats = selector_cache.stats()
+            if stats:
+                print("セレクタキャッシュ（ヒット/ミス）: " +
+                      ", ".join(f"{key} {hits}/{misses}" for key, (hits, misses) in stats.items()))
+    
+    return result
+
+def add_files_to_notebooklm(notebook_url, file_paths, as_text=False, auth_state=None, headless=False,
+                            relogin=False, journal=None, keep_open=True, session=None, cdp_endpoint=None):
+    """テキストやMarkdownのファイルをNotebookLMのソースとして追加する関数
+
+    text_bundler.py でまとめたファイルを1件ずつ追加する。as_text を指定すると、
+    ファイルをアップロードする代わりに内容を「コピーしたテキスト」として貼り付ける。
+    journal を指定すると、ファイルのパスごとに結果を記録し、追加済みのファイルはスキップする。
+    戻り値: {"added": 追加したファイルの数, "failed": 追加できなかったファイルのリスト}
+    """
+    result = {"added": 0, "failed": []}
+    keys = {path: "file://" + os.path.abspath(path) for path in file_paths}
+    if journal:
+        file_paths = [path for path in file_paths if not journal.is_done(notebook_url, keys[path])]
+        if not file_paths:
+            print("追加するファイルはありません（すべて追加済みです）")
+            return result
+
+    own_session = session is None
+    if own_session:
+        session = NotebookSession(notebook_url, auth_state=auth_state, headless=headless, relogin=relogin,
+                                  cdp_endpoint=cdp_endpoint)
+
+    with (session if own_session else nullcontext(session)):
+        try:
+            if not session.is_open():
+                session.open()
+            page = session.page
+
+            def open_dialog():
+                """ソースの種類の選択肢が表示された状態にする（新しいノートブックでは最初から表示される）"""
+                if page.locator(DIALOG_SELECTOR).first.is_visible():
+                    return
+                selector = race_selectors(page, ADD_SOURCE_BUTTON_SELECTORS, DEFAULT_STEP_TIMEOUTS["ready"])
+                page.click(selector)
+                page.wait_for_selector(DIALOG_SELECTOR, timeout=DEFAULT_STEP_TIMEOUTS["option_menu"])
+
+            def add_file(path):
+                open_dialog()
+                baseline_rows = page.eval_on_selector_all(SOURCE_ROW_SELECTOR, "els => els.length")
+                if as_text:
+                    page.click(race_selectors(page, PASTE_TEXT_OPTION_SELECTORS, DEFAULT_STEP_TIMEOUTS["website_option"]))
+                    selector = race_selectors(page, PASTE_TEXT_INPUT_SELECTORS, DEFAULT_STEP_TIMEOUTS["url_input"])
+                    with open(path, 'r', encoding='utf-8') as f:
+                        page.fill(selector, f.read())
+                    button = race_selectors(page, INSERT_BUTTON_SELECTORS, DEFAULT_STEP_TIMEOUTS["insert_button"])
+                    page.click(button)
+                else:
+                    # 選択肢をクリックするとファイル選択ダイアログが開くため、それを受け取ってファイルを渡す
+                    option = race_selectors(page, UPLOAD_OPTION_SELECTORS, DEFAULT_STEP_TIMEOUTS["website_option"])
+                    try:
+                        with page.expect_file_chooser(timeout=DEFAULT_STEP_TIMEOUTS["url_input"]) as chooser:
+                            page.click(option)
+                        chooser.value.set_files(path)
+                    except PlaywrightTimeoutError:
+                        # ファイル選択ダイアログが開かない場合は、ダイアログ内のファイル入力に直接渡す
+                        page.set_input_files("input[type='file']", path)
+                page.wait_for_function(INSERT_CONFIRMED_SCRIPT,
+                                       arg={"dialog": DIALOG_SELECTOR, "rows": SOURCE_ROW_SELECTOR,
+                                            "baseline": baseline_rows},
+                                       timeout=FILE_SOURCE_TIMEOUT)
+
+            for i, path in enumerate(file_paths, 1):
+                print(f"ファイル {i}/{len(file_paths)} を追加中: {path}")
+                try:
+                    add_file(path)
+                    if journal:
+                        journal.record(notebook_url, keys[path], STATUS_DONE, attempt=1)
+                    result["added"] += 1
+                    print(f"ファイル {path} を追加しました")
+                except Exception as e:
+                    if journal:
+                        journal.record(notebook_url, keys[path], STATUS_FAILED, attempt=1, error=str(e))
+                    result["failed"].append(path)
+                    print(f"ファイル {path} の追加に失敗しました: {e}")
+                    try:
+                        page.keyboard.press("Escape")
+                    except Exception:
+                        pass
+
+            print(f"合計 {result['added']} 個のファイルが追加されました")
+            if not session.headless and keep_open:
+                input("終了するには Enter キーを押してください...")
+        except Exception as e:
+            result["error"] = str(e)
+            print(f"エラーが発生しました: {str(e)}")
+            if not session.headless and keep_open:
+                input("エラーが発生しました。ブラウザを確認し、終了するには Enter キーを押してください...")
+    return result
+
+def read_source_statuses(page):
+    """ソース一覧を1回だけ読み取り、各ソースの正規化したURLの集合・状態・タイトルのリストを返す関数"""
+    try:
+        rows = page.evaluate(SOURCE_STATUS_SCRIPT, SOURCE_ROW_SELECTOR)
+    except Exception as e:
+        print(f"ソース一覧を読み取れませんでした: {e}")
+        return []
+    return [{"urls": {normalize_url(url) for url in row["urls"]}, "status": row["status"], "title": row["title"]}
+            for row in rows]
+
+def reconcile_sources(submitted_urls, sources):
+    """追加したURLとソース一覧（read_source_statuses() の結果）を照合する関数
+
+    URLごとに、正常なソースが1つでもあれば ok、なければ processing、failed の順に判定し、
+    一覧にないURLは missing とする。同じURLのソースが複数ある場合は duplicates にその数を記録する。
+    戻り値: {"ok", "processing", "failed", "missing": URLのリスト, "duplicates": {URL: ソースの数},
+             "unmatched": URLを読み取れなかったソースの数}
+    """
+    statuses_by_url = {}
+    unmatched = 0
+    for source in sources:
+        if not source["urls"]:
+            unmatched += 1
+        for key in source["urls"]:
+            statuses_by_url.setdefault(key, []).append(source["status"])
+
+    report = {"ok": [], "processing": [], "failed": [], "missing": [], "duplicates": {}, "unmatched": unmatched}
+    for url in dedupe_urls(submitted_urls):
+        statuses = statuses_by_url.get(normalize_url(url))
+        if not statuses:
+            report["missing"].append(url)
+            continue
+        if len(statuses) > 1:
+            report["duplicates"][url] = len(statuses)
+        if "ok" in statuses:
+            report["ok"].append(url)
+        elif "processing" in statuses:
+            report["processing"].append(url)
+        else:
+            report["failed"].append(url)
+    return report
+
+def print_reconcile_report(report):
+    print(f"照合結果: 追加済み {len(report['ok'])}件、処理中 {len(report['processing'])}件、"
+          f"失敗 {len(report['failed'])}件、見つからない {len(report['missing'])}件、重複 {len(report['duplicates'])}件")
+    for label, key in (("失敗", "failed"), ("見つからない", "missing"), ("処理中", "processing")):
+        for url in report[key]:
+            print(f"  {label}: {url}")
+    for url, count in report["duplicates"].items():
+        print(f"  重複（{count}件）: {url}")
+    if report["unmatched"]:
+        print(f"URLを読み取れなかったソースが {report['unmatched']} 件あります（照合の対象外）")
+
+def reconcile_notebook(notebook_url, submitted_urls, session=None, journal=None, resubmit=True,
+                       resubmit_missing=False, processing_wait=30, **upload_options):
+    """追加後にソース一覧とソースごとの状態を一括で読み取り、追加したURLと照合する関数
+
+    見つからない・失敗した・重複したURLを報告する。処理中のソースが残っている場合は、
+    processing_wait 秒まで一覧の読み取りだけを繰り返す（URLごとには待たない）。
+    resubmit を指定すると、失敗したURLと見つからなかったURLを1回のダイアログでまとめて追加し直す
+    （ジャーナルには失敗として記録し直してから追加する）。ただし、URLを読み取れなかったソース
+    （タイトルだけが表示されているものなど）がある場合、見つからなかったURLは既に追加されている
+    可能性があるため、resubmit_missing を指定しない限り報告だけにとどめる。
+    upload_options は add_urls_to_notebooklm() と同じ。
+    戻り値: reconcile_sources() の結果（追加し直した場合は "resubmitted" に add_urls_to_notebooklm() の結果）
+    """
+    own_session = session is None
+    if own_session:
+        session = NotebookSession(notebook_url, auth_state=upload_options.get("auth_state"),
+                                  headless=upload_options.get("headless", False),
+                                  relogin=upload_options.get("relogin", False),
+                                  cdp_endpoint=upload_options.get("cdp_endpoint"))
+    with (session if own_session else nullcontext(session)):
+        if not session.is_open():
+            session.open()
+        print("ソース一覧を読み取り、追加したURLと照合しています...")
+        deadline = time.time() + processing_wait
+        report = reconcile_sources(submitted_urls, read_source_statuses(session.page))
+        while report["processing"] and time.time() < deadline:
+            time.sleep(RECONCILE_POLL_INTERVAL)
+            report = reconcile_sources(submitted_urls, read_source_statuses(session.page))
+        print_reconcile_report(report)
+
+        retry_urls = list(report["failed"])
+        if report["missing"] and report["unmatched"] and not resubmit_missing:
+            print(f"URLを読み取れなかったソースがあるため、見つからない {len(report['missing'])} 件のURLは"
+                  f"追加し直しません（追加し直す場合は --resubmit-missing を指定してください）")
+        else:
+            retry_urls += report["missing"]
+        if resubmit and retry_urls:
+            if journal:
+                for url in retry_urls:
+                    journal.record(notebook_url, url, STATUS_FAILED, error="照合でソースが失敗または見つからない")
+            print(f"{len(retry_urls)}個のURLを追加し直します...")
+            # 1回のダイアログでまとめて挿入する（受け付けられなかった場合は1件ずつ追加し直す）
+            options = dict(upload_options, skip_existing=False, batch_size=len(retry_urls))
+            report["resubmitted"] = add_urls_to_notebooklm(notebook_url, retry_urls, max_urls=len(retry_urls),
+                                                           journal=journal, session=session, keep_open=False,
+                                                           **options)
+    return report
+
+def load_depths(tree_path, urls):
+    """スクレイパーの階層情報（--tree-output のTSV）から各URLの階層の深さを取得する関数"""
+    depth_by_url = {}
+    with open(tree_path, 'r', encoding='utf-8') as f:
+        next(f, None)  # ヘッダー行
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 5:
+                depth_by_url.setdefault(normalize_url(fields[4]), int(fields[1]))
+    return [depth_by_url.get(normalize_url(url), 0) for url in urls]
+
+def plan_shards(urls, capacity, depths=None):
+    """URLのリストを capacity 件以下の連続したまとまり（シャード）に分割する関数
+
+    depths（各URLの階層の深さ）を指定した場合、上限の3/4以降の範囲で
+    できるだけ浅い階層の項目（上位のセクションの先頭）の直前で区切り、
+    同じセクションのページが別のノートブックに分かれにくくする。
+    """
+    capacity = max(1, capacity)
+    depths = depths or [0] * len(urls)
+    shards = []
+    start = 0
+    while start < len(urls):
+        end = min(start + capacity, len(urls))
+        if end < len(urls):
+            # 区切り位置の候補のうち、階層が浅く、より後ろのものを選ぶ
+            window_start = start + max(1, capacity * 3 // 4)
+            end = min(range(window_start, end + 1), key=lambda i: (depths[i], -i))
+        shards.append(urls[start:end])
+        start = end
+    return shards
+
+def write_shard_manifest(manifest_path, shards, notebooks, journal=None):
+    """どのURLをどのノートブックに割り当てたかをTSVで書き込む関数"""
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        f.write("index\tshard\tnotebook\turl\tstatus\n")
+        index = 0
+        for shard_index, (shard, notebook_url) in enumerate(zip(shards, notebooks), 1):
+            for url in shard:
+                index += 1
+                status = journal.status(notebook_url, url) if journal else None
+                f.write(f"{index}\t{shard_index}\t{notebook_url}\t{url}\t{status or ''}\n")
+
+def upload_sharded(notebooks, urls, capacity=NOTEBOOK_SOURCE_LIMIT, depths=None,
+                   manifest_path="shard_manifest.tsv", concurrency=None, journal=None,
+                   selector_cache_path=None, auth_state=None, headless=False, relogin=False,
+                   cdp_endpoint=None, **upload_options):
+    """URLのリストをシャードに分割し、複数のノートブックへ並行して追加する関数
+
+    まず capacity のままセクションの境界で区切り、ノートブックが足りない場合に限り、
+    境界を無視して capacity いっぱいまで詰めて分割し直す。シャードごとに別のブラウザで
+    add_urls_to_notebooklm() を並行して実行し、最後に割り当ての一覧を書き込む。
+    ログインはシャードを始める前に1回だけ行い、そのログイン状態をすべてのシャードで使う
+    （auth_state を省略した場合は一時ファイルに保存する）。セレクタキャッシュはシャード間で共有する。
+    """
+    shards = plan_shards(urls, capacity, depths)
+    if len(shards) > len(notebooks) and depths:
+        # セクションの境界で区切るとノートブックが足りない場合は、上限いっぱいまで詰めて分割し直す
+        fixed_shards = plan_shards(urls, capacity)
+        if len(fixed_shards) <= len(notebooks):
+            print(f"警告: セクションの境界で区切ると {len(shards)} 個のノートブックが必要なため"
+                  f"（指定: {len(notebooks)} 個）、{capacity}個ずつ区切ります（同じセクションが分かれる場合があります）")
+        shards = fixed_shards
+    if len(shards) > len(notebooks):
+        raise ValueError(f"{len(urls)}個のURLを追加するには {len(shards)} 個のノートブックが必要です"
+                         f"（指定: {len(notebooks)} 個）")
+
+    print(f"{len(urls)}個のURLを {len(shards)} 個のノートブックに分割します:")
+    for shard_index, (shard, notebook_url) in enumerate(zip(shards, notebooks), 1):
+        print(f"  シャード {shard_index}: {len(shard)}個 -> {notebook_url}")
+
+    selector_cache = SelectorCache(selector_cache_path)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        auth_state = auth_state or os.path.join(tmp_dir, "auth_state.json")
+        if relogin or not check_auth_state(auth_state)[0]:
+            # シャードごとのブラウザでそれぞれ手動ログインを待たないよう、先に1回だけログインして状態を保存する
+            print("シャードの追加を始める前にログインします")
+            try:
+                with NotebookSession(notebooks[0], auth_state=auth_state, relogin=relogin,
+                                     cdp_endpoint=cdp_endpoint) as login_session:
+                    login_session.open()
+            except Exception as e:
+                print(f"ログインできませんでした: {e}")
+                return []
+
+        def upload_shard(shard, notebook_url):
+            # ログイン状態のファイルは読み込むだけにし、シャード同士で同時に書き込まない
+            session = NotebookSession(notebook_url, auth_state=auth_state, headless=headless,
+                                      cdp_endpoint=cdp_endpoint, save_auth_state=False)
+            with session:
+                return add_urls_to_notebooklm(notebook_url, shard, max_urls=len(shard), journal=journal,
+                                              selector_cache=selector_cache, session=session,
+                                              keep_open=False, **upload_options)
+
+        # シャードごとに別のブラウザ（コンテキスト）で並行して追加する
+        with ThreadPoolExecutor(max_workers=concurrency or len(shards)) as executor:
+            futures = [executor.submit(upload_shard, shard, notebook_url)
+                       for shard, notebook_url in zip(shards, notebooks)]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    print(f"シャードの追加中にエラーが発生しました: {e}")
+                    results.append(None)
+
+    write_shard_manifest(manifest_path, shards, notebooks, journal)
+    print(f"割り当ての一覧を {os.path.abspath(manifest_path)} に保存しました")
+    return results
 
 def main():
     # コマンドライン引数の解析
     parser = argparse.ArgumentParser(description='NotebookLMにURLを追加するツール')
-    parser.add_argument('--url', type=str, required=True,
-                        help='NotebookLMのURL（必須）')
+    parser.add_argument('--url', type=str, default=None,
+                        help='NotebookLMのURL（--notebooks を指定しない場合は必須）')
     parser.add_argument('--file', type=str, default="aws_links.txt",
                         help='URLリストが含まれるファイルのパス')
     parser.add_argument('--start', type=int, default=1,
@@ -486,8 +1481,93 @@ def main():
                         help='追加するURLの終了番号')
     parser.add_argument('--max', type=int, default=None,
                         help='一度に追加するURLの最大数')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='1回のダイアログでまとめて挿入するURLの数（デフォルト: 1）')
+    parser.add_argument('--auth-state', type=str, default=None,
+                        help='ログイン状態を保存・再利用するファイルのパス（例: auth_state.json）')
+    parser.add_argument('--headless', action='store_true',
+                        help='保存済みのログイン状態が有効な場合にブラウザを表示せずに実行する')
+    parser.add_argument('--relogin', action='store_true',
+                        help='保存済みのログイン状態を使わずにログインし直し、状態を保存し直す')
+    parser.add_argument('--cdp-endpoint', type=str, default=None,
+                        help='ブラウザを起動せずに接続する共有ブラウザのエンドポイント（例: http://127.0.0.1:9222）。'
+                             '終了時も共有ブラウザは閉じない')
+    parser.add_argument('--journal', type=str, default='upload_journal.jsonl',
+                        help='URLごとの追加結果を記録するジャーナルファイル（デフォルト: upload_journal.jsonl）')
+    parser.add_argument('--no-journal', action='store_true',
+                        help='ジャーナルを使用しない（追加済みのURLもスキップしない）')
+    parser.add_argument('--no-skip-existing', action='store_true',
+                        help='ノートブックのソース一覧に既に含まれるURLも追加する')
+    parser.add_argument('--selector-cache', type=str, default='selector_cache.json',
+                        help='成功したセレクタを保存するファイル（デフォルト: selector_cache.json）')
+    parser.add_argument('--no-selector-cache', action='store_true',
+                        help='セレクタをファイルに保存せず、この実行の間だけ記憶する')
+    parser.add_argument('--tabs', type=int, default=1,
+                        help='同じノートブックを開いて並行して追加するタブの数（デフォルト: 1）')
+    parser.add_argument('--no-prepare-next', action='store_true',
+                        help='挿入の応答を確認してから次のURLのダイアログを開く（先行入力を行わない）')
+    parser.add_argument('--notebooks', type=str, nargs='+', default=None,
+                        help='URLを分割して追加する複数のノートブックのURL（指定すると分割モードで実行）')
+    parser.add_argument('--capacity', type=int, default=NOTEBOOK_SOURCE_LIMIT,
+                        help=f'分割モードで1つのノートブックに追加するURLの上限（デフォルト: {NOTEBOOK_SOURCE_LIMIT}）')
+    parser.add_argument('--tree', type=str, default=None,
+                        help='スクレイパーの --tree-output で保存した階層情報。分割をセクションの境界に合わせる')
+    parser.add_argument('--manifest', type=str, default='shard_manifest.tsv',
+                        help='分割モードでURLとノートブックの対応を保存するファイル（デフォルト: shard_manifest.tsv）')
+    parser.add_argument('--shard-concurrency', type=int, default=None,
+                        help='分割モードで同時に処理するノートブックの数（デフォルト: すべて）')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='追加に失敗したURLを再試行する回数（デフォルト: 2）')
+    parser.add_argument('--retry-backoff', type=float, default=2.0,
+                        help='再試行前の最初の待機時間（秒）。再試行ごとに2倍になる（デフォルト: 2.0）')
+    parser.add_argument('--validate', action='store_true',
+                        help='追加する前に各URLをHTTPで確認し、リダイレクト先に置き換えて取得できないURLを除く')
+    parser.add_argument('--validation-cache', type=str, default='url_validation.json',
+                        help='URLの検証結果を保存するファイル（デフォルト: url_validation.json）')
+    parser.add_argument('--validation-ttl-hours', type=float, default=24,
+                        help='保存したURLの検証結果の有効期間（時間、デフォルト: 24）')
+    parser.add_argument('--reconcile', action='store_true',
+                        help='追加後にソース一覧と各ソースの状態を一括で読み取り、見つからない・失敗した・重複したURLを報告する')
+    parser.add_argument('--reconcile-wait', type=float, default=30,
+                        help='照合で処理中のソースが残っている場合に待つ最大時間（秒、デフォルト: 30）')
+    parser.add_argument('--no-resubmit', action='store_true',
+                        help='照合で失敗した・見つからなかったURLを追加し直さない')
+    parser.add_argument('--resubmit-missing', action='store_true',
+                        help='URLを読み取れなかったソースがある場合も、照合で見つからなかったURLを追加し直す')
+    parser.add_argument('--link-manifest', type=str, default=None,
+                        help='スクレイパーが書き込んだリンクのマニフェスト（.jsonl または .db）。指定すると --file の代わりに使用する')
+    parser.add_argument('--section', type=str, default=None,
+                        help='リンクのマニフェストのうち、このセクション（タイトル、または "親 > 子" のパス）以下のURLだけを追加する')
+    parser.add_argument('--bundles', type=str, nargs='+', default=None,
+                        help='text_bundler.py でまとめたファイル。指定するとURLの代わりにファイルをソースとして追加する')
+    parser.add_argument('--bundle-as', choices=['file', 'text'], default='file',
+                        help='まとめたファイルの追加方法（file: アップロード、text: コピーしたテキストとして貼り付け。'
+                             'デフォルト: file）')
+    parser.add_argument('--profile', type=str, nargs='?', const='uploader_profile.jsonl', default=None,
+                        help='手順ごとの所要時間をJSON Lines形式で記録し、終了時に集計を表示する'
+                             '（ファイル名省略時: uploader_profile.jsonl）')
     
     args = parser.parse_args()
+    if not args.url and not args.notebooks:
+        parser.error("--url または --notebooks を指定してください")
+    if args.reconcile and args.notebooks:
+        parser.error("--reconcile は --notebooks と同時に指定できません")
+    if args.section and not args.link_manifest:
+        parser.error("--section を指定する場合は --link-manifest を指定してください")
+    
+    if args.bundles:
+        # まとめたファイルをソースとして追加
+        if not args.url:
+            parser.error("--bundles を指定する場合は --url を指定してください")
+        journal = None if args.no_journal else UploadJournal(args.journal)
+        try:
+            add_files_to_notebooklm(args.url, args.bundles, as_text=args.bundle_as == 'text',
+                                    auth_state=args.auth_state, headless=args.headless, relogin=args.relogin,
+                                    journal=journal, cdp_endpoint=args.cdp_endpoint)
+        finally:
+            if journal:
+                journal.close()
+        return
     
     # 引数から値を取得
     notebook_url = args.url
@@ -496,8 +1576,19 @@ def main():
     end_index = args.end
     max_urls = args.max
     
-    # ファイルからURLを抽出
-    urls = extract_urls_from_file(file_path)
+    manifest_depths = None
+    if args.link_manifest:
+        # リンクのマニフェストから該当する範囲だけを読み込む（セクションは索引から範囲を求める）
+        records = list(iter_manifest(args.link_manifest, section=args.section, start=args.start, end=args.end))
+        urls = [record['url'] for record in records]
+        manifest_depths = [record['depth'] for record in records]
+        if args.section:
+            print(f"セクション「{args.section}」以下の {len(urls)} 個のURLをマニフェストから読み込みました")
+        # 範囲は読み込み時に適用済み
+        start_index, end_index = 0, None
+    else:
+        # ファイルからURLを抽出
+        urls = extract_urls_from_file(file_path)
     
     if urls:
         # URLのフィルタリング（指定された範囲のみ）
@@ -508,9 +1599,67 @@ def main():
             filtered_urls = urls
             print(f"{len(filtered_urls)}個のURLが抽出されました。")
         
+        if args.validate and filtered_urls:
+            # ダイアログを開く前に、取得できないURLを除いてリダイレクト先に置き換える
+            print(f"{len(filtered_urls)}個のURLを確認しています...")
+            results = validate_urls(filtered_urls,
+                                    cache=ValidationCache(args.validation_cache, ttl=args.validation_ttl_hours * 3600))
+            print_validation_summary(results)
+            usable = select_usable(results)
+            filtered_urls = [results[i]["final_url"] for i in usable]
+            if manifest_depths:
+                manifest_depths = [manifest_depths[i] for i in usable]
+            print(f"{len(filtered_urls)}個のURLを追加します。")
+        
         # NotebookLMにURLを追加
         if len(filtered_urls) > 0:
-            add_urls_to_notebooklm(notebook_url, filtered_urls, max_urls=max_urls if max_urls else len(filtered_urls))
+            journal = None if args.no_journal else UploadJournal(args.journal)
+            selector_cache_path = None if args.no_selector_cache else args.selector_cache
+            profiler = StepProfiler(args.profile, enabled=args.profile is not None)
+            upload_options = dict(batch_size=args.batch_size, auth_state=args.auth_state,
+                                  headless=args.headless, relogin=args.relogin,
+                                  max_retries=args.retries, retry_backoff=args.retry_backoff,
+                                  skip_existing=not args.no_skip_existing,
+                                  prepare_next=not args.no_prepare_next, tabs=args.tabs,
+                                  profiler=profiler, cdp_endpoint=args.cdp_endpoint)
+            try:
+                if args.notebooks:
+                    # 複数のノートブックに分割して並行して追加
+                    depths = load_depths(args.tree, filtered_urls) if args.tree else manifest_depths
+                    upload_sharded(args.notebooks, filtered_urls, capacity=args.capacity, depths=depths,
+                                   manifest_path=args.manifest, concurrency=args.shard_concurrency,
+                                   journal=journal, selector_cache_path=selector_cache_path, **upload_options)
+                else:
+                    selector_cache = SelectorCache(selector_cache_path)
+                    # 照合する場合は、追加と照合で同じブラウザを使う
+                    session = (NotebookSession(notebook_url, auth_state=args.auth_state, headless=args.headless,
+                                               relogin=args.relogin, cdp_endpoint=args.cdp_endpoint)
+                               if args.reconcile else None)
+                    try:
+                        max_count = max_urls if max_urls else len(filtered_urls)
+                        upload_result = add_urls_to_notebooklm(notebook_url, filtered_urls, max_urls=max_count,
+                                                               journal=journal, selector_cache=selector_cache,
+                                                               session=session, keep_open=not args.reconcile,
+                                                               **upload_options)
+                        if args.reconcile and "error" not in upload_result:
+                            # この実行で追加を試みたURLを照合する（すべて追加済みで何も追加しなかった場合は、
+                            # 選択した範囲のURLを照合する）
+                            reconcile_urls = upload_result["submitted"] or filtered_urls[:max_count]
+                            reconcile_notebook(notebook_url, reconcile_urls, session=session,
+                                               journal=journal, resubmit=not args.no_resubmit,
+                                               resubmit_missing=args.resubmit_missing,
+                                               processing_wait=args.reconcile_wait,
+                                               selector_cache=selector_cache, **upload_options)
+                    finally:
+                        if session:
+                            session.close()
+            except ValueError as e:
+                print(e)
+            finally:
+                if journal:
+                    journal.close()
+                profiler.summary()
+                profiler.close()
         else:
             print("選択された範囲にURLがありませんでした。")
     else:
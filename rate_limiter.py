@@ -0,0 +1,64 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+class RateLimiter:
+    """すべてのスレッドで共有する、1秒あたりのリクエスト数の上限
+
+    acquire() を呼んだ順に 1 / rate 秒ずつ間隔を空けて通す。rate が 0 以下の場合は制限しない。
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+class HostLimiter:
+    """ホストごとに同時に実行するリクエスト数の上限"""
+
+    def __init__(self, max_per_host):
+        self.max_per_host = max(1, max_per_host)
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self.lock:
+            semaphore = self.semaphores.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+        with semaphore:
+            yield
+
+class LimitedSession:
+    """requests.Session の get() に、全体のリクエスト数とホストごとの同時実行数の上限を適用するラッパー
+
+    http_get() や HttpCache.get() に requests.Session の代わりに渡して使う。
+    """
+
+    def __init__(self, session, rate_limiter, host_limiter):
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self.host_limiter = host_limiter
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self.host_limiter.slot(url):
+            self.rate_limiter.acquire()
+            with self.lock:
+                self.requests += 1
+            return self.session.get(url, **kwargs)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,217 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from aws_doc_link_scraper import create_session, iter_scraped_links, write_links
+from http_cache import HttpCache
+from link_manifest import write_manifest
+from notebook_lm_uploader import NotebookSession, add_urls_to_notebooklm
+from selector_cache import SelectorCache
+from upload_journal import UploadJournal
+
+# リンクの取得が終わったことをアップロード側に知らせる目印
+END_OF_LINKS = object()
+
+def put_until_stopped(link_queue, item, stop):
+    """キューに空きができるまで待って item を入れる（stop が設定された場合は諦めて False を返す）"""
+    while not stop.is_set():
+        try:
+            link_queue.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def produce_links(guide_urls, link_queue, links, stop, mode='auto', cache=None, parser='auto', cdp_endpoint=None,
+                  finished=None):
+    """ガイドのリンクを取得してキューに入れる関数（取得用のスレッドで実行する）
+
+    キューが満杯の間はアップロードが追いつくまで取得を待つ。取得したリンクは links にも追加する。
+    すべてのガイドのリンクを最後まで取得できた場合は finished（threading.Event）を設定する。
+    """
+    session = create_session()
+    try:
+        for link in iter_scraped_links(guide_urls, mode=mode, session=session, cache=cache, parser=parser,
+                                       cdp_endpoint=cdp_endpoint):
+            links.append(link)
+            if not put_until_stopped(link_queue, link, stop):
+                return
+        if finished:
+            finished.set()
+    except Exception as e:
+        put_until_stopped(link_queue, e, stop)
+    finally:
+        session.close()
+        put_until_stopped(link_queue, END_OF_LINKS, stop)
+
+def next_chunk(link_queue, chunk_size, wait=1.0):
+    """キューから最大 chunk_size 件のリンクを取り出す関数
+
+    1件目は届くまで待ち、2件目以降は wait 秒以内に届いたものだけをまとめる。
+    戻り値: (リンクのリスト, 取得が終わったかどうか)
+    """
+    chunk = []
+    item = link_queue.get()
+    while True:
+        if item is END_OF_LINKS:
+            return chunk, True
+        if isinstance(item, Exception):
+            print(f"リンクの取得中にエラーが発生しました: {item}")
+        else:
+            chunk.append(item)
+        if len(chunk) >= chunk_size:
+            return chunk, False
+        try:
+            item = link_queue.get(timeout=wait)
+        except queue.Empty:
+            return chunk, False
+
+def run_pipeline(guide_urls, notebook_url, mode='auto', cache=None, parser='auto', chunk_size=10,
+                 queue_size=100, max_urls=None, auth_state=None, headless=False, relogin=False,
+                 cdp_endpoint=None, journal=None, selector_cache=None, **upload_options):
+    """ガイドのリンクの取得とNotebookLMへの追加を並行して行う関数
+
+    取得用のスレッドがリンクを上限 queue_size 件のキューに入れ、このスレッドは
+    届いたリンクを chunk_size 件ずつ追加する。ブラウザの起動とログインもリンクの取得と
+    並行して行うため、取得が終わる前に追加が始まる。upload_options は add_urls_to_notebooklm() と同じ。
+
+    戻り値: {"links": 取得したリンクのリスト, "complete": リンクを最後まで取得できたか,
+             "added": 追加したURLの数, "failed": 追加できなかったURLのリスト,
+             "first_upload_seconds": 最初の追加を始めるまでの秒数, "seconds": 全体の所要時間}
+    """
+    link_queue = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+    finished = threading.Event()
+    links = []
+    result = {"links": links, "added": 0, "failed": [], "first_upload_seconds": None}
+    started = time.time()
+    producer = threading.Thread(target=produce_links, name="link-producer", daemon=True,
+                                args=(guide_urls, link_queue, links, stop),
+                                kwargs=dict(mode=mode, cache=cache, parser=parser, cdp_endpoint=cdp_endpoint,
+                                            finished=finished))
+    producer.start()
+
+    # Playwrightの同期APIはスレッドごとに使う必要があるため、ブラウザはこのスレッドで開く
+    session = NotebookSession(notebook_url, auth_state=auth_state, headless=headless, relogin=relogin,
+                              cdp_endpoint=cdp_endpoint)
+    submitted = 0
+    try:
+        # リンクの取得を待つ間にブラウザを起動し、ノートブックを開いておく
+        session.open()
+        finished = False
+        while not finished:
+            chunk, finished = next_chunk(link_queue, chunk_size)
+            urls = [link['url'] for link in chunk]
+            if max_urls is not None:
+                urls = urls[:max_urls - submitted]
+            if not urls:
+                continue
+            if result["first_upload_seconds"] is None:
+                result["first_upload_seconds"] = round(time.time() - started, 2)
+                print(f"{result['first_upload_seconds']}秒後に最初のまとまりの追加を開始しました")
+            chunk_result = add_urls_to_notebooklm(notebook_url, urls, max_urls=len(urls), journal=journal,
+                                                  selector_cache=selector_cache, session=session,
+                                                  keep_open=False, **upload_options)
+            submitted += len(urls)
+            result["added"] += chunk_result["added"]
+            result["failed"].extend(chunk_result["failed"])
+            if "error" in chunk_result and session.is_open():
+                # ダイアログが開いたままなどの状態を次のまとまりに持ち越さないよう読み込み直す
+                try:
+                    session.reload()
+                except Exception as e:
+                    print(f"ノートブックを読み込み直せませんでした（次のまとまりでブラウザを開き直します）: {e}")
+                    session.close()
+            if max_urls is not None and submitted >= max_urls:
+                print(f"追加するURLの上限（{max_urls}個）に達しました")
+                break
+    finally:
+        stop.set()
+        session.close()
+        producer.join()
+    result["complete"] = finished.is_set()
+    result["seconds"] = round(time.time() - started, 2)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='AWSドキュメントのリンクを取得しながら、NotebookLMに順次追加します')
+    parser.add_argument('--url', type=str, nargs='+', required=True,
+                        help='リンクを取得するAWSドキュメントページのURL（複数指定すると順に取得する）')
+    parser.add_argument('--notebook', type=str, required=True, help='NotebookLMのノートブックのURL')
+    parser.add_argument('--output', type=str, default='aws_links.txt',
+                        help='取得したリンクを保存するファイル名（デフォルト: aws_links.txt）')
+    parser.add_argument('--link-manifest', type=str, default=None,
+                        help='取得したリンクのマニフェスト（.jsonl または .db、省略時は書き込まない）')
+    parser.add_argument('--mode', choices=['auto', 'http', 'browser', 'expand'], default='auto',
+                        help='リンクの取得方法（aws_doc_link_scraper.py の --mode と同じ。デフォルト: auto）')
+    parser.add_argument('--parser', choices=['auto', 'lxml', 'html.parser'], default='auto',
+                        help='HTMLパーサー（auto: lxmlがあればlxml、なければhtml.parser。デフォルト: auto）')
+    parser.add_argument('--cache-dir', type=str, default='.scraper_cache',
+                        help='取得したTOCを保存し、次回はETag/Last-Modifiedで再検証するディレクトリ'
+                             '（デフォルト: .scraper_cache）')
+    parser.add_argument('--no-cache', action='store_true', help='HTTPキャッシュを使用しない')
+    parser.add_argument('--chunk-size', type=int, default=10,
+                        help='1回の追加でまとめて処理するURLの最大数（デフォルト: 10）')
+    parser.add_argument('--queue-size', type=int, default=100,
+                        help='取得済みで追加待ちのリンクを保持する上限（デフォルト: 100）')
+    parser.add_argument('--max', type=int, default=None, help='追加するURLの最大数')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='1回のダイアログでまとめて挿入するURLの数（デフォルト: 1）')
+    parser.add_argument('--auth-state', type=str, default=None,
+                        help='ログイン状態を保存・再利用するファイルのパス')
+    parser.add_argument('--headless', action='store_true',
+                        help='保存済みのログイン状態が有効な場合、ブラウザを表示せずに実行する')
+    parser.add_argument('--relogin', action='store_true',
+                        help='保存済みのログイン状態を使わずにログインし直す')
+    parser.add_argument('--cdp-endpoint', type=str, default=None,
+                        help='ブラウザを起動せずに接続する共有ブラウザのエンドポイント（例: http://127.0.0.1:9222）')
+    parser.add_argument('--journal', type=str, default='upload_journal.jsonl',
+                        help='URLごとの追加結果を記録するジャーナルファイル（デフォルト: upload_journal.jsonl）')
+    parser.add_argument('--no-journal', action='store_true', help='ジャーナルを使用しない')
+    parser.add_argument('--no-skip-existing', action='store_true',
+                        help='ノートブックのソース一覧に既に含まれるURLも追加する')
+    parser.add_argument('--selector-cache', type=str, default='selector_cache.json',
+                        help='成功したセレクタを保存するファイル（デフォルト: selector_cache.json）')
+    parser.add_argument('--no-selector-cache', action='store_true',
+                        help='セレクタをファイルに保存しない')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='追加に失敗したURLを再試行する回数（デフォルト: 2）')
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else HttpCache(args.cache_dir)
+    journal = None if args.no_journal else UploadJournal(args.journal)
+    selector_cache = SelectorCache(None if args.no_selector_cache else args.selector_cache)
+    try:
+        result = run_pipeline(args.url, args.notebook, mode=args.mode, cache=cache, parser=args.parser,
+                              chunk_size=args.chunk_size, queue_size=args.queue_size, max_urls=args.max,
+                              auth_state=args.auth_state, headless=args.headless, relogin=args.relogin,
+                              cdp_endpoint=args.cdp_endpoint, journal=journal, selector_cache=selector_cache, batch_size=args.batch_size,
+                              max_retries=args.retries, skip_existing=not args.no_skip_existing)
+    finally:
+        if cache:
+            cache.save()
+        if journal:
+            journal.close()
+
+    links = result["links"]
+    if result["complete"]:
+        write_links(links, args.output)
+        if args.link_manifest and links:
+            write_manifest(links, args.link_manifest)
+            print(f"リンクのマニフェストを {os.path.abspath(args.link_manifest)} に保存しました。")
+    else:
+        # 途中までのリンクでスクレイパーの前回の結果（差分の基準）を上書きしないよう、別のファイルに保存する
+        partial_output = f"{os.path.splitext(args.output)[0]}_partial.txt"
+        write_links(links, partial_output)
+        print(f"リンクの取得を途中で終了したため {args.output} は更新せず、"
+              f"取得した {len(links)} 個のリンクを {os.path.abspath(partial_output)} に保存しました。")
+    print(f"\n処理が完了しました（{result['seconds']}秒）: リンク {len(links)}個、"
+          f"追加 {result['added']}個、失敗 {len(result['failed'])}個")
+    if result["first_upload_seconds"] is not None:
+        print(f"最初の追加を始めるまで: {result['first_upload_seconds']}秒")
+    for url in result["failed"]:
+        print(f"  追加できませんでした: {url}")
+
+if __name__ == "__main__":
+    main()
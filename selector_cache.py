@@ -0,0 +1,65 @@
+import json
+import os
+import threading
+from atomic_file import write_json_atomic
+
+class SelectorCache:
+    """NotebookLMの操作で成功したセレクタを記録するキャッシュ
+
+    UIの言語とバージョンの組み合わせ（プロファイル）ごとに、手順名をキーとして
+    成功したセレクタとヒット・ミスの回数を保持する。path を指定した場合は
+    JSONファイルに保存し、次回の実行でも同じセレクタから試す。
+    キャッシュしたセレクタで失敗した場合はその項目を無効にする。
+    複数のスレッドで1つのキャッシュを共有できる（分割モードなど）。
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.data = {}
+        self.profile = "default"
+        self.lock = threading.RLock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"セレクタキャッシュを読み込めませんでした（新しく作成します）: {e}")
+                self.data = {}
+
+    def set_profile(self, locale, version):
+        """UIの言語とバージョンからプロファイルを切り替える"""
+        self.profile = f"{locale}|{version}"
+
+    def _entry(self, key):
+        entries = self.data.setdefault(self.profile, {})
+        return entries.setdefault(key, {"selector": None, "hits": 0, "misses": 0})
+
+    def get(self, key):
+        with self.lock:
+            return self.data.get(self.profile, {}).get(key, {}).get("selector")
+
+    def hit(self, key):
+        with self.lock:
+            self._entry(key)["hits"] += 1
+
+    def miss(self, key):
+        """キャッシュしたセレクタが使えなかった（または未登録だった）ことを記録し、項目を無効にする"""
+        with self.lock:
+            entry = self._entry(key)
+            entry["misses"] += 1
+            entry["selector"] = None
+
+    def store(self, key, selector):
+        with self.lock:
+            self._entry(key)["selector"] = selector
+
+    def stats(self):
+        with self.lock:
+            return {key: (entry["hits"], entry["misses"])
+                    for key, entry in self.data.get(self.profile, {}).items()}
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            write_json_atomic(self.path, self.data)
@@ -0,0 +1,123 @@
+from playwright.sync_api import sync_playwright
+import argparse
+import json
+import os
+import signal
+import subprocess
+import time
+import requests
+
+# 共有ブラウザのリモートデバッグ用ポートの既定値
+DEFAULT_PORT = 9222
+
+# 起動した共有ブラウザのPIDとエンドポイントを記録するファイル
+STATE_FILE = '.shared_browser.json'
+
+# 起動後、CDPのエンドポイントが応答するまで待つ時間（秒）
+START_TIMEOUT = 30
+
+def endpoint_for(port):
+    return f"http://127.0.0.1:{port}"
+
+def check_endpoint(cdp_endpoint, timeout=2):
+    """CDPのエンドポイントに問い合わせ、応答があればブラウザのバージョン情報を返す関数（応答がなければ None）"""
+    try:
+        response = requests.get(cdp_endpoint.rstrip('/') + '/json/version', timeout=timeout)
+        if response.ok:
+            return response.json()
+    except (requests.RequestException, ValueError):
+        pass
+    return None
+
+def connect_browser(playwright, cdp_endpoint=None, headless=True):
+    """cdp_endpoint を指定した場合は起動済みのブラウザに接続し、省略した場合はブラウザを起動する関数
+
+    接続したブラウザの browser.close() は、この実行で作ったコンテキストを閉じて切断するだけで、
+    共有ブラウザ自体は終了しない。
+    """
+    if cdp_endpoint:
+        print(f"共有ブラウザ ({cdp_endpoint}) に接続しています...")
+        return playwright.chromium.connect_over_cdp(cdp_endpoint)
+    return playwright.chromium.launch(headless=headless)
+
+def start_browser(port=DEFAULT_PORT, headless=False, user_data_dir='.shared_browser_profile', state_file=STATE_FILE):
+    """リモートデバッグを有効にしたChromiumを起動し、応答するまで待つ関数
+
+    起動したブラウザはこのコマンドの終了後も動き続ける。既に応答がある場合は起動しない。
+    戻り値: CDPのエンドポイント
+    """
+    cdp_endpoint = endpoint_for(port)
+    if check_endpoint(cdp_endpoint):
+        print(f"共有ブラウザは既に起動しています: {cdp_endpoint}")
+        return cdp_endpoint
+
+    with sync_playwright() as p:
+        executable = p.chromium.executable_path
+    command = [executable, f"--remote-debugging-port={port}", f"--user-data-dir={os.path.abspath(user_data_dir)}",
+               "--no-first-run", "--no-default-browser-check"]
+    if headless:
+        command.append("--headless=new")
+    print(f"共有ブラウザを起動しています（ポート {port}）...")
+    # このコマンドを終了してもブラウザが終了しないよう、別のセッションで起動する
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+    deadline = time.time() + START_TIMEOUT
+    while time.time() < deadline:
+        version = check_endpoint(cdp_endpoint)
+        if version:
+            with open(state_file, 'w', encoding='utf-8') as f:
+                json.dump({"pid": process.pid, "cdp_endpoint": cdp_endpoint, "started_at": time.time()}, f)
+            print(f"共有ブラウザを起動しました: {cdp_endpoint}（{version.get('Browser', '')}、PID {process.pid}）")
+            return cdp_endpoint
+        if process.poll() is not None:
+            raise Exception(f"共有ブラウザが起動直後に終了しました（終了コード {process.returncode}）")
+        time.sleep(0.5)
+    process.terminate()
+    raise Exception(f"共有ブラウザが {START_TIMEOUT} 秒以内に応答しませんでした")
+
+def stop_browser(state_file=STATE_FILE):
+    """start_browser() で起動した共有ブラウザを終了する関数"""
+    if not os.path.exists(state_file):
+        print("起動した共有ブラウザの記録が見つかりません")
+        return
+    with open(state_file, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    try:
+        os.kill(state["pid"], signal.SIGTERM)
+        print(f"共有ブラウザ（PID {state['pid']}）を終了しました")
+    except ProcessLookupError:
+        print(f"共有ブラウザ（PID {state['pid']}）は既に終了しています")
+    os.remove(state_file)
+
+def main():
+    parser = argparse.ArgumentParser(description='各ツールから --cdp-endpoint で接続して使い回す共有ブラウザを管理します')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    start_parser = subparsers.add_parser('start', help='共有ブラウザを起動する（起動済みの場合は何もしない）')
+    start_parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                              help=f'リモートデバッグ用のポート（デフォルト: {DEFAULT_PORT}）')
+    start_parser.add_argument('--headless', action='store_true',
+                              help='ブラウザを表示せずに起動する（NotebookLMへの手動ログインが必要な場合は指定しない）')
+    start_parser.add_argument('--user-data-dir', type=str, default='.shared_browser_profile',
+                              help='共有ブラウザのプロファイルを保存するディレクトリ（デフォルト: .shared_browser_profile）')
+
+    check_parser = subparsers.add_parser('check', help='共有ブラウザが応答するか確認する')
+    check_parser.add_argument('--cdp-endpoint', type=str, default=endpoint_for(DEFAULT_PORT),
+                              help=f'確認するエンドポイント（デフォルト: {endpoint_for(DEFAULT_PORT)}）')
+
+    subparsers.add_parser('stop', help='start で起動した共有ブラウザを終了する')
+    args = parser.parse_args()
+
+    if args.command == 'start':
+        start_browser(port=args.port, headless=args.headless, user_data_dir=args.user_data_dir)
+    elif args.command == 'check':
+        version = check_endpoint(args.cdp_endpoint)
+        if not version:
+            print(f"共有ブラウザが応答しません: {args.cdp_endpoint}")
+            raise SystemExit(1)
+        print(f"共有ブラウザは応答しています: {args.cdp_endpoint}（{version.get('Browser', '')}）")
+    else:
+        stop_browser()
+
+if __name__ == "__main__":
+    main()
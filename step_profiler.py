@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+
+class StepProfiler:
+    """処理の手順ごとの所要時間（スパン）を記録するクラス
+
+    スパンは1件ごとにJSON Lines形式で output_path に書き込み、終了時に
+    手順ごとの p50 / p95 / 最大の所要時間を summary() で表示する。
+    enabled が False の場合は何も記録しない。
+
+    使い方:
+        span = profiler.start("fill")
+        ...
+        profiler.finish(span, selector_hit=True)
+
+    例外などで終了できなかったスパンは abort_open() でまとめてエラーとして記録する。
+    """
+
+    def __init__(self, output_path=None, enabled=True):
+        self.enabled = enabled
+        self.file = open(output_path, 'a', encoding='utf-8') if enabled and output_path else None
+        self.durations = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def _open_spans(self):
+        if not hasattr(self.local, "spans"):
+            self.local.spans = []
+        return self.local.spans
+
+    def start(self, step, **attrs):
+        span = {"step": step, "start": time.time(), **attrs}
+        if self.enabled:
+            self._open_spans().append(span)
+        return span
+
+    def finish(self, span, status="ok", **attrs):
+        if not self.enabled:
+            return
+        open_spans = self._open_spans()
+        if span in open_spans:
+            open_spans.remove(span)
+        span.update(attrs)
+        span["status"] = status
+        span["duration_ms"] = round((time.time() - span["start"]) * 1000, 1)
+        self._emit(span)
+
+    def record(self, step, duration, status="ok", **attrs):
+        """計測済みの所要時間（秒）をスパンとして記録する"""
+        if not self.enabled:
+            return
+        span = {"step": step, "start": time.time() - duration, "status": status,
+                "duration_ms": round(duration * 1000, 1), **attrs}
+        self._emit(span)
+
+    def abort_open(self, error=None):
+        """このスレッドで終了していないスパンをすべてエラーとして記録する"""
+        if not self.enabled:
+            return
+        for span in list(self._open_spans()):
+            self.finish(span, status="error", error=error)
+
+    def _emit(self, span):
+        with self.lock:
+            self.durations.setdefault(span["step"], []).append(span["duration_ms"])
+            counters = self.counters.setdefault(span["step"], {"hits": 0, "misses": 0, "retries": 0, "errors": 0})
+            if "selector_hit" in span:
+                counters["hits" if span["selector_hit"] else "misses"] += 1
+            counters["retries"] += span.get("retries", 0)
+            if span["status"] != "ok":
+                counters["errors"] += 1
+            if self.file:
+                self.file.write(json.dumps(span, ensure_ascii=False) + "\n")
+                self.file.flush()
+
+    def summary(self):
+        """手順ごとの件数と p50 / p95 / 最大の所要時間を表示する"""
+        if not self.enabled or not self.durations:
+            return
+        print("\n手順ごとの所要時間（ミリ秒）:")
+        print(f"{'手順':<20}{'件数':>6}{'p50':>10}{'p95':>10}{'最大':>10}{'ヒット':>8}{'ミス':>6}{'再試行':>8}{'エラー':>8}")
+        for step, durations in self.durations.items():
+            values = sorted(durations)
+            p50 = values[int(0.50 * (len(values) - 1))]
+            p95 = values[int(0.95 * (len(values) - 1))]
+            counters = self.counters[step]
+            print(f"{step:<20}{len(values):>6}{p50:>10.1f}{p95:>10.1f}{values[-1]:>10.1f}"
+                  f"{counters['hits']:>8}{counters['misses']:>6}{counters['retries']:>8}{counters['errors']:>8}")
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,238 @@
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import re
+import requests
+from aws_doc_link_scraper import create_session, http_get, read_link_snapshot, resolve_parser
+from change_detector import extract_main_element
+from http_cache import HttpCache
+
+# NotebookLMの1ソースあたりの上限（50万語）より少し余裕を持たせた既定値
+DEFAULT_MAX_WORDS = 400000
+
+# 1つのまとめファイルの大きさの既定値（バイト）
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+
+# 本文からテキストとして取り出すブロック要素
+BLOCK_TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'pre', 'li', 'tr', 'dt', 'dd']
+
+def normalize_space(text):
+    return re.sub(r'\s+', ' ', text).strip()
+
+def block_text(tag):
+    """ブロック要素のテキストを返す（リスト項目は入れ子のリストを除く）"""
+    if tag.name == 'li':
+        return normalize_space(' '.join(child.get_text(' ') if hasattr(child, 'get_text') else str(child)
+                                        for child in tag.children if getattr(child, 'name', None) not in ('ul', 'ol')))
+    if tag.name == 'tr':
+        return ' | '.join(normalize_space(cell.get_text(' ')) for cell in tag.find_all(['th', 'td']))
+    return normalize_space(tag.get_text(' '))
+
+def html_to_text(element, markdown=True):
+    """本文の要素を見出し・リスト・コード・表を残したテキスト（またはMarkdown）に変換する関数"""
+    lines = []
+    emitted = set()
+    last_table = None
+    for tag in element.find_all(BLOCK_TAGS):
+        # 出力済みの要素の中の要素は重複するため飛ばす（入れ子のリスト項目は別に出力する）
+        ancestors = [parent for parent in tag.parents if id(parent) in emitted]
+        if ancestors and not (tag.name == 'li' and all(parent.name == 'li' for parent in ancestors)):
+            continue
+        emitted.add(id(tag))
+        if tag.name == 'pre':
+            last_table = None
+            code = tag.get_text().strip('\n')
+            lines.append(f"```\n{code}\n```" if markdown else code)
+            continue
+        text = block_text(tag)
+        if not text:
+            continue
+        if tag.name != 'tr':
+            last_table = None
+        if tag.name[0] == 'h' and tag.name[1:].isdigit():
+            # ページのタイトルを最上位の見出しにするため、本文の見出しは1段下げる
+            level = min(int(tag.name[1:]) + 1, 6)
+            lines.append(f"{'#' * level} {text}" if markdown else text)
+        elif tag.name == 'li':
+            depth = sum(1 for parent in tag.parents if parent.name == 'li')
+            lines.append(f"{'  ' * depth}- {text}")
+        elif tag.name == 'tr':
+            row = f"| {text} |" if markdown else text
+            table = tag.find_parent('table')
+            if lines and table is not None and table is last_table:
+                # 同じ表の行は空行を挟まずに続ける
+                lines[-1] += '\n' + row
+            else:
+                if markdown:
+                    row += '\n|' + ' --- |' * (text.count(' | ') + 1)
+                lines.append(row)
+            last_table = table
+            continue
+        else:
+            lines.append(text)
+    if not lines:
+        return normalize_space(element.get_text(' '))
+    return '\n\n'.join(lines)
+
+def page_title(html, element, parser='auto'):
+    """ページのタイトル（本文の最初の見出し、なければ title 要素）を返す関数"""
+    heading = element.find('h1')
+    if heading and normalize_space(heading.get_text(' ')):
+        return normalize_space(heading.get_text(' '))
+    title = BeautifulSoup(html, resolve_parser(parser), parse_only=SoupStrainer('title')).find('title')
+    return normalize_space(title.get_text(' ')) if title else ''
+
+def fetch_page(url, session, cache=None, parser='auto', markdown=True):
+    """1ページを取得して本文をテキストに変換する関数（失敗した場合は error を返す）"""
+    try:
+        response = http_get(session, url, cache)
+        if not response.ok:
+            return {"url": url, "error": f"HTTP {response.status_code}"}
+        element = extract_main_element(response.text, parser)
+        return {"url": url, "title": page_title(response.text, element, parser) or url,
+                "text": html_to_text(element, markdown=markdown)}
+    except requests.RequestException as e:
+        return {"url": url, "error": str(e)}
+
+def fetch_pages(urls, concurrency=8, cache=None, parser='auto', markdown=True):
+    """URLのリストを並行して取得し、入力の順（TOCの順）にページのリストを返す関数"""
+    session = create_session(pool_size=concurrency)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(lambda url: fetch_page(url, session, cache, parser, markdown), urls))
+    finally:
+        session.close()
+
+def format_section(title, url, body, markdown=True):
+    header = f"# {title}\n\nURL: {url}" if markdown else f"{title}\nURL: {url}"
+    return f"{header}\n\n{body}\n\n"
+
+def split_page(page, max_words, max_bytes, markdown=True):
+    """1ページを上限に収まる区切り（見出し付き）のリストにする関数
+
+    上限を超えるページは段落の境界で分割し、タイトルに (1/3) のような番号を付ける。
+    """
+    section = format_section(page["title"], page["url"], page["text"], markdown)
+    if len(section.split()) <= max_words and len(section.encode('utf-8')) <= max_bytes:
+        return [section]
+
+    # 見出しの分を残して段落を詰める
+    budget_words = max(1, max_words - min(50, max_words // 4))
+    budget_bytes = max(1, max_bytes - min(1024, max_bytes // 4))
+    chunks = []
+    current = []
+    words = size = 0
+    for paragraph in page["text"].split('\n\n'):
+        paragraph_words = len(paragraph.split())
+        paragraph_bytes = len(paragraph.encode('utf-8')) + 2
+        if current and (words + paragraph_words > budget_words or size + paragraph_bytes > budget_bytes):
+            chunks.append('\n\n'.join(current))
+            current = []
+            words = size = 0
+        current.append(paragraph)
+        words += paragraph_words
+        size += paragraph_bytes
+    if current:
+        chunks.append('\n\n'.join(current))
+    return [format_section(f"{page['title']} ({i}/{len(chunks)})", page["url"], chunk, markdown)
+            for i, chunk in enumerate(chunks, 1)]
+
+def pack_bundles(pages, max_words=DEFAULT_MAX_WORDS, max_bytes=DEFAULT_MAX_BYTES, markdown=True):
+    """ページを順番どおりに、語数とバイト数の上限に収まるまとまりに詰める関数
+
+    戻り値: まとまりごとの [(ページ, 区切りのテキスト), ...] のリスト
+    """
+    bundles = []
+    current = []
+    words = size = 0
+    for page in pages:
+        for section in split_page(page, max_words, max_bytes, markdown):
+            section_words = len(section.split())
+            section_bytes = len(section.encode('utf-8'))
+            if current and (words + section_words > max_words or size + section_bytes > max_bytes):
+                bundles.append(current)
+                current = []
+                words = size = 0
+            current.append((page, section))
+            words += section_words
+            size += section_bytes
+    if current:
+        bundles.append(current)
+    return bundles
+
+def write_bundles(bundles, output_dir, name_prefix='bundle', markdown=True):
+    """まとまりをファイルに書き込み、ファイルのパスのリストを返す関数
+
+    どのページをどのファイルに入れたかを output_dir/bundles.tsv に書き込む。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    extension = 'md' if markdown else 'txt'
+    paths = []
+    with open(os.path.join(output_dir, 'bundles.tsv'), 'w', encoding='utf-8') as manifest:
+        manifest.write("bundle\tfile\twords\ttitle\turl\n")
+        for bundle_index, bundle in enumerate(bundles, 1):
+            path = os.path.join(output_dir, f"{name_prefix}_{bundle_index:03d}.{extension}")
+            with open(path, 'w', encoding='utf-8') as f:
+                for page, section in bundle:
+                    f.write(section)
+                    manifest.write(f"{bundle_index}\t{os.path.basename(path)}\t{len(section.split())}\t"
+                                   f"{page['title']}\t{page['url']}\n")
+            paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description='リンク先のページを取得し、少数のテキストファイルにまとめます')
+    parser.add_argument('--file', type=str, default='aws_links.txt',
+                        help='URLリストが含まれるファイルのパス（デフォルト: aws_links.txt）')
+    parser.add_argument('--start', type=int, default=1, help='まとめるURLの開始番号（1から始まる）')
+    parser.add_argument('--end', type=int, default=None, help='まとめるURLの終了番号')
+    parser.add_argument('--output-dir', type=str, default='bundles',
+                        help='まとめたファイルを書き込むディレクトリ（デフォルト: bundles）')
+    parser.add_argument('--format', choices=['markdown', 'text'], default='markdown',
+                        help='ファイルの形式（デフォルト: markdown）')
+    parser.add_argument('--max-words', type=int, default=DEFAULT_MAX_WORDS,
+                        help=f'1ファイルあたりの語数の上限（デフォルト: {DEFAULT_MAX_WORDS}）')
+    parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES,
+                        help=f'1ファイルあたりのバイト数の上限（デフォルト: {DEFAULT_MAX_BYTES}）')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='同時に取得するページ数（デフォルト: 8）')
+    parser.add_argument('--cache-dir', type=str, default='.page_cache',
+                        help='取得したページを保存し、次回はETag/Last-Modifiedで再検証するディレクトリ'
+                             '（デフォルト: .page_cache）')
+    parser.add_argument('--cache-max-mb', type=float, default=200,
+                        help='HTTPキャッシュの上限（MB、デフォルト: 200）')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='HTTPキャッシュを使用しない')
+    parser.add_argument('--parser', choices=['auto', 'lxml', 'html.parser'], default='auto',
+                        help='HTMLパーサー（auto: lxmlがあればlxml、なければhtml.parser。デフォルト: auto）')
+    args = parser.parse_args()
+
+    urls = (read_link_snapshot(args.file) or [])[args.start - 1:args.end]
+    if not urls:
+        print("選択された範囲にURLがありませんでした。")
+        return
+
+    markdown = args.format == 'markdown'
+    cache = None if args.no_cache else HttpCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024 * 1024))
+    print(f"{len(urls)}個のページを取得しています（同時に {args.concurrency} ページ）...")
+    try:
+        pages = fetch_pages(urls, concurrency=args.concurrency, cache=cache, parser=args.parser, markdown=markdown)
+    finally:
+        if cache:
+            cache.save()
+
+    failed = [page for page in pages if "error" in page]
+    for page in failed:
+        print(f"  取得できませんでした: {page['url']}（{page['error']}）")
+    pages = [page for page in pages if "error" not in page]
+
+    bundles = pack_bundles(pages, max_words=args.max_words, max_bytes=args.max_bytes, markdown=markdown)
+    paths = write_bundles(bundles, args.output_dir, markdown=markdown)
+    print(f"{len(pages)}個のページを {len(paths)} 個のファイルにまとめました（取得失敗 {len(failed)}個）:")
+    for path in paths:
+        print(f"  {path} ({os.path.getsize(path) / 1024:.0f} KB)")
+    print(f"ページとファイルの対応を {os.path.abspath(os.path.join(args.output_dir, 'bundles.tsv'))} に保存しました。")
+
+if __name__ == "__main__":
+    main()
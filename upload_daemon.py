@@ -0,0 +1,330 @@
+import argparse
+import copy
+import json
+import os
+import queue
+import signal
+import threading
+import time
+from atomic_file import write_json_atomic
+from notebook_lm_uploader import NotebookSession, add_urls_to_notebooklm, extract_urls_from_file
+from selector_cache import SelectorCache
+from step_profiler import StepProfiler
+from upload_journal import UploadJournal
+
+# スプールディレクトリ内の構成
+INCOMING_DIR = "incoming"      # 受け付けたジョブ（処理待ち）
+PROCESSING_DIR = "processing"  # 処理中のジョブ
+DONE_DIR = "done"              # 完了したジョブ（結果を含む）
+FAILED_DIR = "failed"          # エラーになった、または追加できなかったURLがあるジョブ
+STATUS_FILE = "status.json"    # デーモンの状態と集計
+DRAIN_FILE = "drain"           # このファイルがあると新しいジョブの受け付けを止めて終了する
+
+def spool_path(spool_dir, *parts):
+    return os.path.join(spool_dir, *parts)
+
+def submit_job(spool_dir, notebook_url, urls, batch_size=None):
+    """ジョブをスプールディレクトリに登録し、ジョブのIDを返す関数"""
+    incoming = spool_path(spool_dir, INCOMING_DIR)
+    os.makedirs(incoming, exist_ok=True)
+    # ファイル名の順に処理されるよう、時刻を先頭に付ける
+    job_id = f"{time.time_ns()}-{os.getpid()}"
+    job = {"id": job_id, "notebook": notebook_url, "urls": urls, "submitted_at": time.time()}
+    if batch_size:
+        job["batch_size"] = batch_size
+    # 拡張子を .json 以外にして書き込み、完成してから名前を変える（途中のファイルを拾わせない）
+    tmp_path = os.path.join(incoming, f"{job_id}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(incoming, f"{job_id}.json"))
+    return job_id
+
+class UploadDaemon:
+    """ノートブックごとにブラウザを開いたまま、スプールディレクトリのジョブを処理し続けるクラス
+
+    incoming/ に置かれたジョブ（JSON）を processing/ に移し、ノートブックごとの
+    ワーカースレッドに渡す。ワーカーは NotebookSession を開いたまま使い回すため、
+    2件目以降のジョブではブラウザの起動やログインの確認を省略できる。
+    状態と集計は status.json に書き込む。drain ファイルが作られるか SIGINT / SIGTERM を
+    受け取ると、新しいジョブの受け付けを止め、受け付け済みのジョブを終えてから終了する。
+    """
+
+    def __init__(self, spool_dir, journal=None, selector_cache_path=None, profiler=None,
+                 poll_interval=1.0, **upload_options):
+        self.spool_dir = spool_dir
+        self.journal = journal
+        self.selector_cache_path = selector_cache_path
+        self.profiler = profiler or StepProfiler(enabled=False)
+        self.poll_interval = poll_interval
+        self.upload_options = upload_options
+        self.workers = {}
+        self.draining = threading.Event()
+        self.lock = threading.Lock()
+        self.metrics = {
+            "started_at": time.time(),
+            "state": "running",
+            "jobs_received": 0,
+            "jobs_done": 0,
+            "jobs_failed": 0,
+            "urls_added": 0,
+            "urls_failed": 0,
+            "job_seconds_total": 0.0,
+            "notebooks": {}
+        }
+        for name in (INCOMING_DIR, PROCESSING_DIR, DONE_DIR, FAILED_DIR):
+            os.makedirs(spool_path(spool_dir, name), exist_ok=True)
+
+    def recover(self):
+        """前回の異常終了で処理中のまま残ったジョブを処理待ちに戻す（追加済みのURLはジャーナルでスキップされる）"""
+        processing = spool_path(self.spool_dir, PROCESSING_DIR)
+        for name in sorted(os.listdir(processing)):
+            if name.endswith(".json"):
+                os.replace(os.path.join(processing, name), spool_path(self.spool_dir, INCOMING_DIR, name))
+                print(f"処理中のまま残っていたジョブを再開します: {name}")
+
+    def request_drain(self, *_):
+        if not self.draining.is_set():
+            print("終了の要求を受け付けました。受け付け済みのジョブを終えてから終了します...")
+            self.draining.set()
+
+    def poll(self):
+        """処理待ちのジョブをノートブックごとのワーカーに渡す"""
+        incoming = spool_path(self.spool_dir, INCOMING_DIR)
+        for name in sorted(os.listdir(incoming)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(incoming, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+                notebook_url = job["notebook"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"ジョブ {name} を読み込めませんでした: {e}")
+                os.replace(path, spool_path(self.spool_dir, FAILED_DIR, name))
+                continue
+            processing_path = spool_path(self.spool_dir, PROCESSING_DIR, name)
+            os.replace(path, processing_path)
+            with self.lock:
+                self.metrics["jobs_received"] += 1
+            self.worker_for(notebook_url).jobs.put(processing_path)
+            print(f"ジョブ {job.get('id', name)} を受け付けました（{len(job.get('urls', []))}個のURL -> {notebook_url}）")
+
+    def worker_for(self, notebook_url):
+        worker = self.workers.get(notebook_url)
+        if worker is None:
+            worker = NotebookWorker(self, notebook_url)
+            self.workers[notebook_url] = worker
+            with self.lock:
+                self.metrics["notebooks"][notebook_url] = {
+                    "session_open": False, "busy": False, "queued": 0,
+                    "jobs_done": 0, "urls_added": 0, "last_job_seconds": None, "last_error": None
+                }
+            worker.start()
+        return worker
+
+    def update_notebook(self, notebook_url, **values):
+        with self.lock:
+            self.metrics["notebooks"][notebook_url].update(values)
+
+    def job_finished(self, notebook_url, result, seconds):
+        with self.lock:
+            failed = "error" in result or bool(result["failed"])
+            self.metrics["jobs_failed" if failed else "jobs_done"] += 1
+            self.metrics["urls_added"] += result["added"]
+            self.metrics["urls_failed"] += len(result["failed"])
+            self.metrics["job_seconds_total"] += seconds
+            notebook = self.metrics["notebooks"][notebook_url]
+            notebook["jobs_done"] += 1
+            notebook["urls_added"] += result["added"]
+            notebook["last_job_seconds"] = round(seconds, 2)
+            notebook["last_error"] = result.get("error")
+
+    def write_status(self):
+        with self.lock:
+            for notebook_url, worker in self.workers.items():
+                self.metrics["notebooks"][notebook_url]["queued"] = worker.jobs.qsize()
+            finished = self.metrics["jobs_done"] + self.metrics["jobs_failed"]
+            status = dict(copy.deepcopy(self.metrics), updated_at=time.time(), pid=os.getpid(),
+                          jobs_pending=len([n for n in os.listdir(spool_path(self.spool_dir, INCOMING_DIR))
+                                            if n.endswith(".json")]),
+                          avg_job_seconds=round(self.metrics["job_seconds_total"] / finished, 2) if finished else None)
+        write_json_atomic(spool_path(self.spool_dir, STATUS_FILE), status)
+
+    def run(self):
+        """終了が要求されるまでジョブを受け付けて処理する"""
+        signal.signal(signal.SIGINT, self.request_drain)
+        signal.signal(signal.SIGTERM, self.request_drain)
+        self.recover()
+        drain_path = spool_path(self.spool_dir, DRAIN_FILE)
+        print(f"ジョブを待機しています（スプール: {os.path.abspath(self.spool_dir)}）")
+        while not self.draining.is_set():
+            if os.path.exists(drain_path):
+                os.remove(drain_path)
+                self.request_drain()
+                break
+            self.poll()
+            self.write_status()
+            self.draining.wait(self.poll_interval)
+
+        # 新しいジョブは受け付けず、各ワーカーが受け付け済みのジョブを終えるのを待つ
+        with self.lock:
+            self.metrics["state"] = "draining"
+        for worker in self.workers.values():
+            worker.jobs.put(None)
+        for worker in self.workers.values():
+            while worker.is_alive():
+                self.write_status()
+                worker.join(self.poll_interval)
+        with self.lock:
+            self.metrics["state"] = "stopped"
+        self.write_status()
+        print("すべてのジョブが完了したため終了しました")
+
+class NotebookWorker(threading.Thread):
+    """1つのノートブックのジョブを順番に処理するスレッド（ブラウザは開いたまま使い回す）"""
+
+    def __init__(self, daemon, notebook_url):
+        super().__init__(name=f"notebook-worker-{len(daemon.workers) + 1}", daemon=True)
+        self.owner = daemon
+        self.notebook_url = notebook_url
+        self.jobs = queue.Queue()
+
+    def run(self):
+        options = self.owner.upload_options
+        # Playwrightの同期APIはスレッドごとに使う必要があるため、ブラウザはこのスレッドで開く
+        session = NotebookSession(self.notebook_url, auth_state=options.get("auth_state"),
+                                  headless=options.get("headless", False), relogin=options.get("relogin", False))
+        selector_cache = SelectorCache(self.owner.selector_cache_path)
+        try:
+            while True:
+                job_path = self.jobs.get()
+                if job_path is None:
+                    break
+                self.process(session, selector_cache, job_path)
+        finally:
+            session.close()
+            self.owner.update_notebook(self.notebook_url, session_open=False, busy=False)
+
+    def process(self, session, selector_cache, job_path):
+        with open(job_path, 'r', encoding='utf-8') as f:
+            job = json.load(f)
+        self.owner.update_notebook(self.notebook_url, busy=True)
+        options = dict(self.owner.upload_options)
+        if job.get("batch_size"):
+            options["batch_size"] = job["batch_size"]
+        started = time.time()
+        try:
+            result = add_urls_to_notebooklm(self.notebook_url, job.get("urls", []),
+                                            max_urls=len(job.get("urls", [])), journal=self.owner.journal,
+                                            selector_cache=selector_cache, profiler=self.owner.profiler,
+                                            session=session, keep_open=False, **options)
+        except Exception as e:
+            result = {"added": 0, "failed": [], "error": str(e)}
+        seconds = time.time() - started
+
+        if "error" in result and session.is_open():
+            # ダイアログが開いたままなどの状態を次のジョブに持ち越さないよう読み込み直す
+            try:
+                session.reload()
+            except Exception as e:
+                print(f"ノートブックを読み込み直せませんでした（次のジョブでブラウザを開き直します）: {e}")
+                session.close()
+
+        self.owner.job_finished(self.notebook_url, result, seconds)
+        self.owner.update_notebook(self.notebook_url, busy=False, session_open=session.is_open())
+        job.update(result=result, finished_at=time.time(), seconds=round(seconds, 2))
+        failed = "error" in result or bool(result["failed"])
+        name = os.path.basename(job_path)
+        write_json_atomic(job_path, job)
+        os.replace(job_path, spool_path(self.owner.spool_dir, FAILED_DIR if failed else DONE_DIR, name))
+        print(f"ジョブ {job.get('id', name)} が完了しました: {result['added']}個追加、"
+              f"{len(result['failed'])}個失敗（{seconds:.1f}秒）")
+
+def print_status(spool_dir, poll_interval=1.0):
+    path = spool_path(spool_dir, STATUS_FILE)
+    if not os.path.exists(path):
+        print("デーモンの状態が見つかりません（まだ起動していません）")
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        status = json.load(f)
+    stale = status["state"] != "stopped" and time.time() - status["updated_at"] > max(10, poll_interval * 5)
+    print(f"状態: {status['state']}{'（応答がありません。停止している可能性があります）' if stale else ''}"
+          f"  PID: {status['pid']}  稼働時間: {time.time() - status['started_at']:.0f}秒")
+    print(f"ジョブ: 処理待ち {status['jobs_pending']} / 受付 {status['jobs_received']} / "
+          f"完了 {status['jobs_done']} / 失敗 {status['jobs_failed']}  平均所要時間: {status['avg_job_seconds']}秒")
+    print(f"URL: 追加 {status['urls_added']} / 失敗 {status['urls_failed']}")
+    for notebook_url, notebook in status["notebooks"].items():
+        print(f"  {notebook_url}: {'処理中' if notebook['busy'] else '待機中'}、"
+              f"ブラウザ{'起動中' if notebook['session_open'] else '停止中'}、"
+              f"キュー {notebook['queued']}、ジョブ {notebook['jobs_done']}件、"
+              f"追加 {notebook['urls_added']}個、直近 {notebook['last_job_seconds']}秒"
+              + (f"、直近のエラー: {notebook['last_error']}" if notebook['last_error'] else ""))
+
+def main():
+    parser = argparse.ArgumentParser(description='NotebookLMへのURL追加をブラウザを開いたまま処理し続けるデーモン')
+    parser.add_argument('--spool', type=str, default='upload_spool',
+                        help='ジョブを受け渡すスプールディレクトリ（デフォルト: upload_spool）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='デーモンを起動する')
+    run_parser.add_argument('--auth-state', type=str, default='auth_state.json',
+                            help='ログイン状態を保存・再利用するファイルのパス（デフォルト: auth_state.json）')
+    run_parser.add_argument('--headless', action='store_true',
+                            help='保存済みのログイン状態が有効な場合にブラウザを表示せずに実行する')
+    run_parser.add_argument('--batch-size', type=int, default=1,
+                            help='1回のダイアログでまとめて挿入するURLの数（ジョブで指定がない場合、デフォルト: 1）')
+    run_parser.add_argument('--tabs', type=int, default=1,
+                            help='同じノートブックを開いて並行して追加するタブの数（デフォルト: 1）')
+    run_parser.add_argument('--journal', type=str, default='upload_journal.jsonl',
+                            help='URLごとの追加結果を記録するジャーナルファイル（デフォルト: upload_journal.jsonl）')
+    run_parser.add_argument('--selector-cache', type=str, default='selector_cache.json',
+                            help='成功したセレクタを保存するファイル（デフォルト: selector_cache.json）')
+    run_parser.add_argument('--retries', type=int, default=2,
+                            help='追加に失敗したURLを再試行する回数（デフォルト: 2）')
+    run_parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='新しいジョブを確認する間隔（秒、デフォルト: 1.0）')
+    run_parser.add_argument('--profile', type=str, nargs='?', const='uploader_profile.jsonl', default=None,
+                            help='手順ごとの所要時間をJSON Lines形式で記録し、終了時に集計を表示する')
+
+    submit_parser = subparsers.add_parser('submit', help='ジョブを登録する')
+    submit_parser.add_argument('--url', type=str, required=True, help='NotebookLMのURL')
+    submit_parser.add_argument('--file', type=str, default='aws_links.txt',
+                               help='URLリストが含まれるファイルのパス（デフォルト: aws_links.txt）')
+    submit_parser.add_argument('--start', type=int, default=1, help='追加するURLの開始番号（1から始まる）')
+    submit_parser.add_argument('--end', type=int, default=None, help='追加するURLの終了番号')
+    submit_parser.add_argument('--batch-size', type=int, default=None,
+                               help='このジョブで1回のダイアログにまとめて挿入するURLの数')
+
+    subparsers.add_parser('status', help='デーモンの状態と集計を表示する')
+    subparsers.add_parser('drain', help='受け付け済みのジョブを終えてからデーモンを終了させる')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        journal = UploadJournal(args.journal)
+        profiler = StepProfiler(args.profile, enabled=args.profile is not None)
+        daemon = UploadDaemon(args.spool, journal=journal, selector_cache_path=args.selector_cache,
+                              profiler=profiler, poll_interval=args.poll_interval,
+                              auth_state=args.auth_state, headless=args.headless, batch_size=args.batch_size,
+                              tabs=args.tabs, max_retries=args.retries)
+        try:
+            daemon.run()
+        finally:
+            journal.close()
+            profiler.summary()
+            profiler.close()
+    elif args.command == 'submit':
+        urls = extract_urls_from_file(args.file)[args.start - 1:args.end]
+        if not urls:
+            print("選択された範囲にURLがありませんでした。")
+            return
+        job_id = submit_job(args.spool, args.url, urls, batch_size=args.batch_size)
+        print(f"{len(urls)}個のURLのジョブ {job_id} を登録しました")
+    elif args.command == 'status':
+        print_status(args.spool)
+    elif args.command == 'drain':
+        os.makedirs(args.spool, exist_ok=True)
+        open(spool_path(args.spool, DRAIN_FILE), 'w').close()
+        print("デーモンに終了を要求しました（受け付け済みのジョブを終えてから終了します）")
+
+if __name__ == "__main__":
+    main()
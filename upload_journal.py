@@ -0,0 +1,72 @@
+import json
+import os
+import threading
+import time
+
+# URLごとの状態
+STATUS_DONE = "done"        # 追加が完了した
+STATUS_FAILED = "failed"    # 追加に失敗した（再実行時に再試行する）
+
+class UploadJournal:
+    """NotebookLMへの追加結果を記録する追記専用のジャーナル（JSONL形式）
+
+    1行に1件、ノートブックのURLとリンクのURLをキーとして状態を記録する。
+    書き込みごとに fsync するため、途中で異常終了しても記録済みの行は失われない。
+    再実行時はファイルを先頭から読み直し、キーごとに最後の状態を採用する。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        # 複数のノートブックへ並行して追加する場合に書き込みが混ざらないようにする
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            self._load()
+        self.file = open(path, 'a', encoding='utf-8')
+        if self.file.tell() > 0 and not self._ends_with_newline():
+            # 書き込み途中の行があれば、次の記録と混ざらないよう改行で区切る
+            self.file.write("\n")
+            self.file.flush()
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self.entries[(entry["notebook"], entry["url"])] = entry
+                except (ValueError, KeyError):
+                    # 書き込み途中で終了した行は無視する
+                    continue
+
+    def status(self, notebook_url, url):
+        entry = self.entries.get((notebook_url, url))
+        return entry["status"] if entry else None
+
+    def is_done(self, notebook_url, url):
+        return self.status(notebook_url, url) == STATUS_DONE
+
+    def record(self, notebook_url, url, status, attempt=None, error=None):
+        entry = {"ts": time.time(), "notebook": notebook_url, "url": url, "status": status}
+        if attempt is not None:
+            entry["attempt"] = attempt
+        if error is not None:
+            entry["error"] = error
+        with self.lock:
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.entries[(notebook_url, url)] = entry
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
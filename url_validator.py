@@ -0,0 +1,182 @@
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import threading
+import time
+import requests
+from atomic_file import write_json_atomic
+from aws_doc_link_scraper import HTTP_TIMEOUT, create_session, read_link_snapshot
+
+# 検証結果の状態
+STATUS_OK = "ok"          # 取得できる（リダイレクト後を含む）
+STATUS_DEAD = "dead"      # 404 などで取得できない（追加しない）
+STATUS_ERROR = "error"    # 接続エラーや 5xx などの一時的な失敗（キャッシュしない）
+
+# HEAD を受け付けないサーバーが返すステータス（GET で確認し直す）
+HEAD_UNSUPPORTED_STATUSES = (403, 405, 501)
+
+# 4xx のうち一時的な失敗とみなすステータス
+TRANSIENT_STATUSES = (408, 429)
+
+def check_url(session, url, timeout=HTTP_TIMEOUT):
+    """1つのURLをHEAD（受け付けない場合はGET）で確認し、リダイレクトをたどった結果を返す関数
+
+    戻り値: {"url": 元のURL, "status": ok / dead / error, "final_url": リダイレクト後のURL,
+             "http_status": 最後の応答のステータス, "redirected": リダイレクトされたか, "error": エラーの内容}
+    """
+    try:
+        response = session.head(url, allow_redirects=True, timeout=timeout)
+        if response.status_code in HEAD_UNSUPPORTED_STATUSES:
+            # 本文は読まずに接続を閉じる
+            response = session.get(url, allow_redirects=True, timeout=timeout, stream=True)
+            response.close()
+    except requests.RequestException as e:
+        return {"url": url, "status": STATUS_ERROR, "final_url": url, "http_status": None,
+                "redirected": False, "error": str(e)}
+
+    code = response.status_code
+    if code < 400:
+        status = STATUS_OK
+    elif code >= 500 or code in TRANSIENT_STATUSES:
+        status = STATUS_ERROR
+    else:
+        status = STATUS_DEAD
+    return {"url": url, "status": status, "final_url": response.url if status == STATUS_OK else url,
+            "http_status": code, "redirected": bool(response.history), "error": None}
+
+class ValidationCache:
+    """URLごとの検証結果を有効期限付きで保存するキャッシュ（JSONファイル）
+
+    一時的な失敗（error）は保存せず、次回も確認し直す。
+    """
+
+    def __init__(self, path, ttl=24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"URLの検証結果のキャッシュを読み込めませんでした（新しく作成します）: {e}")
+                self.entries = {}
+
+    def get(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+        if entry and time.time() - entry["checked_at"] < self.ttl:
+            return entry
+        return None
+
+    def put(self, result):
+        if result["status"] == STATUS_ERROR:
+            return
+        with self.lock:
+            self.entries[result["url"]] = dict(result, checked_at=time.time())
+
+    def save(self):
+        # 有効期限が切れた結果は書き込まない
+        now = time.time()
+        with self.lock:
+            entries = {url: entry for url, entry in self.entries.items() if now - entry["checked_at"] < self.ttl}
+        write_json_atomic(self.path, entries)
+
+def validate_urls(urls, concurrency=16, cache=None, timeout=HTTP_TIMEOUT):
+    """URLのリストを並行して確認し、入力の順に結果のリストを返す関数
+
+    cache（ValidationCache）を指定すると、有効期限内の結果は確認せずに使う（結果の cached が True になる）。
+    """
+    session = create_session(pool_size=concurrency)
+
+    def check(url):
+        cached = cache.get(url) if cache else None
+        if cached:
+            return dict(cached, cached=True)
+        result = check_url(session, url, timeout)
+        if cache:
+            cache.put(result)
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            results = list(executor.map(check, urls))
+    finally:
+        session.close()
+    if cache:
+        cache.save()
+    return results
+
+def select_usable(results, keep_errors=True):
+    """検証結果のうち追加するものの位置のリストを返す関数
+
+    取得できないURL（dead）と、リダイレクト後のURLが先に現れたものと同じURLは除く。
+    keep_errors を False にすると、一時的な失敗（error）のURLも除く。
+    """
+    indices = []
+    seen = set()
+    for i, result in enumerate(results):
+        if result["status"] == STATUS_DEAD or (result["status"] == STATUS_ERROR and not keep_errors):
+            continue
+        if result["final_url"] in seen:
+            continue
+        seen.add(result["final_url"])
+        indices.append(i)
+    return indices
+
+def print_validation_summary(results):
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    redirected = sum(1 for result in results if result["status"] == STATUS_OK and result["redirected"])
+    cached = sum(1 for result in results if result.get("cached"))
+    print(f"URLの検証結果: 取得可能 {counts.get(STATUS_OK, 0)}件（うちリダイレクト {redirected}件）、"
+          f"取得不可 {counts.get(STATUS_DEAD, 0)}件、一時的な失敗 {counts.get(STATUS_ERROR, 0)}件"
+          f"（キャッシュを使用 {cached}件）")
+    for result in results:
+        if result["status"] == STATUS_DEAD:
+            print(f"  取得不可（HTTP {result['http_status']}）: {result['url']}")
+        elif result["status"] == STATUS_ERROR:
+            print(f"  一時的な失敗（{result['error'] or 'HTTP ' + str(result['http_status'])}）: {result['url']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='URLリストの各URLを確認し、リダイレクト先に置き換えて取得できないURLを除きます')
+    parser.add_argument('--file', type=str, default='aws_links.txt',
+                        help='確認するURLリスト（スクレイパーの出力形式、デフォルト: aws_links.txt）')
+    parser.add_argument('--output', type=str, default='valid_links.txt',
+                        help='取得できるURLを書き込むファイル（デフォルト: valid_links.txt）')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='同時に確認するURLの数（デフォルト: 16）')
+    parser.add_argument('--timeout', type=float, default=HTTP_TIMEOUT,
+                        help=f'1つのURLの確認の待機時間（秒、デフォルト: {HTTP_TIMEOUT}）')
+    parser.add_argument('--cache', type=str, default='url_validation.json',
+                        help='検証結果を保存するファイル（デフォルト: url_validation.json）')
+    parser.add_argument('--ttl-hours', type=float, default=24,
+                        help='保存した検証結果の有効期間（時間、デフォルト: 24）')
+    parser.add_argument('--no-cache', action='store_true', help='検証結果を保存・再利用しない')
+    parser.add_argument('--drop-errors', action='store_true',
+                        help='接続エラーや 5xx などの一時的な失敗のURLも除く')
+    args = parser.parse_args()
+
+    urls = read_link_snapshot(args.file)
+    if not urls:
+        print(f"{args.file} にURLが見つかりませんでした。")
+        return
+
+    cache = None if args.no_cache else ValidationCache(args.cache, ttl=args.ttl_hours * 3600)
+    print(f"{len(urls)}個のURLを確認しています（同時に {args.concurrency} 件）...")
+    start = time.time()
+    results = validate_urls(urls, concurrency=args.concurrency, cache=cache, timeout=args.timeout)
+    print_validation_summary(results)
+
+    valid_urls = [results[i]["final_url"] for i in select_usable(results, keep_errors=not args.drop_errors)]
+    with open(args.output, "w", encoding="utf-8") as f:
+        for i, url in enumerate(valid_urls, 1):
+            f.write(f"{i}. {url}\n")
+    print(f"確認が完了しました（{time.time() - start:.1f}秒）。{len(valid_urls)} 個のURLを "
+          f"{os.path.abspath(args.output)} に保存しました。")
+
+if __name__ == "__main__":
+    main()